@@ -0,0 +1,173 @@
+"""
+Admission control for new conversations.
+
+A new call is only admitted while there is headroom: fewer live
+conversations than ADMISSION_MAX_CONVERSATIONS, fewer upstream LLM calls
+in flight than ADMISSION_MAX_UPSTREAM_INFLIGHT, and a recent p90 turn
+latency under ADMISSION_MAX_TURN_P90_SECONDS. Otherwise the caller gets a
+503 with Retry-After (after an optional short wait for capacity).
+
+Only new conversations are gated. Turns of calls already in progress are
+never refused here; they are what the headroom protects.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from metrics import metrics
+
+Decision = namedtuple('Decision', ['admitted', 'reason', 'retry_after', 'waited'])
+
+
+class AdmissionController:
+    def __init__(self, max_conversations=200, max_upstream_inflight=64, max_turn_p90_seconds=6.0,
+                 latency_window_seconds=60.0, min_latency_samples=5, queue_seconds=0.0, max_queued=20,
+                 retry_after_seconds=5, idle_seconds=300.0):
+        self.max_conversations = max_conversations
+        self.max_upstream_inflight = max_upstream_inflight
+        self.max_turn_p90_seconds = max_turn_p90_seconds
+        self.latency_window_seconds = latency_window_seconds
+        self.min_latency_samples = min_latency_samples
+        self.queue_seconds = queue_seconds
+        self.max_queued = max_queued
+        self.retry_after_seconds = retry_after_seconds
+        self.idle_seconds = idle_seconds
+
+        self._cond = threading.Condition()
+        self._conversations = {}       # conversation id -> last activity (monotonic)
+        self._upstream_inflight = 0
+        self._turn_latencies = deque()  # (finished at, seconds)
+        self._queued = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_conversations=int(os.getenv('ADMISSION_MAX_CONVERSATIONS', '200')),
+            max_upstream_inflight=int(os.getenv('ADMISSION_MAX_UPSTREAM_INFLIGHT', '64')),
+            max_turn_p90_seconds=float(os.getenv('ADMISSION_MAX_TURN_P90_SECONDS', '6.0')),
+            latency_window_seconds=float(os.getenv('ADMISSION_LATENCY_WINDOW_SECONDS', '60')),
+            min_latency_samples=int(os.getenv('ADMISSION_MIN_LATENCY_SAMPLES', '5')),
+            queue_seconds=float(os.getenv('ADMISSION_QUEUE_SECONDS', '0')),
+            max_queued=int(os.getenv('ADMISSION_MAX_QUEUED', '20')),
+            retry_after_seconds=int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', '5')),
+            idle_seconds=float(os.getenv('ADMISSION_IDLE_SECONDS', '300'))
+        )
+
+    # -- signals -----------------------------------------------------------
+
+    @contextmanager
+    def upstream_call(self):
+        """Count an LLM request as in flight for its duration"""
+        with self._cond:
+            self._upstream_inflight += 1
+            metrics.set_gauge('admission_upstream_inflight', self._upstream_inflight)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._upstream_inflight -= 1
+                metrics.set_gauge('admission_upstream_inflight', self._upstream_inflight)
+                self._cond.notify_all()
+
+    def record_turn(self, conversation_id, seconds):
+        """A turn finished: keeps the conversation live and feeds the latency window"""
+        now = time.monotonic()
+        with self._cond:
+            if conversation_id in self._conversations:
+                self._conversations[conversation_id] = now
+            self._turn_latencies.append((now, seconds))
+            self._cond.notify_all()
+
+    def finish(self, conversation_id):
+        with self._cond:
+            if self._conversations.pop(conversation_id, None) is not None:
+                metrics.set_gauge('admission_live_conversations', len(self._conversations))
+                self._cond.notify_all()
+
+    # -- decision (caller holds the condition) -----------------------------
+
+    def _expire(self, now):
+        while self._turn_latencies and self._turn_latencies[0][0] < now - self.latency_window_seconds:
+            self._turn_latencies.popleft()
+        # Calls abandoned without /api/end_conversation stop counting after a while
+        idle = [cid for cid, last in self._conversations.items() if last < now - self.idle_seconds]
+        for cid in idle:
+            del self._conversations[cid]
+
+    def _turn_p90(self):
+        if len(self._turn_latencies) < self.min_latency_samples:
+            return None
+        ordered = sorted(seconds for _, seconds in self._turn_latencies)
+        return ordered[int(round(0.9 * (len(ordered) - 1)))]
+
+    def _overload_reason(self, now):
+        self._expire(now)
+        if len(self._conversations) >= self.max_conversations:
+            return 'conversations'
+        if self._upstream_inflight >= self.max_upstream_inflight:
+            return 'upstream_inflight'
+        p90 = self._turn_p90()
+        if p90 is not None and p90 >= self.max_turn_p90_seconds:
+            return 'turn_latency'
+        return None
+
+    def _retry_after(self, reason):
+        if reason == 'turn_latency':
+            # Slow samples age out of the window; no point retrying much sooner than a slow turn takes
+            return max(self.retry_after_seconds, math.ceil(self._turn_p90()))
+        return self.retry_after_seconds
+
+    # -- public API --------------------------------------------------------
+
+    def admit(self, conversation_id):
+        """Admit a new conversation (registering it as live) or say why not and when to retry"""
+        started = time.monotonic()
+        with self._cond:
+            reason = self._overload_reason(started)
+            if reason and self.queue_seconds > 0 and self._queued < self.max_queued:
+                # Hold the request briefly in case a call ends or the upstream catches up
+                self._queued += 1
+                deadline = started + self.queue_seconds
+                try:
+                    while reason and time.monotonic() < deadline:
+                        self._cond.wait(timeout=min(0.25, deadline - time.monotonic()))
+                        reason = self._overload_reason(time.monotonic())
+                finally:
+                    self._queued -= 1
+
+            waited = time.monotonic() - started
+            if reason:
+                retry_after = self._retry_after(reason)
+            else:
+                self._conversations[conversation_id] = time.monotonic()
+                metrics.set_gauge('admission_live_conversations', len(self._conversations))
+
+        if waited > 0.001:
+            metrics.observe('admission_queue_seconds', waited)
+        if reason:
+            metrics.incr('admission_decisions', result='rejected', reason=reason)
+            print(f"[ADMISSION] 🚫 New conversation rejected ({reason}), retry after {retry_after}s")
+            return Decision(False, reason, retry_after, waited)
+        metrics.incr('admission_decisions', result='admitted', reason='queued' if waited > 0.001 else 'capacity')
+        return Decision(True, None, 0, waited)
+
+    def stats(self):
+        with self._cond:
+            self._expire(time.monotonic())
+            p90 = self._turn_p90()
+            return {
+                'live_conversations': len(self._conversations),
+                'max_conversations': self.max_conversations,
+                'upstream_inflight': self._upstream_inflight,
+                'max_upstream_inflight': self.max_upstream_inflight,
+                'turn_p90_seconds': round(p90, 3) if p90 is not None else None,
+                'max_turn_p90_seconds': self.max_turn_p90_seconds,
+                'queued': self._queued,
+                'accepting': self._overload_reason(time.monotonic()) is None
+            }
+
+
+admission = AdmissionController.from_env()
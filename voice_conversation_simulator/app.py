@@ -1,23 +1,42 @@
-from flask import Flask, render_template, request, jsonify
+import time
+# Taken before the other imports so /api/health can report the full cold-start cost
+_BOOT_STARTED = time.monotonic()
+
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import json
 import os
 from datetime import datetime, timedelta
-import pandas as pd
 import uuid
 from dotenv import load_dotenv
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from pathlib import Path
 
 
 import re
+import importlib
 
 from conversation_simulator import VoiceConversationSimulator
 from conversation_flows import get_conversation_flows
+from flow_engine import flow_engine
+from export_service import EXPORT_FORMATS, parse_export_params, select_records, stream_export, iter_shard_rows
+from log_shards import ShardedConversationLog, LOG_COLUMNS
+from metrics import metrics
+from opening_pipeline import PreparedOpeningStore, prepare_openings
+from turn_coordinator import TurnCoordinator
+from usage_accounting import BUDGET_EXCEEDED
+from conversation_socket import ConversationSocket
+from cassettes import Cassette
+from audio_store import AudioStore
+from appointment_slots import slot_book, Booking, SLOT_FORMAT
+from lead_queue import LeadQueue
+from transcript_search import TranscriptIndex, parse_search_params
+from admission import admission
+from speculation import ReplySpeculator, SPECULATION_ENABLED, speculation_stats
+from ai_service import AIConversationService
+import threading
 
 
-from elevenlabs_service import ElevenLabsTTS
+from elevenlabs_service import ElevenLabsTTS, AUDIO_PROFILES, resolve_audio_profile
 from flask import send_file
 import io
 load_dotenv()
@@ -27,169 +46,214 @@ CORS(app)
 
 active_conversations = {}
 EXCEL_FILE_PATH = "voice_prem2_conversations_log.xlsx"
+LOG_DIR = os.getenv('CONVERSATION_LOG_DIR', 'conversation_logs')
+LOG_SHARD_MAX_ROWS = int(os.getenv('CONVERSATION_LOG_SHARD_MAX_ROWS', '5000'))
+
+# Daily, size-capped shards; the old single workbook is kept readable as a legacy shard
+conversation_log = ShardedConversationLog(LOG_DIR, max_rows=LOG_SHARD_MAX_ROWS, legacy_file=EXCEL_FILE_PATH)
+
+# Built on first use (or by the background prewarm) so importing the app stays fast
+_elevenlabs_tts = None
+_elevenlabs_tts_lock = threading.Lock()
+
+def get_elevenlabs_tts():
+    """The process-wide ElevenLabs client, created on first use"""
+    global _elevenlabs_tts
+    if _elevenlabs_tts is None:
+        with _elevenlabs_tts_lock:
+            if _elevenlabs_tts is None:
+                _elevenlabs_tts = ElevenLabsTTS()
+    return _elevenlabs_tts
+
+# Openings (text + audio) generated ahead of the call for the day's lead list
+opening_store = PreparedOpeningStore(
+    os.getenv('PREPARED_OPENINGS_DIR', 'prepared_openings'),
+    ttl_hours=float(os.getenv('PREPARED_OPENINGS_TTL_HOURS', '24'))
+)
+
+# Booked slots stay in the call records; after a restart the slot index is rebuilt from recent ones
+APPOINTMENT_RESTORE_DAYS = int(os.getenv('APPOINTMENT_RESTORE_DAYS', '60'))
+
+def load_upcoming_appointments():
+    """Bookings in recent conversation records whose slot has not passed yet"""
+    now = datetime.now()
+    date_from = (now - timedelta(days=APPOINTMENT_RESTORE_DAYS)).strftime('%Y-%m-%d')
+    for _, _, record in iter_shard_rows(conversation_log.find_shards(date_from=date_from)):
+        if not record.get('Appointment Start') or not record.get('Appointment Assignee'):
+            continue
+        start = datetime.strptime(str(record['Appointment Start']), SLOT_FORMAT)
+        end = datetime.strptime(str(record['Appointment End']), SLOT_FORMAT)
+        if end > now:
+            yield Booking(record['Sector'], record['Appointment Assignee'], start, end,
+                          record.get('Customer Name') or '', str(record.get('Phone Number') or ''))
+
+slot_book.loader = load_upcoming_appointments
+
+# Inverted index over transcripts and metadata, one segment per log shard
+transcript_index = TranscriptIndex(conversation_log, os.getenv('SEARCH_INDEX_DIR', 'search_index'))
+
+# Calls that need a follow-up, best lead first per assignee; journaled so the queue survives restarts
+lead_queue = LeadQueue(os.getenv('LEAD_QUEUE_PATH', 'lead_queue.jsonl'))
 
-elevenlabs_tts = ElevenLabsTTS()
+# Synthesized speech by content hash, served as cacheable GET URLs
+audio_store = AudioStore(os.getenv('AUDIO_STORE_DIR', 'audio_store'))
+AUDIO_CACHE_SECONDS = 365 * 24 * 3600
+# Behind nginx/Apache, hand file bodies to the proxy with X-Sendfile
+app.config['USE_X_SENDFILE'] = os.getenv('AUDIO_X_SENDFILE', '0') == '1'
+
+# WebSocket turn channel is optional - the HTTP endpoints keep working without flask-sock
+try:
+    from flask_sock import Sock
+    sock = Sock(app)
+except ImportError:
+    sock = None
+    print("⚠️ flask-sock not installed - /ws/conversation disabled, using HTTP turns")
+
+# Record each conversation's utterances and provider traffic for offline replay
+CASSETTE_RECORD_DIR = os.getenv('CASSETTE_RECORD_DIR')
+
+# Retried or duplicated turn submissions share one result instead of re-running the LLM
+turn_coordinator = TurnCoordinator(
+    result_ttl=float(os.getenv('TURN_RESULT_TTL_SECONDS', '120')),
+    wait_timeout=float(os.getenv('TURN_COALESCE_WAIT_SECONDS', '30'))
+)
+
+# Work that used to run before the first request; now done off the request path
+PREWARM_MODULES = ['openai', 'openpyxl', 'requests', 'numpy']
+startup_state = {'import_seconds': None, 'prewarm': 'not_started', 'prewarm_seconds': None, 'first_request_seconds': None}
+
+def prewarm():
+    """Load heavy dependencies, open the conversation log, build the TTS client, load the lead scorer, booked slots, lead queue and search index"""
+    started = time.monotonic()
+    startup_state['prewarm'] = 'running'
+    try:
+        for module in PREWARM_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                print(f"⚠️ Prewarm skipped {module}: {e}")
+        initialize_excel_file()
+        get_elevenlabs_tts()
+        from lead_scorer import get_lead_scorer
+        get_lead_scorer()
+        slot_book.ensure_loaded()
+        lead_queue.stats()
+        transcript_index.ensure_loaded()
+        startup_state['prewarm'] = 'done'
+    except Exception as e:
+        print(f"❌ Prewarm failed: {e}")
+        startup_state['prewarm'] = 'failed'
+    startup_state['prewarm_seconds'] = round(time.monotonic() - started, 3)
+    metrics.observe('startup_prewarm_seconds', startup_state['prewarm_seconds'])
+    print(f"🔥 Prewarm {startup_state['prewarm']} in {startup_state['prewarm_seconds']:.2f}s")
+
+def start_background_prewarm():
+    """Run prewarm() on a daemon thread (call from __main__ or a WSGI post-fork hook)"""
+    worker = threading.Thread(target=prewarm, name='prewarm', daemon=True)
+    worker.start()
+    return worker
+
+@app.before_request
+def record_first_request():
+    if startup_state['first_request_seconds'] is None:
+        startup_state['first_request_seconds'] = round(time.monotonic() - _BOOT_STARTED, 3)
+        metrics.observe('cold_start_to_first_request_seconds', startup_state['first_request_seconds'])
 
 def initialize_excel_file():
-    """Initialize the Excel file with proper headers if it doesn't exist"""
-    if not os.path.exists(EXCEL_FILE_PATH):
-        df = pd.DataFrame(columns=[
-            'Conversation ID', 'Date', 'Time Start', 'Time End', 'Duration (MM:SS)', 
-            'Duration (Minutes)', 'Customer Name', 'Phone Number', 'Sector', 
-            'Agent Name', 'Call Status', 'Total Interactions', 'Interest Level', 
-            'Lead Score (1-10)', 'Action Required', 'Next Action', 'Action Assignee',
-            'Conversation Summary', 'Customer Responses Count', 'AI Responses Count',
-            'Conversation Stage Reached', 'Information Gathered', 'Full Conversation Log'
-        ])
-        
-        with pd.ExcelWriter(EXCEL_FILE_PATH, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Conversations', index=False)
-            
-            workbook = writer.book
-            worksheet = writer.sheets['Conversations']
-            
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            
-            column_widths = {
-                'A': 38, 'B': 12, 'C': 12, 'D': 12, 'E': 15, 'F': 15,
-                'G': 20, 'H': 15, 'I': 15, 'J': 15, 'K': 12, 'L': 15,
-                'M': 15, 'N': 15, 'O': 15, 'P': 30, 'Q': 20, 'R': 40,
-                'S': 20, 'T': 20, 'U': 30, 'V': 100
-            }
-            
-            for col, width in column_widths.items():
-                worksheet.column_dimensions[col].width = width
-        
-        print(f"✅ Created new Excel log file: {EXCEL_FILE_PATH}")
-    else:
-        print(f"✅ Using existing Excel log file: {EXCEL_FILE_PATH}")
+    """Prepare the sharded conversation log and seal shards left open from previous days"""
+    conversation_log.initialize()
 
 def append_conversation_to_excel(conversation_data):
-    """Append a conversation record to the Excel file"""
+    """Append a conversation record to the current log shard; returns the shard name, or None on failure"""
     try:
-        if os.path.exists(EXCEL_FILE_PATH):
-            df_existing = pd.read_excel(EXCEL_FILE_PATH, sheet_name='Conversations')
-        else:
-            df_existing = pd.DataFrame()
-        
-        new_record = pd.DataFrame([conversation_data])
-        df_updated = pd.concat([df_existing, new_record], ignore_index=True)
-        
-        with pd.ExcelWriter(EXCEL_FILE_PATH, engine='openpyxl', mode='w') as writer:
-            df_updated.to_excel(writer, sheet_name='Conversations', index=False)
-            
-            workbook = writer.book
-            worksheet = writer.sheets['Conversations']
-            
-            header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            
-            column_widths = {
-                'A': 38, 'B': 12, 'C': 12, 'D': 12, 'E': 15, 'F': 15,
-                'G': 20, 'H': 15, 'I': 15, 'J': 15, 'K': 12, 'L': 15,
-                'M': 15, 'N': 15, 'O': 15, 'P': 30, 'Q': 20, 'R': 40,
-                'S': 20, 'T': 20, 'U': 30, 'V': 100
-            }
-            
-            for col, width in column_widths.items():
-                worksheet.column_dimensions[col].width = width
-            
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row):
-                for cell in row:
-                    cell.border = thin_border
-                    cell.alignment = Alignment(vertical='top', wrap_text=True)
-        
-        print(f"✅ Conversation saved to Excel: {conversation_data['Customer Name']} - {conversation_data['Sector']}")
-        return True
+        shard_name = conversation_log.append(conversation_data)
+        print(f"✅ Conversation saved to Excel ({shard_name}): {conversation_data['Customer Name']} - {conversation_data['Sector']}")
+        return shard_name
         
     except Exception as e:
         print(f"❌ Error saving to Excel: {e}")
-        return False
+        return None
 
-def is_off_topic_question(response):
-    """Check if the response is off-topic - AI will handle it but NOT end conversation"""
-    response_lower = response.lower().strip()
-    
-    # Identity questions - AI should answer these
-    identity_questions = [
-        'what is your name', 'what\'s your name', 'whats your name',
-        'who are you', 'where are you from', 'where you from',
-        'which company', 'what company', 'your name', 'tell me your name'
-    ]
-    
-    if any(q in response_lower for q in identity_questions):
-        return True, 'identity'
-    
-    # CRITICAL: Exclude business/financial contexts FIRST
-    business_terms = [
-        'loan', 'lakh', 'lakhs', 'crore', 'crores', 'rupees', 'rs', 'inr',
-        'amount', 'expecting', 'need', 'require', 'borrow', 'budget',
-        'salary', 'income', 'emi', 'interest', 'rate', 'credit', 'payment',
-        'bhk', 'property', 'apartment', 'flat', 'house', 'square feet', 'sqft',
-        'checkup', 'consultation', 'appointment', 'health', 'medical', 'insurance',
-        'application', 'eligible', 'document', 'apply', 'process'
-    ]
-    
-    # If any business term is present, this is ON-TOPIC
-    if any(term in response_lower for term in business_terms):
-        print(f"[OFF-TOPIC] ✅ Business context - ON-TOPIC")
-        return False, None
-    
-    # Math questions - only if NO business context
-    math_indicators = ['what is', 'what\'s', 'whats', 'calculate', 'equals']
-    has_math_indicator = any(indicator in response_lower for indicator in math_indicators)
-    has_numbers = any(char.isdigit() for char in response)
-    has_operator = any(op in response for op in ['+', '-', '*', '/', 'x', '×', '÷'])
-    
-    # Pure math: "what is 2+2" or "5*5"
-    if (has_math_indicator and has_numbers and has_operator):
-        print(f"[OFF-TOPIC] 🔢 Pure math question detected")
-        return True, 'math'
-    
-    # Short calculation with operators
-    if has_numbers and has_operator and len(response.split()) <= 5:
-        print(f"[OFF-TOPIC] 🔢 Simple calculation detected")
-        return True, 'math'
-    
-    # General knowledge questions - but NOT service-related
-    general_questions = [
-        'who is', 'who was', 'what is the capital', 'when did', 'where is', 
-        'how tall', 'what year', 'when was', 'who invented', 'what color',
-        'which country', 'what happened', 'who won', 'how many'
-    ]
-    
-    if any(q in response_lower for q in general_questions):
-        service_check_terms = ['loan', 'credit', 'bank', 'property', 'house', 'medical', 'health', 'checkup', 'apartment']
-        if not any(term in response_lower for term in service_check_terms):
-            print(f"[OFF-TOPIC] 📚 General knowledge question")
-            return True, 'general'
-    
-    print(f"[OFF-TOPIC] ✅ ON-TOPIC response")
-    return False, None
+def persist_conversation(conversation_id, simulator):
+    """Write the finished call to the log and search index, and queue it for follow-up if it needs action"""
+    conversation_data = build_conversation_record(conversation_id, simulator)
+    shard_name = append_conversation_to_excel(conversation_data)
+    if shard_name:
+        transcript_index.add(shard_name, conversation_data)
+    try:
+        lead = lead_queue.push_record(conversation_data)
+        if lead:
+            print(f"[LEADS] Queued {lead['customer_name']} for {lead['assignee']} (score {lead['lead_score']})")
+    except Exception as e:
+        print(f"[LEADS] ❌ Could not queue lead: {e}")
+    return shard_name is not None
+
+def finalize_conversation(simulator):
+    """Close out a conversation that was ended by the caller rather than by the AI"""
+    if not simulator.end_time:
+        simulator.end_time = datetime.now()
+    if not simulator.closing_sent:
+        closing_message = get_conversation_flows()[simulator.sector]['closing']
+        simulator.conversation_log.append(f"AI Agent: {closing_message}")
+        simulator.closing_sent = True
+        simulator.set_final_actions()
+
+def build_conversation_record(conversation_id, simulator):
+    """Build the conversation log row for a finished conversation"""
+    duration = calculate_duration(simulator.start_time, simulator.end_time)
+    appointment = simulator.appointment
+    return {
+        'Conversation ID': conversation_id,
+        'Date': datetime.now().strftime("%Y-%m-%d"),
+        'Time Start': simulator.start_time.strftime("%H:%M:%S"),
+        'Time End': simulator.end_time.strftime("%H:%M:%S"),
+        'Duration (MM:SS)': duration,
+        'Duration (Minutes)': round((simulator.end_time - simulator.start_time).total_seconds() / 60, 2),
+        'Customer Name': simulator.customer_name,
+        'Phone Number': simulator.phone_number,
+        'Sector': simulator.sector,
+        'Agent Name': simulator.ai_service.agent_personas[simulator.sector]['name'],
+        'Call Status': 'Completed',
+        'Total Interactions': simulator.total_interactions,
+        'Interest Level': simulator.customer_interest_level,
+        'Lead Score (1-10)': simulator.lead_score,
+        'Action Required': simulator.action_required,
+        'Next Action': simulator.next_action,
+        'Action Assignee': simulator.action_assignee,
+        'Conversation Summary': simulator.remarks,
+        'Customer Responses Count': len([l for l in simulator.conversation_log if l.startswith('Customer:')]),
+        'AI Responses Count': len([l for l in simulator.conversation_log if l.startswith('AI Agent:')]),
+        'Conversation Stage Reached': simulator.conversation_state,
+        'Information Gathered': simulator.customer_preference or 'N/A',
+        'Full Conversation Log': '\n'.join(simulator.conversation_log),
+        'Prompt Tokens': simulator.usage.prompt_tokens,
+        'Completion Tokens': simulator.usage.completion_tokens,
+        'TTS Characters': simulator.usage.tts_characters,
+        'Estimated Cost (USD)': round(simulator.usage.cost_usd(), 6),
+        'Appointment Start': appointment.start.strftime(SLOT_FORMAT) if appointment else None,
+        'Appointment End': appointment.end.strftime(SLOT_FORMAT) if appointment else None,
+        'Appointment Assignee': appointment.assignee if appointment else None
+    }
 
 @app.route('/')
 def index():
     """Serve the main HTML page"""
     return render_template('index.html')
 
+def synthesize_speech(text, profile, simulator=None):
+    """Prepared audio if we have it, else ElevenLabs; None means use the browser voice"""
+    audio_data = opening_store.audio_for_text(text, profile)
+    if audio_data is not None:
+        return audio_data
+    # Bill characters to the conversation; once its budget is spent the browser voice takes over
+    usage = simulator.usage if simulator else None
+    if usage and usage.budget_state == BUDGET_EXCEEDED:
+        return None
+    return get_elevenlabs_tts().text_to_speech(
+        text, profile=profile, usage=usage, stage=simulator.conversation_state if simulator else None,
+        transport=simulator.cassette.wrap_post() if simulator and simulator.cassette else None
+    )
+
 @app.route('/api/text-to-speech', methods=['POST'])
 def text_to_speech():
     """Generate speech audio using ElevenLabs"""
@@ -200,14 +264,35 @@ def text_to_speech():
         if not text:
             return jsonify({'success': False, 'error': 'No text provided'}), 400
         
-        audio_data = elevenlabs_tts.text_to_speech(text)
-        
-        if audio_data:
-            return send_file(
+        profile = resolve_audio_profile(
+            requested=data.get('format'),
+            network=data.get('network'),
+            save_data=request.headers.get('Save-Data', '').lower() == 'on',
+            accept=request.headers.get('Accept')
+        )
+        
+        audio_data = synthesize_speech(text, profile, active_conversations.get(data.get('conversation_id')))
+        
+        if audio_data and data.get('return_url'):
+            # Stable URL for these exact bytes; replays and reloads are served from cache
+            name = audio_store.put(audio_data, AUDIO_PROFILES[profile][1])
+            response = jsonify({
+                'success': True,
+                'audio_url': f"/api/audio/{name}",
+                'profile': profile,
+                'bytes': len(audio_data)
+            })
+            response.headers['Vary'] = 'Accept, Save-Data'
+            return response
+        elif audio_data:
+            response = send_file(
                 io.BytesIO(audio_data),
-                mimetype='audio/mpeg',
+                mimetype=AUDIO_PROFILES[profile][1],
                 as_attachment=False
             )
+            response.headers['X-Audio-Profile'] = profile
+            response.headers['Vary'] = 'Accept, Save-Data'
+            return response
         else:
             return jsonify({
                 'success': False, 
@@ -219,6 +304,20 @@ def text_to_speech():
         print(f"Error in text_to_speech: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/audio/<name>', methods=['GET'])
+def serve_audio(name):
+    """Stored speech by content hash: strong ETag, immutable caching and Range requests"""
+    found = audio_store.lookup(name)
+    if found is None:
+        return jsonify({'success': False, 'error': 'Audio not found'}), 404
+    path, mimetype, digest = found
+    # A path (not a buffer) lets the WSGI server use sendfile, and Werkzeug answers If-None-Match and Range
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=digest, max_age=AUDIO_CACHE_SECONDS)
+    response.headers['Cache-Control'] = f"public, max-age={AUDIO_CACHE_SECONDS}, immutable"
+    response.headers['Accept-Ranges'] = 'bytes'
+    metrics.incr('audio_served', status=response.status_code)
+    return response
+
 @app.route('/api/start_conversation', methods=['POST'])
 def start_conversation():
     """Initialize a new conversation session"""
@@ -234,6 +333,12 @@ def start_conversation():
                 'error': 'Missing required fields'
             }), 400
         
+        if sector not in flow_engine.table.sectors:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown sector '{sector}'"
+            }), 400
+        
         if not os.getenv('OPENAI_API_KEY'):
             return jsonify({
                 'success': False,
@@ -241,22 +346,53 @@ def start_conversation():
             }), 500
         
         conversation_id = str(uuid.uuid4())
-        simulator = VoiceConversationSimulator(customer_name, phone_number, sector)
-        active_conversations[conversation_id] = simulator
+        # Calls already in progress come first: new ones wait for headroom
+        decision = admission.admit(conversation_id)
+        if not decision.admitted:
+            return jsonify({
+                'success': False,
+                'error': f"All agents are busy - please try again in {decision.retry_after} seconds",
+                'reason': decision.reason,
+                'retry_after': decision.retry_after
+            }), 503, {'Retry-After': str(decision.retry_after)}
         
         try:
-            opening_message = simulator.get_opening_message()
-        except Exception as e:
-            print(f"Error generating AI opening message: {e}")
-            opening_message = f"Hello {customer_name}! This is a call regarding our {sector} services. Do you have a moment to speak?"
+            simulator = VoiceConversationSimulator(customer_name, phone_number, sector)
+            active_conversations[conversation_id] = simulator
+        
+            prepared_opening = opening_store.get(phone_number, sector, customer_name)
+            metrics.incr('prepared_opening_hit' if prepared_opening else 'prepared_opening_miss')
+        
+            if CASSETTE_RECORD_DIR:
+                simulator.cassette = Cassette.for_conversation(
+                    CASSETTE_RECORD_DIR, conversation_id, simulator.customer_info, prepared_opening
+                )
+                if simulator.ai_service.client is not None:
+                    simulator.ai_service.client = simulator.cassette.wrap_openai(simulator.ai_service.client)
+        
+            try:
+                opening_message = simulator.get_opening_message(prepared_opening)
+            except Exception as e:
+                print(f"Error generating AI opening message: {e}")
+                opening_message = f"Hello {customer_name}! This is a call regarding our {sector} services. Do you have a moment to speak?"
+        
+            if simulator.cassette:
+                simulator.cassette.record_opening(opening_message)
+        except Exception:
+            # Give the admitted slot back rather than leaving it counted until it idles out
+            active_conversations.pop(conversation_id, None)
+            admission.finish(conversation_id)
+            raise
         
         print(f"[START] Customer: {customer_name}, Sector: {sector}")
-        print(f"[START] Opening: {opening_message}")
+        print(f"[START] Opening ({'prepared' if prepared_opening else 'live'}): {opening_message}")
         
         return jsonify({
             'success': True,
             'conversation_id': conversation_id,
             'opening_message': opening_message,
+            'opening_prepared': bool(prepared_opening),
+            'websocket_url': f"/ws/conversation/{conversation_id}" if sock is not None else None,
             'customer_info': {
                 'name': customer_name,
                 'phone': phone_number,
@@ -271,6 +407,41 @@ def start_conversation():
             'error': str(e)
         }), 500
 
+@app.route('/api/openings/prepare', methods=['POST'])
+def prepare_openings_for_leads():
+    """Pre-generate openings and audio for a lead list in the background"""
+    data = request.get_json() or {}
+    customers = []
+    for customer in data.get('customers', []):
+        if not all(customer.get(field) for field in ['name', 'phone', 'sector']):
+            return jsonify({'success': False, 'error': 'Each customer needs name, phone and sector'}), 400
+        customers.append({
+            'name': customer['name'],
+            'phone': customer['phone'],
+            'sector': customer['sector'].lower().replace(' ', '_')
+        })
+        if customers[-1]['sector'] not in flow_engine.table.sectors:
+            return jsonify({'success': False, 'error': f"Unknown sector '{customer['sector']}'"}), 400
+    
+    if not customers:
+        return jsonify({'success': False, 'error': 'No customers provided'}), 400
+    
+    workers = min(int(data.get('workers', 4)), 16)
+    worker = threading.Thread(
+        target=prepare_openings,
+        args=(customers, AIConversationService(), opening_store),
+        kwargs={'tts': get_elevenlabs_tts(), 'workers': workers, 'refresh': bool(data.get('refresh'))},
+        daemon=True
+    )
+    worker.start()
+    
+    return jsonify({'success': True, 'queued': len(customers), 'workers': workers}), 202
+
+@app.route('/api/openings', methods=['GET'])
+def prepared_openings_status():
+    """How many openings are ready to play"""
+    return jsonify(opening_store.stats())
+
 @app.route('/api/process_response', methods=['POST'])
 def process_response():
     """Process customer response - AI handles off-topic then returns to main flow"""
@@ -278,6 +449,7 @@ def process_response():
         data = request.get_json()
         conversation_id = data.get('conversation_id')
         customer_response = data.get('customer_response')
+        turn_id = data.get('turn_id')
         
         if conversation_id not in active_conversations:
             return jsonify({
@@ -287,17 +459,62 @@ def process_response():
         
         simulator = active_conversations[conversation_id]
         
-        print(f"[PROCESS] Customer: {customer_response}")
+        result, source = turn_coordinator.run(
+            conversation_id, turn_id, lambda: run_customer_turn(conversation_id, simulator, customer_response)
+        )
+        if source != 'processed':
+            print(f"[PROCESS] ♻️ Turn {turn_id} {source} - not processed again")
+        return jsonify(dict(result, turn_id=turn_id))
         
-        # Check if off-topic (but DON'T end conversation - just let AI handle it)
-        is_off_topic, question_type = is_off_topic_question(customer_response)
+    except Exception as e:
+        print(f"Error in process_response: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/interim_transcript', methods=['POST'])
+def interim_transcript():
+    """Partial speech while the customer is still talking; a stable partial starts a speculative reply"""
+    data = request.get_json() or {}
+    simulator = active_conversations.get(data.get('conversation_id'))
+    if simulator is None:
+        return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+    return jsonify({'success': True, 'status': handle_interim_transcript(simulator, data.get('text') or '')})
+
+def handle_interim_transcript(simulator, text):
+    if not SPECULATION_ENABLED:
+        return 'disabled'
+    return ReplySpeculator.attach(simulator).interim(text)
+
+def run_customer_turn(conversation_id, simulator, customer_response):
+    """Run one customer turn under the conversation's turn lock and return the response body"""
+    started = time.perf_counter()
+    result = _process_customer_turn(simulator, customer_response)
+    elapsed = time.perf_counter() - started
+    admission.record_turn(conversation_id, elapsed)
+    if simulator.cassette:
+        simulator.cassette.record_turn(customer_response, result, elapsed)
+    return result
+
+def _process_customer_turn(simulator, customer_response):
+    with simulator.turn_lock:
+        print(f"[PROCESS] Customer: {customer_response}")
         
-        if is_off_topic:
-            print(f"[PROCESS] Off-topic {question_type} - AI will answer and redirect")
-            # Don't use separate handler - let AI service handle it naturally
-            # It will answer the question and smoothly redirect back to main topic
+        suppressed_reason = simulator.echo_guard.check(customer_response, simulator.last_ai_message)
+        if suppressed_reason:
+            print(f"[PROCESS] 🔇 Suppressed {suppressed_reason}: {customer_response}")
+            metrics.incr('utterances_suppressed', reason=suppressed_reason, sector=simulator.sector)
+            return {
+                'success': True,
+                'suppressed': True,
+                'suppressed_reason': suppressed_reason,
+                'ai_response': None,
+                'conversation_ended': False
+            }
+        metrics.incr('utterances_processed', sector=simulator.sector)
         
-        # Process response normally - AI will handle everything
+        # Math and identity questions are answered locally inside the AI service; everything else goes to the model
         try:
             ai_response = simulator.get_next_ai_response(customer_response)
             
@@ -307,7 +524,7 @@ def process_response():
                 if ai_response is None:
                     ai_response = get_conversation_flows()[simulator.sector]['closing']
                 
-                return jsonify({
+                return {
                     'success': True,
                     'ai_response': ai_response,
                     'conversation_ended': True,
@@ -318,7 +535,7 @@ def process_response():
                         'duration': calculate_duration(simulator.start_time, simulator.end_time),
                         'total_interactions': simulator.total_interactions
                     }
-                })
+                }
         except Exception as e:
             print(f"Error generating AI response: {e}")
             ai_response = get_conversation_flows()[simulator.sector]['closing']
@@ -331,7 +548,7 @@ def process_response():
         print(f"[PROCESS] AI: {ai_response[:80]}...")
         print(f"[PROCESS] Ended: {simulator.closing_sent}")
         
-        return jsonify({
+        return {
             'success': True,
             'ai_response': ai_response,
             'conversation_ended': simulator.closing_sent,
@@ -343,14 +560,7 @@ def process_response():
                 'total_interactions': simulator.total_interactions,
                 'current_stage': getattr(simulator, 'conversation_state', 'unknown')
             }
-        })
-        
-    except Exception as e:
-        print(f"Error in process_response: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        }
 
 @app.route('/api/end_conversation', methods=['POST'])
 def end_conversation():
@@ -365,65 +575,7 @@ def end_conversation():
                 'message': 'Conversation not found'
             }), 404
         
-        simulator = active_conversations[conversation_id]
-        
-        if not simulator.end_time:
-            simulator.end_time = datetime.now()
-        if not simulator.closing_sent:
-            closing_message = get_conversation_flows()[simulator.sector]['closing']
-            simulator.conversation_log.append(f"AI Agent: {closing_message}")
-            simulator.closing_sent = True
-            simulator.set_final_actions()
-        
-        duration = calculate_duration(simulator.start_time, simulator.end_time)
-        
-        results = {
-            'customer_name': simulator.customer_name,
-            'phone_number': simulator.phone_number,
-            'sector': simulator.sector.replace('_', ' ').title(),
-            'duration': duration,
-            'interest_level': simulator.customer_interest_level,
-            'lead_score': simulator.lead_score,
-            'next_action': simulator.next_action,
-            'action_assignee': simulator.action_assignee,
-            'action_required': simulator.action_required,
-            'call_status': 'Completed',
-            'conversation_log': simulator.conversation_log,
-            'remarks': simulator.remarks,
-            'start_time': simulator.start_time.strftime("%H:%M:%S"),
-            'end_time': simulator.end_time.strftime("%H:%M:%S"),
-        }
-        
-        conversation_data = {
-            'Conversation ID': conversation_id,
-            'Date': datetime.now().strftime("%Y-%m-%d"),
-            'Time Start': simulator.start_time.strftime("%H:%M:%S"),
-            'Time End': simulator.end_time.strftime("%H:%M:%S"),
-            'Duration (MM:SS)': duration,
-            'Duration (Minutes)': round((simulator.end_time - simulator.start_time).total_seconds() / 60, 2),
-            'Customer Name': simulator.customer_name,
-            'Phone Number': simulator.phone_number,
-            'Sector': simulator.sector,
-            'Agent Name': simulator.ai_service.agent_personas[simulator.sector]['name'],
-            'Call Status': 'Completed',
-            'Total Interactions': simulator.total_interactions,
-            'Interest Level': simulator.customer_interest_level,
-            'Lead Score (1-10)': simulator.lead_score,
-            'Action Required': simulator.action_required,
-            'Next Action': simulator.next_action,
-            'Action Assignee': simulator.action_assignee,
-            'Conversation Summary': simulator.remarks,
-            'Customer Responses Count': len([l for l in simulator.conversation_log if l.startswith('Customer:')]),
-            'AI Responses Count': len([l for l in simulator.conversation_log if l.startswith('AI Agent:')]),
-            'Conversation Stage Reached': simulator.conversation_state,
-            'Information Gathered': simulator.customer_preference or 'N/A',
-            'Full Conversation Log': '\n'.join(simulator.conversation_log)
-        }
-
-        # ✅ Save to Excel
-        append_conversation_to_excel(conversation_data)
-        print(f"✅ Conversation saved to Excel for {simulator.customer_name}")
-
+        results = end_conversation_results(conversation_id, active_conversations[conversation_id])
         return jsonify({
             'success': True,
             'results': results
@@ -433,6 +585,144 @@ def end_conversation():
         print(f"❌ Error in end_conversation: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def end_conversation_results(conversation_id, simulator):
+    """Finalize and persist a conversation once, returning the results shown to the user"""
+    # Waits for any turn still being processed so the saved record is complete. Ending again (e.g. the
+    # page's HTTP fallback after the socket dropped mid-end) returns the same results without a second row
+    with simulator.turn_lock:
+        if simulator.end_results is None:
+            simulator.end_results = _finish_conversation(conversation_id, simulator)
+        return simulator.end_results
+
+def _finish_conversation(conversation_id, simulator):
+    finalize_conversation(simulator)
+    turn_coordinator.forget(conversation_id)
+    admission.finish(conversation_id)
+    if simulator.speculation is not None:
+        simulator.speculation.cancel()
+    if simulator.cassette:
+        simulator.cassette.save()
+    
+    duration = calculate_duration(simulator.start_time, simulator.end_time)
+    
+    results = {
+        'customer_name': simulator.customer_name,
+        'phone_number': simulator.phone_number,
+        'sector': simulator.sector.replace('_', ' ').title(),
+        'duration': duration,
+        'interest_level': simulator.customer_interest_level,
+        'lead_score': simulator.lead_score,
+        'next_action': simulator.next_action,
+        'action_assignee': simulator.action_assignee,
+        'action_required': simulator.action_required,
+        'call_status': 'Completed',
+        'conversation_log': simulator.conversation_log,
+        'remarks': simulator.remarks,
+        'start_time': simulator.start_time.strftime("%H:%M:%S"),
+        'end_time': simulator.end_time.strftime("%H:%M:%S"),
+        'usage': simulator.usage.to_dict()
+    }
+    
+    # ✅ Save to Excel and the follow-up queue
+    persist_conversation(conversation_id, simulator)
+    print(f"✅ Conversation saved to Excel for {simulator.customer_name}")
+    return results
+
+if sock is not None:
+    @sock.route('/ws/conversation/<conversation_id>')
+    def conversation_socket(ws, conversation_id):
+        """Full-duplex turn channel: transcripts and control events in, text/state/audio out"""
+        simulator = active_conversations.get(conversation_id)
+        if simulator is None:
+            ws.send(json.dumps({'type': 'error', 'error': 'Conversation not found'}))
+            return
+        
+        profile = resolve_audio_profile(
+            requested=request.args.get('format'),
+            network=request.args.get('network'),
+            save_data=request.args.get('save_data') == '1',
+            accept=request.args.get('accept')
+        )
+        channel = ConversationSocket(
+            ws,
+            conversation_id,
+            run_turn=lambda text, turn_id: turn_coordinator.run(
+                conversation_id, turn_id, lambda: run_customer_turn(conversation_id, simulator, text)
+            ),
+            synthesize=lambda text, audio_profile: synthesize_speech(text, audio_profile, simulator),
+            end_conversation=lambda: end_conversation_results(conversation_id, simulator),
+            audio_profile=profile,
+            mimetype=AUDIO_PROFILES[profile][1],
+            on_interim=lambda text: handle_interim_transcript(simulator, text)
+        )
+        channel.serve(opening_text=simulator.last_ai_message if request.args.get('speak_opening') == '1' else None)
+
+    @sock.route('/ws/audio/<conversation_id>')
+    def audio_ingest_socket(ws, conversation_id):
+        """Streamed 16 kHz PCM in; server-side endpointing, transcripts and (with auto_turn=1) replies out"""
+        simulator = active_conversations.get(conversation_id)
+        if simulator is None:
+            ws.send(json.dumps({'type': 'error', 'error': 'Conversation not found'}))
+            return
+        
+        try:
+            # NumPy is only needed once someone streams audio
+            from voice_activity import AudioIngestSession, SpeechEndpointer, get_recognizer
+            endpointer = SpeechEndpointer(
+                sample_rate=int(request.args.get('sample_rate', 16000)),
+                end_silence_ms=int(request.args['end_silence_ms']) if request.args.get('end_silence_ms') else None
+            )
+            recognizer = get_recognizer(request.args.get('recognizer'))
+            auto_turn = request.args.get('auto_turn') == '1'
+            if auto_turn and getattr(recognizer, 'stand_in', False):
+                # Placeholder text like "[1.2s of speech]" must not become the customer's turn
+                raise ValueError("auto_turn needs a real recognizer - set SPEECH_RECOGNIZER=openai")
+        except ValueError as e:
+            ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+            return
+        
+        run_turn = None
+        if auto_turn:
+            run_turn = lambda text, turn_id: turn_coordinator.run(
+                conversation_id, turn_id, lambda: run_customer_turn(conversation_id, simulator, text)
+            )
+        AudioIngestSession(ws, conversation_id, endpointer, recognizer, run_turn).serve()
+
+@app.route('/api/export', methods=['GET'])
+def export_conversations():
+    """Stream conversation records as CSV, JSONL or XLSX with filters and cursor pagination"""
+    try:
+        params = parse_export_params(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        shards = conversation_log.find_shards(params['filters']['date_from'], params['filters']['date_to'])
+        records, next_cursor = select_records(
+            shards, params['filters'], limit=params['limit'], cursor=params['cursor']
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error in export_conversations: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    mimetype, extension = EXPORT_FORMATS[params['format']]
+    headers = {
+        'Content-Disposition': f'attachment; filename=conversations_export.{extension}',
+        'Cache-Control': 'no-store'
+    }
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+
+    print(f"[EXPORT] Format: {params['format']}, Filters: {params['filters']}, Limit: {params['limit']}")
+
+    return Response(
+        stream_with_context(stream_export(params['format'], records, LOG_COLUMNS)),
+        mimetype=mimetype,
+        headers=headers
+    )
+
 def save_conversation_to_excel(conversation_id, simulator):
     """Save conversation data to Excel file"""
     try:
@@ -492,8 +782,15 @@ def health_check():
         'status': 'healthy',
         'active_conversations': len(active_conversations),
         'ai_service': ai_status,
-        'excel_file': EXCEL_FILE_PATH,
-        'excel_exists': os.path.exists(EXCEL_FILE_PATH),
+        'conversation_log': conversation_log.stats(),
+        'startup': startup_state,
+        'flows': {'version': flow_engine.table.version, 'sectors': list(flow_engine.table.sectors)},
+        'audio_store': audio_store.stats(),
+        'appointments': slot_book.stats(),
+        'lead_queue': lead_queue.stats(),
+        'search_index': transcript_index.stats(),
+        'admission': admission.stats(),
+        'speculation': speculation_stats(),
         'features': [
             'Structured Banking Flow (Eligibility → Process → Meeting)',
             'Smart Off-Topic Handling (Answers then Redirects)',
@@ -504,6 +801,77 @@ def health_check():
         ]
     })
 
+@app.route('/api/search', methods=['GET'])
+def search_conversations():
+    """Ranked transcript search with phrase queries and sector/date filters"""
+    try:
+        params = parse_search_params(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    found = transcript_index.search(**params)
+    print(f"[SEARCH] '{params['q']}': {found['total']} matches in {found['took_ms']}ms")
+    return jsonify({'success': True, 'query': params['q'], **found})
+
+@app.route('/api/leads', methods=['GET'])
+def list_leads():
+    """Highest-priority queued follow-ups, optionally for one assignee"""
+    try:
+        limit = min(int(request.args.get('limit', 20)), 500)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    assignee = request.args.get('assignee')
+    return jsonify({
+        'success': True,
+        'assignee': assignee,
+        'leads': lead_queue.peek(assignee, limit=max(limit, 1)),
+        'queue': lead_queue.stats()
+    })
+
+@app.route('/api/leads/next', methods=['GET', 'POST'])
+def next_lead():
+    """GET shows the next lead to call; POST claims it (removes it from the queue)"""
+    assignee = request.args.get('assignee')
+    if request.method == 'POST':
+        lead = lead_queue.pop(assignee)
+    else:
+        leads = lead_queue.peek(assignee, limit=1)
+        lead = leads[0] if leads else None
+    if lead is None:
+        return jsonify({'success': False, 'error': 'No queued leads' + (f" for {assignee}" if assignee else '')}), 404
+    return jsonify({'success': True, 'claimed': request.method == 'POST', 'lead': lead})
+
+@app.route('/api/flows', methods=['GET'])
+def list_flows():
+    """Sectors available to call, from the compiled flow table"""
+    table = flow_engine.table
+    return jsonify({
+        'version': table.version,
+        'sectors': [
+            {
+                'id': name,
+                'label': name.replace('_', ' ').title(),
+                'agent': sector.persona['name'],
+                'company': sector.persona['company'],
+                'stages': list(sector.stages)
+            }
+            for name, sector in table.sectors.items()
+        ]
+    })
+
+@app.route('/api/flows/reload', methods=['POST'])
+def reload_flows():
+    """Recompile flows.json now instead of waiting for the file check"""
+    reloaded = flow_engine.reload(force=True)
+    if not reloaded:
+        return jsonify({'success': False, 'error': 'Flow file failed validation; previous flows kept'}), 422
+    return jsonify({'success': True, 'version': flow_engine.table.version, 'sectors': list(flow_engine.table.sectors)})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_snapshot():
+    """Runtime metrics (rate limiter queue waits, shedding, etc.)"""
+    return jsonify(metrics.snapshot())
+
 def calculate_duration(start_time, end_time):
     """Calculate conversation duration"""
     if not end_time:
@@ -515,9 +883,13 @@ def calculate_duration(start_time, end_time):
     return f"{minutes:02d}:{seconds:02d}"
 
 
+startup_state['import_seconds'] = round(time.monotonic() - _BOOT_STARTED, 3)
 
 if __name__ == '__main__':
-    initialize_excel_file()
+    if os.getenv('STARTUP_PREWARM', '1') == '1':
+        start_background_prewarm()
+    else:
+        initialize_excel_file()
     
     api_key = os.getenv('OPENAI_API_KEY')
     if api_key:
@@ -535,7 +907,7 @@ if __name__ == '__main__':
     print("   ✓ Medical: Service → Details → Appointment")
     print("   ✓ Smart Off-Topic Handling (Answer & Redirect)")
     print("   ✓ Information Extraction & Tracking")
-    print(f"📊 Excel: {os.path.abspath(EXCEL_FILE_PATH)}")
+    print(f"📊 Excel logs: {os.path.abspath(LOG_DIR)}")
     print("🌐 URL: http://localhost:5000")
     print()
     
@@ -0,0 +1,265 @@
+"""
+Appointment slots: parse what the customer said into a concrete datetime and
+reserve it without double-booking.
+
+Bookings are kept per (sector, assignee) in a sorted interval index, so
+"is this slot free?" is two bisections. Opening hours, slot length and
+assignees come from each sector's `appointments` block in flows.json.
+Booked slots are written with the call record and restored from the
+conversation log after a restart.
+"""
+import calendar
+import re
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta, time as dtime
+
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
+
+from metrics import metrics
+
+Booking = namedtuple('Booking', ['sector', 'assignee', 'start', 'end', 'customer', 'phone'])
+
+SLOT_FORMAT = '%Y-%m-%d %H:%M'
+SEARCH_DAYS = 14
+WEEKDAYS = [(name.lower(), day) for name, day in zip(calendar.day_name, (MO, TU, WE, TH, FR, SA, SU))]
+PERIODS = {'morning': 10, 'noon': 12, 'afternoon': 15, 'evening': 18}
+
+_CLOCK = re.compile(r'\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s?m\b\.?')
+_AT_HOUR = re.compile(r'\b(?:at|by|around|after)\s+(\d{1,2})(?:[:.](\d{2}))?\b(?!\s*(?:lakh|crore|rupees|years|%|bhk))')
+_24_HOUR = re.compile(r'\b([01]?\d|2[0-3]):([0-5]\d)\b')
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*'
+_EXPLICIT_DATE = re.compile(rf'\b(?:\d{{1,2}}[/-]\d{{1,2}}(?:[/-]\d{{2,4}})?|\d{{1,2}}(?:st|nd|rd|th)?(?: of)? {_MONTH}|{_MONTH} \d{{1,2}}(?:st|nd|rd|th)?)\b')
+# "the 20th", "on 5th": a day of this month, or of the next one once it has passed
+_DAY_OF_MONTH = re.compile(r'\b([1-9]|[12]\d|3[01])(?:st|nd|rd|th)\b')
+
+
+def _parse_time(text_lower):
+    """(hour, minute, matched text) for the first time of day mentioned, or None"""
+    match = _CLOCK.search(text_lower)
+    if match:
+        hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+        if match.group(3) == 'p':
+            hour += 12
+        return hour, minute, match.group(0)
+    match = _24_HOUR.search(text_lower)
+    if match:
+        return int(match.group(1)), int(match.group(2)), match.group(0)
+    match = _AT_HOUR.search(text_lower)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        # "at 4" on a sales call means the afternoon
+        if 1 <= hour <= 7 or (hour < 12 and ('afternoon' in text_lower or 'evening' in text_lower)):
+            hour += 12
+        if hour <= 23 and minute < 60:
+            return hour, minute, match.group(0)
+    for period, hour in PERIODS.items():
+        if re.search(rf'\b{period}\b', text_lower):
+            return hour, 0, period
+    return None
+
+
+def _parse_date(text_lower, today):
+    if 'day after tomorrow' in text_lower:
+        return today + timedelta(days=2)
+    if re.search(r'\btomorrow\b', text_lower):
+        return today + timedelta(days=1)
+    if re.search(r'\b(today|tonight)\b', text_lower):
+        return today
+    for name, weekday in WEEKDAYS:
+        if re.search(rf'\b{name}\b', text_lower):
+            # "next friday" skips this week's Friday only when today is Friday
+            skip = 1 if re.search(rf'\bnext {name}\b', text_lower) else 0
+            return today + relativedelta(days=skip, weekday=weekday(+1))
+    if re.search(r'\bnext week\b', text_lower):
+        return today + relativedelta(days=1, weekday=MO(+1))
+    if _EXPLICIT_DATE.search(text_lower):
+        try:
+            parsed = date_parser.parse(text_lower, fuzzy=True, dayfirst=True,
+                                       default=datetime.combine(today, dtime())).date()
+        except (ValueError, OverflowError):
+            return None
+        return parsed if parsed >= today else parsed + relativedelta(years=1)
+    match = _DAY_OF_MONTH.search(text_lower)
+    if match:
+        day = int(match.group(1))
+        month_start = today.replace(day=1)
+        for months_ahead in range(3):
+            candidate_month = month_start + relativedelta(months=months_ahead)
+            if day <= calendar.monthrange(candidate_month.year, candidate_month.month)[1]:
+                candidate = candidate_month.replace(day=day)
+                if candidate >= today:
+                    return candidate
+    return None
+
+
+def parse_slot(text, now=None):
+    """
+    Concrete start datetime for "tomorrow at 11 am", "Saturday 4pm", "5th March at 3" ...; None without
+    a time, or when the only time is a period word with no date ("good morning" is not a booking)
+    """
+    now = now or datetime.now()
+    text_lower = text.lower()
+    parsed_time = _parse_time(text_lower)
+    if parsed_time is None:
+        return None
+    hour, minute, matched = parsed_time
+    day = _parse_date(text_lower.replace(matched, ' '), now.date())
+    if day is None and matched in PERIODS:
+        return None
+    if day is None:
+        # Only a time: the next time it comes round
+        day = now.date() if datetime.combine(now.date(), dtime(hour, minute)) > now else now.date() + timedelta(days=1)
+    start = datetime.combine(day, dtime(hour, minute))
+    if start <= now and calendar.day_name[day.weekday()].lower() in text_lower:
+        # "Sunday at 11" said on Sunday afternoon means next Sunday
+        start += timedelta(days=7)
+    return start
+
+
+def format_slot(start):
+    """Spoken form, e.g. 'Friday 17 October at 3:00 PM'"""
+    return f"{start:%A %d %B} at {start.strftime('%I:%M %p').lstrip('0')}"
+
+
+class SlotIndex:
+    """Non-overlapping bookings for one assignee, sorted by start time"""
+
+    def __init__(self):
+        self._starts = []
+        self._bookings = []
+
+    def is_free(self, start, end):
+        position = bisect_right(self._starts, start)
+        if position and self._bookings[position - 1].end > start:
+            return False
+        return position == len(self._starts) or self._starts[position] >= end
+
+    def add(self, booking):
+        position = bisect_right(self._starts, booking.start)
+        self._starts.insert(position, booking.start)
+        self._bookings.insert(position, booking)
+
+    def remove(self, booking):
+        position = bisect_right(self._starts, booking.start) - 1
+        while position >= 0 and self._starts[position] == booking.start:
+            if self._bookings[position] == booking:
+                del self._starts[position]
+                del self._bookings[position]
+                return True
+            position -= 1
+        return False
+
+    def __len__(self):
+        return len(self._bookings)
+
+
+class SlotBook:
+    """
+    Process-wide bookings by (sector, assignee).
+
+    `loader` (set by the app) returns previously persisted bookings; it runs
+    once, before the first query, so a restart never re-offers a booked slot.
+    """
+
+    def __init__(self, loader=None):
+        self.loader = loader
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if self.loader is None:
+                return
+            restored = 0
+            try:
+                for booking in self.loader():
+                    self._index(booking.sector, booking.assignee).add(booking)
+                    restored += 1
+            except Exception as e:
+                print(f"[SLOTS] ❌ Could not restore bookings: {e}")
+            if restored:
+                print(f"[SLOTS] ✅ Restored {restored} upcoming bookings")
+
+    def _index(self, sector, assignee):
+        key = (sector, assignee)
+        if key not in self._indexes:
+            self._indexes[key] = SlotIndex()
+        return self._indexes[key]
+
+    @staticmethod
+    def _bookable(config, start, now):
+        end_of_day = datetime.combine(start.date(), dtime(config['hours'][1]))
+        return (start > now and start.weekday() in config['days'] and start.hour >= config['hours'][0]
+                and start + timedelta(minutes=config['duration_minutes']) <= end_of_day)
+
+    def _free_assignee(self, sector, config, start):
+        end = start + timedelta(minutes=config['duration_minutes'])
+        for assignee in config['assignees']:
+            if self._index(sector, assignee).is_free(start, end):
+                return assignee
+        return None
+
+    def _free_slots(self, sector, config, after, count, now):
+        step = timedelta(minutes=config['duration_minutes'])
+        # First slot boundary at or after `after`
+        day_start = datetime.combine(after.date(), dtime(config['hours'][0]))
+        candidate = day_start + step * max(0, -(-(after - day_start) // step))
+        found = []
+        last_day = after.date() + timedelta(days=SEARCH_DAYS)
+        while len(found) < count and candidate.date() <= last_day:
+            closing = datetime.combine(candidate.date(), dtime(config['hours'][1]))
+            if candidate.weekday() not in config['days'] or candidate + step > closing:
+                # Closed day or past closing time - jump to the next opening
+                candidate = datetime.combine(candidate.date() + timedelta(days=1), dtime(config['hours'][0]))
+                continue
+            if candidate > now and self._free_assignee(sector, config, candidate):
+                found.append(candidate)
+            candidate += step
+        return found
+
+    def free_slots(self, sector, config, after=None, count=3, now=None):
+        """The next `count` bookable starts with at least one assignee free"""
+        self.ensure_loaded()
+        now = now or datetime.now()
+        with self._lock:
+            return self._free_slots(sector, config, max(after or now, now), count, now)
+
+    def reserve(self, sector, config, start, customer='', phone='', replaces=None, now=None):
+        """(booking, []) when the slot is taken for this call, else (None, nearest free alternatives)"""
+        self.ensure_loaded()
+        now = now or datetime.now()
+        with self._lock:
+            if replaces is not None:
+                # Moving an existing booking: its own slot shouldn't count as a conflict
+                self._index(replaces.sector, replaces.assignee).remove(replaces)
+            assignee = self._free_assignee(sector, config, start) if self._bookable(config, start, now) else None
+            if assignee is None:
+                if replaces is not None:
+                    self._index(replaces.sector, replaces.assignee).add(replaces)
+                metrics.incr('appointment_reservations', sector=sector, result='conflict')
+                return None, self._free_slots(sector, config, max(start, now), 3, now)
+
+            booking = Booking(sector, assignee, start, start + timedelta(minutes=config['duration_minutes']), customer, phone)
+            self._index(sector, assignee).add(booking)
+        metrics.incr('appointment_reservations', sector=sector, result='booked')
+        return booking, []
+
+    def release(self, booking):
+        with self._lock:
+            return self._index(booking.sector, booking.assignee).remove(booking)
+
+    def stats(self):
+        with self._lock:
+            return {f"{sector}/{assignee}": len(index) for (sector, assignee), index in self._indexes.items() if len(index)}
+
+
+slot_book = SlotBook()
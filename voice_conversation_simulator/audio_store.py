@@ -0,0 +1,102 @@
+"""
+Content-addressed store for synthesized speech.
+
+Every utterance is written once as <sha256>.<ext>; the hash is the file's
+URL and its ETag, so the same bytes always have the same address and can be
+cached by the browser or any proxy indefinitely. Oldest files are dropped
+once the store grows past AUDIO_STORE_MAX_BYTES.
+"""
+import hashlib
+import os
+import re
+import threading
+
+from metrics import metrics
+from opening_pipeline import AUDIO_EXTENSIONS
+
+MIMETYPES = {extension: mimetype for mimetype, extension in AUDIO_EXTENSIONS.items()}
+_AUDIO_NAME = re.compile(r'^([0-9a-f]{64})\.(mp3|ogg|wav)$')
+
+
+class AudioStore:
+    """Write-once audio files named by their SHA-256, with a total size cap"""
+
+    def __init__(self, store_dir, max_bytes=None):
+        self.store_dir = store_dir
+        if max_bytes is None:
+            max_bytes = int(os.getenv('AUDIO_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def put(self, audio_data, mimetype):
+        """Store the bytes (once) and return their file name, e.g. '<sha256>.mp3'"""
+        name = f"{hashlib.sha256(audio_data).hexdigest()}.{AUDIO_EXTENSIONS[mimetype]}"
+        path = os.path.join(self.store_dir, name)
+        if os.path.exists(path):
+            metrics.incr('audio_store_puts', result='existing')
+            return name
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        # Unique temp name so concurrent writers of the same phrase never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio_data)
+        os.replace(tmp_path, path)
+        metrics.incr('audio_store_puts', result='written')
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(audio_data)
+            if self._total_bytes > self.max_bytes:
+                self._prune()
+        return name
+
+    def lookup(self, name):
+        """(path, mimetype, etag) for a stored file name, or None if it's unknown or malformed"""
+        match = _AUDIO_NAME.match(name)
+        if not match:
+            return None
+        path = os.path.join(self.store_dir, name)
+        if not os.path.isfile(path):
+            return None
+        return os.path.abspath(path), MIMETYPES[match.group(2)], match.group(1)
+
+    def _files(self):
+        if not os.path.isdir(self.store_dir):
+            return []
+        return [entry for entry in os.scandir(self.store_dir) if entry.is_file() and _AUDIO_NAME.match(entry.name)]
+
+    def _scan_size(self):
+        return sum(entry.stat().st_size for entry in self._files())
+
+    def _prune(self):
+        """Delete least recently written files until the store is back under 90% of its cap"""
+        files = sorted(self._files(), key=lambda entry: entry.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for entry in files:
+            if self._total_bytes <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            removed += 1
+        if removed:
+            print(f"[AUDIO] Pruned {removed} files from {self.store_dir}")
+            metrics.incr('audio_store_pruned', removed)
+
+    def stats(self):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            return {
+                'store_dir': os.path.abspath(self.store_dir),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
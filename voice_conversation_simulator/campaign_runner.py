@@ -0,0 +1,375 @@
+"""
+Batch campaign mode: run full simulated calls for a CSV of customers.
+
+Usage:
+    python campaign_runner.py customers.csv --workers 8 --persona mixed --offline
+
+The CSV needs `name`, `phone` and `sector` columns (an optional `persona`
+column overrides --persona per row). Every finished call is written through
+the normal conversation log.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ai_service import AIConversationService
+from cassettes import Cassette
+from conversation_simulator import VoiceConversationSimulator
+from local_models import LocalChatModel
+
+PERSONA_SCRIPTS = {
+    'interested': {
+        'banking': [
+            "Yes, I'm interested in a personal loan.",
+            "My monthly salary is around 80000 rupees.",
+            "No, I don't have any existing EMIs right now.",
+            "Okay, what documents would I need to apply?",
+            "Tomorrow at 11 am works for me.",
+            "Okay."
+        ],
+        'real_estate': [
+            "Yes, I'm looking for a 2 BHK apartment.",
+            "My budget is around 60 lakhs.",
+            "What amenities does the project have?",
+            "Saturday at 4 pm would be good for a site visit.",
+            "Okay."
+        ],
+        'medical': [
+            "Yes, I'd like a routine health checkup.",
+            "It's for myself, I'm 45 and want a full body checkup.",
+            "What does the package include and how much does it cost?",
+            "Tomorrow at 10 am is fine for the appointment.",
+            "Okay."
+        ]
+    },
+    'busy': {
+        'default': [
+            "Sorry, I'm in a meeting right now. Can you call me back tomorrow?"
+        ]
+    },
+    'hostile': {
+        'default': [
+            "Who gave you my number?",
+            "Stop calling me, I'm not interested."
+        ]
+    },
+    'off_topic': {
+        'default': [
+            "Wait, who are you?",
+            "What is 25*4?",
+            "Who won the world cup last year?",
+            "Okay, tell me a little about what you're offering then.",
+            "Sounds fine. Bye for now."
+        ]
+    }
+}
+
+SCRIPTED_PERSONAS = list(PERSONA_SCRIPTS)
+ALL_PERSONAS = SCRIPTED_PERSONAS + ['llm']
+
+
+class ScriptedCustomer:
+    """Customer persona that replays a fixed script, one line per turn"""
+
+    def __init__(self, persona, sector):
+        scripts = PERSONA_SCRIPTS[persona]
+        self.lines = scripts.get(sector) or scripts['default']
+        self.turn = 0
+
+    def reply(self, ai_message):
+        line = self.lines[min(self.turn, len(self.lines) - 1)]
+        self.turn += 1
+        return line
+
+
+class LLMCustomer:
+    """Customer persona driven by a chat model (live OpenAI or the local stand-in)"""
+
+    def __init__(self, client, customer_name, sector, model="gpt-4o-mini"):
+        self.client = client
+        self.model = model
+        self.system_prompt = (
+            f"You are playing a customer named {customer_name} receiving a sales call about {sector.replace('_', ' ')} services. "
+            "Reply in ONE short spoken sentence. Be realistic: you may ask questions, share details, or agree to a time."
+        )
+        self.history = []
+
+    def reply(self, ai_message):
+        self.history.append({"role": "assistant", "content": ai_message})
+        completion = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": self.system_prompt}] + self.history,
+            max_tokens=40,
+            temperature=0.9,
+            timeout=8
+        )
+        text = completion.choices[0].message.content.strip()
+        self.history.append({"role": "user", "content": text})
+        return text
+
+
+def load_customers(csv_path):
+    """Read name/phone/sector rows from the campaign CSV"""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        customers = []
+        for row in reader:
+            row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+            if not all(row.get(field) for field in ['name', 'phone', 'sector']):
+                print(f"⚠️ Skipping incomplete row: {row}")
+                continue
+            row['sector'] = row['sector'].lower().replace(' ', '_')
+            customers.append(row)
+        return customers
+
+
+def classify_outcome(simulator):
+    """Bucket a finished call for the outcome distribution"""
+    if simulator.meeting_scheduled_with_time:
+        return 'meeting_scheduled'
+    if simulator.customer_interest_level == 'Not Interested':
+        return 'not_interested'
+    if simulator.customer_preference == 'follow_up_requested':
+        return 'follow_up_requested'
+    return 'ended_other'
+
+
+class CampaignRunner:
+    """Runs simulated conversations for a customer list on a worker pool"""
+
+    def __init__(self, persona='mixed', workers=4, max_turns=20, offline=False,
+                 local_latency=0.0, persist=True, seed=None, record_dir=None):
+        self.persona = persona
+        self.workers = workers
+        self.max_turns = max_turns
+        self.offline = offline
+        self.persist = persist
+        self.record_dir = record_dir
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.local_model = LocalChatModel(mean_latency=local_latency, jitter=local_latency / 4, seed=seed) if offline else None
+
+        # Persistence goes through the same path as /api/end_conversation
+        if persist:
+            from app import persist_conversation, finalize_conversation, initialize_excel_file
+            initialize_excel_file()
+            self._persist = persist_conversation
+        else:
+            from app import finalize_conversation
+        self._finalize = finalize_conversation
+
+    def _pick_persona(self, customer):
+        persona = customer.get('persona') or self.persona
+        if persona == 'mixed':
+            with self._lock:
+                persona = self._random.choice(SCRIPTED_PERSONAS)
+        if persona not in ALL_PERSONAS:
+            raise ValueError(f"Unknown persona '{persona}'")
+        return persona
+
+    def _make_customer(self, persona, simulator):
+        if persona == 'llm':
+            return LLMCustomer(simulator.ai_service.client, simulator.customer_name, simulator.sector)
+        return ScriptedCustomer(persona, simulator.sector)
+
+    def run_one(self, customer):
+        """Run a single call end to end and return its stats"""
+        persona = self._pick_persona(customer)
+        ai_service = AIConversationService(client=self.local_model) if self.offline else AIConversationService()
+        if persona == 'llm' and ai_service.client is None:
+            raise ValueError("The 'llm' persona needs OPENAI_API_KEY or --offline")
+
+        simulator = VoiceConversationSimulator(customer['name'], customer['phone'], customer['sector'], ai_service=ai_service)
+        conversation_id = str(uuid.uuid4())
+        # Built before recording starts so an LLM customer's own calls stay out of the cassette
+        caller = self._make_customer(persona, simulator)
+        if self.record_dir:
+            simulator.cassette = Cassette.for_conversation(
+                self.record_dir, conversation_id, simulator.customer_info, source='campaign'
+            )
+            if ai_service.client is not None:
+                ai_service.client = simulator.cassette.wrap_openai(ai_service.client)
+        started = time.perf_counter()
+
+        ai_message = simulator.get_opening_message()
+        if simulator.cassette:
+            simulator.cassette.record_opening(ai_message)
+        turns = 0
+        while turns < self.max_turns and not simulator.closing_sent:
+            customer_text = caller.reply(ai_message)
+            turns += 1
+            turn_started = time.perf_counter()
+            ai_message = simulator.get_next_ai_response(customer_text)
+            if simulator.cassette:
+                simulator.cassette.record_turn(customer_text, {
+                    'ai_response': ai_message, 'conversation_ended': simulator.closing_sent
+                }, time.perf_counter() - turn_started)
+            if ai_message is None:
+                break
+
+        closed_by_flow = simulator.closing_sent
+        self._finalize(simulator)
+        if simulator.cassette:
+            simulator.cassette.save()
+        if self.persist:
+            self._persist(conversation_id, simulator)
+
+        return {
+            'conversation_id': conversation_id,
+            'persona': persona,
+            'sector': simulator.sector,
+            'turns': turns,
+            'seconds': time.perf_counter() - started,
+            'outcome': classify_outcome(simulator) if closed_by_flow else 'max_turns_reached',
+            'interest_level': simulator.customer_interest_level,
+            'lead_score': simulator.lead_score,
+            'usage': simulator.usage.to_dict()
+        }
+
+    def run(self, customers, verbose=False):
+        """Run the whole campaign and return the aggregated report"""
+        results = []
+        errors = []
+        started = time.perf_counter()
+
+        # Simulator/service logging is per-turn and very chatty; keep it out of the report unless asked
+        log_sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with log_sink:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.run_one, customer): customer for customer in customers}
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        errors.append({'customer': futures[future].get('name'), 'error': f"{type(e).__name__}: {e}"})
+
+        elapsed = time.perf_counter() - started
+        return build_report(results, errors, elapsed, self.workers)
+
+
+def build_report(results, errors, elapsed, workers):
+    """Aggregate throughput, turns-per-conversation and outcome distribution"""
+    turns = [r['turns'] for r in results]
+    call_seconds = sorted(r['seconds'] for r in results)
+    total_turns = sum(turns)
+
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+    cost_by_sector = Counter()
+    calls_by_tier = Counter()
+    tokens = [r['usage']['prompt_tokens'] + r['usage']['completion_tokens'] for r in results]
+    for r in results:
+        cost_by_sector[r['sector']] += r['usage']['cost_usd']
+        calls_by_tier.update(r['usage'].get('tiers', {}))
+
+    by_persona = {}
+    for r in results:
+        persona_stats = by_persona.setdefault(r['persona'], Counter())
+        persona_stats[r['outcome']] += 1
+
+    return {
+        'conversations': len(results),
+        'errors': errors,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput': {
+            'conversations_per_second': round(len(results) / elapsed, 3) if elapsed else 0.0,
+            'turns_per_second': round(total_turns / elapsed, 3) if elapsed else 0.0
+        },
+        'turns_per_conversation': {
+            'mean': round(statistics.mean(turns), 2) if turns else 0.0,
+            'median': statistics.median(turns) if turns else 0,
+            'max': max(turns) if turns else 0
+        },
+        'call_seconds': {
+            'p50': round(percentile(call_seconds, 50), 3),
+            'p95': round(percentile(call_seconds, 95), 3)
+        },
+        'usage': {
+            'tokens_per_conversation': round(statistics.mean(tokens), 1) if tokens else 0.0,
+            'cost_usd': round(sum(cost_by_sector.values()), 6),
+            'cost_usd_by_sector': {sector: round(cost, 6) for sector, cost in cost_by_sector.items()},
+            'calls_by_tier': dict(calls_by_tier)
+        },
+        'outcomes': dict(Counter(r['outcome'] for r in results)),
+        'interest_levels': dict(Counter(r['interest_level'] for r in results)),
+        'outcomes_by_persona': {p: dict(c) for p, c in by_persona.items()}
+    }
+
+
+def print_report(report):
+    print(f"\n{'='*50}")
+    print("CAMPAIGN REPORT")
+    print(f"{'='*50}")
+    print(f"Conversations: {report['conversations']} ({len(report['errors'])} errors) with {report['workers']} workers")
+    print(f"Elapsed: {report['elapsed_seconds']}s")
+    print(f"Throughput: {report['throughput']['conversations_per_second']} calls/s, "
+          f"{report['throughput']['turns_per_second']} turns/s")
+    tpc = report['turns_per_conversation']
+    print(f"Turns per conversation: mean {tpc['mean']}, median {tpc['median']}, max {tpc['max']}")
+    print(f"Call duration: p50 {report['call_seconds']['p50']}s, p95 {report['call_seconds']['p95']}s")
+    usage = report['usage']
+    print(f"LLM tokens per conversation: {usage['tokens_per_conversation']}, "
+          f"estimated cost ${usage['cost_usd']:.4f} {usage['cost_usd_by_sector']}")
+    print(f"Calls by model tier: {usage['calls_by_tier']}")
+    print("Outcomes:")
+    for outcome, count in sorted(report['outcomes'].items(), key=lambda item: -item[1]):
+        print(f"   {outcome}: {count}")
+    print("Outcomes by persona:")
+    for persona, outcomes in report['outcomes_by_persona'].items():
+        print(f"   {persona}: {outcomes}")
+    for error in report['errors'][:10]:
+        print(f"   ❌ {error['customer']}: {error['error']}")
+    print(f"{'='*50}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a simulated call campaign from a customer CSV")
+    parser.add_argument('csv_path', help="CSV with name, phone, sector (and optional persona) columns")
+    parser.add_argument('--persona', default='mixed', choices=ALL_PERSONAS + ['mixed'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-turns', type=int, default=20)
+    parser.add_argument('--offline', action='store_true', help="Use the local model stand-in instead of OpenAI")
+    parser.add_argument('--local-latency', type=float, default=0.0, help="Mean simulated model latency in seconds (offline only)")
+    parser.add_argument('--no-persist', action='store_true', help="Don't write calls to the conversation log")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--record', metavar='DIR', help="Save a replay cassette per call (see cassettes.py)")
+    parser.add_argument('--verbose', action='store_true', help="Show per-turn simulator logs")
+    args = parser.parse_args(argv)
+
+    if not args.offline and not os.getenv('OPENAI_API_KEY'):
+        print("⚠️ No OPENAI_API_KEY found - calls will use fallback responses. Pass --offline for the local stand-in.")
+
+    customers = load_customers(args.csv_path)
+    print(f"🚀 Campaign: {len(customers)} customers, persona={args.persona}, workers={args.workers}, offline={args.offline}")
+
+    runner = CampaignRunner(
+        persona=args.persona,
+        workers=args.workers,
+        max_turns=args.max_turns,
+        offline=args.offline,
+        local_latency=args.local_latency,
+        persist=not args.no_persist,
+        seed=args.seed,
+        record_dir=args.record
+    )
+    report = runner.run(customers, verbose=args.verbose)
+    print_report(report)
+    return 0 if not report['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""
+Record/replay cassettes for deterministic performance runs.
+
+Recording captures, per conversation, the customer's utterances and every
+OpenAI chat completion and ElevenLabs synthesis made for it, with the
+provider latency of each call. Replay serves those responses back, after
+the recorded latency times a scale factor, so internal changes can be
+benchmarked turn for turn against the same traffic without network calls.
+
+Usage:
+    CASSETTE_RECORD_DIR=cassettes python app.py        # record live calls
+    python campaign_runner.py customers.csv --offline --record cassettes
+    python cassettes.py cassettes/ --latency-scale 0.5 --output replay.json
+"""
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from metrics import metrics
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(Exception):
+    """Replay was asked for a provider call the cassette has no response for"""
+
+
+def _request_key(provider, request):
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{provider}:{canonical}".encode('utf-8')).hexdigest()[:24]
+
+
+def _openai_request(kwargs):
+    # Timeouts are a transport detail, not part of what was asked
+    return {key: value for key, value in kwargs.items() if key != 'timeout'}
+
+
+def _openai_shape(request):
+    return 'json' if request.get('response_format') else 'chat'
+
+
+def _tts_request(url, body):
+    # The voice ID is deployment config, so only the output format and body identify the call
+    query = parse_qs(urlparse(url).query)
+    return {'output_format': query.get('output_format', [None])[0], 'json': body}
+
+
+def _serialize_completion(response):
+    usage = getattr(response, 'usage', None)
+    choice = response.choices[0]
+    return {
+        'model': getattr(response, 'model', None),
+        'content': choice.message.content,
+        'finish_reason': getattr(choice, 'finish_reason', None),
+        'usage': {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+            'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0
+        } if usage is not None else None
+    }
+
+
+def _deserialize_completion(data):
+    usage = data.get('usage')
+    message = SimpleNamespace(role='assistant', content=data['content'])
+    return SimpleNamespace(
+        model=data.get('model'),
+        choices=[SimpleNamespace(index=0, message=message, finish_reason=data.get('finish_reason'))],
+        usage=SimpleNamespace(
+            prompt_tokens=usage['prompt_tokens'],
+            completion_tokens=usage['completion_tokens'],
+            total_tokens=usage['prompt_tokens'] + usage['completion_tokens']
+        ) if usage else None
+    )
+
+
+class _ReplayHTTPResponse:
+    """Just enough of requests.Response for ElevenLabsTTS"""
+
+    def __init__(self, data):
+        self.status_code = data['status']
+        self.content = base64.b64decode(data['content']) if data.get('content') else b''
+        self.headers = data.get('headers') or {}
+        self.text = data.get('text', '')
+
+
+class Cassette:
+    """
+    One conversation's recorded traffic.
+
+    Interactions are matched on replay by an exact hash of the request
+    first. When the code under test changes a prompt, the request no
+    longer matches, so the next unused interaction of the same provider and
+    call shape is served instead and counted as a fuzzy match.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self.data = data or {
+            'version': CASSETTE_VERSION,
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'customer': None,
+            'prepared_opening': None,
+            'opening': None,
+            'turns': [],
+            'interactions': []
+        }
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._used = set()
+        self._last_by_key = {}
+        self.stats = {'exact': 0, 'fuzzy': 0, 'repeat': 0, 'miss': 0}
+
+    # ---- recording ----
+
+    @classmethod
+    def for_conversation(cls, record_dir, conversation_id, customer, prepared_opening=None, source='app'):
+        """`source` is the entry point turns went through: 'app' (run_customer_turn) or 'campaign' (the simulator)"""
+        os.makedirs(record_dir, exist_ok=True)
+        cassette = cls(os.path.join(record_dir, f"{conversation_id}.json"))
+        cassette.data['conversation_id'] = conversation_id
+        cassette.data['source'] = source
+        cassette.data['customer'] = dict(customer)
+        cassette.data['prepared_opening'] = prepared_opening
+        return cassette
+
+    def _add_interaction(self, provider, shape, request, response, error, latency):
+        with self._lock:
+            self.data['interactions'].append({
+                'provider': provider,
+                'shape': shape,
+                'key': _request_key(provider, request),
+                'request': request,
+                'response': response,
+                'error': error,
+                'latency': round(latency, 4)
+            })
+
+    def record_opening(self, text):
+        self.data['opening'] = text
+
+    def record_turn(self, utterance, result, seconds):
+        with self._lock:
+            self.data['turns'].append({
+                'at': round(time.monotonic() - self._started, 3),
+                'utterance': utterance,
+                'ai_response': result.get('ai_response'),
+                'suppressed': bool(result.get('suppressed')),
+                'conversation_ended': bool(result.get('conversation_ended')),
+                'seconds': round(seconds, 4)
+            })
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        metrics.incr('cassettes_recorded')
+        print(f"📼 Cassette saved: {self.path} ({len(self.data['turns'])} turns, {len(self.data['interactions'])} provider calls)")
+
+    def wrap_openai(self, client):
+        """OpenAI-compatible client that records every chat completion it forwards"""
+        return _RecordingOpenAI(client, self)
+
+    def wrap_post(self, post=None):
+        """requests.post stand-in that records ElevenLabs calls"""
+        def recording_post(url, json=None, headers=None, timeout=None):
+            request = _tts_request(url, json)
+            send = post
+            if send is None:
+                import requests
+                send = requests.post
+            started = time.perf_counter()
+            try:
+                response = send(url, json=json, headers=headers, timeout=timeout)
+            except Exception as e:
+                self._add_interaction('elevenlabs', 'tts', request, None, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+                raise
+            self._add_interaction('elevenlabs', 'tts', request, {
+                'status': response.status_code,
+                'content': base64.b64encode(response.content).decode('ascii') if response.status_code == 200 else None,
+                'headers': {key: value for key, value in response.headers.items() if key.lower() == 'retry-after'},
+                'text': '' if response.status_code == 200 else response.text[:200]
+            }, None, time.perf_counter() - started)
+            return response
+        return recording_post
+
+    # ---- replay ----
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"{path}: unsupported cassette version {data.get('version')}")
+        return cls(path, data)
+
+    def _match(self, provider, shape, request):
+        key = _request_key(provider, request)
+        with self._lock:
+            interactions = self.data['interactions']
+            for index, interaction in enumerate(interactions):
+                if index not in self._used and interaction['provider'] == provider and interaction['key'] == key:
+                    kind = 'exact'
+                    break
+            else:
+                if key in self._last_by_key:
+                    # A hedged duplicate of a request already served
+                    index, kind = self._last_by_key[key], 'repeat'
+                else:
+                    for index, interaction in enumerate(interactions):
+                        if index not in self._used and interaction['provider'] == provider and interaction['shape'] == shape:
+                            kind = 'fuzzy'
+                            break
+                    else:
+                        self.stats['miss'] += 1
+                        metrics.incr('cassette_replay', provider=provider, match='miss')
+                        raise CassetteMiss(f"No recorded {provider} {shape} call left in {os.path.basename(self.path)}")
+            self._used.add(index)
+            self._last_by_key[key] = index
+            self.stats[kind] += 1
+        metrics.incr('cassette_replay', provider=provider, match=kind)
+        return interactions[index]
+
+    def replay_openai(self, latency_scale=1.0):
+        return _ReplayOpenAI(self, latency_scale)
+
+    def replay_post(self, latency_scale=1.0):
+        def post(url, json=None, headers=None, timeout=None):
+            request = _tts_request(url, json)
+            interaction = self._match('elevenlabs', 'tts', request)
+            time.sleep(interaction['latency'] * latency_scale)
+            if interaction['error']:
+                raise RuntimeError(interaction['error'])
+            return _ReplayHTTPResponse(interaction['response'])
+        return post
+
+
+class _RecordingCompletions:
+    def __init__(self, inner, cassette):
+        self._inner = inner
+        self._cassette = cassette
+
+    def create(self, **kwargs):
+        request = _openai_request(kwargs)
+        started = time.perf_counter()
+        try:
+            response = self._inner.create(**kwargs)
+        except Exception as e:
+            self._cassette._add_interaction('openai', _openai_shape(request), request, None,
+                                            f"{type(e).__name__}: {e}", time.perf_counter() - started)
+            raise
+        self._cassette._add_interaction('openai', _openai_shape(request), request,
+                                        _serialize_completion(response), None, time.perf_counter() - started)
+        return response
+
+
+class _RecordingOpenAI:
+    def __init__(self, client, cassette):
+        self._client = client
+        self.chat = SimpleNamespace(completions=_RecordingCompletions(client.chat.completions, cassette))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _ReplayCompletions:
+    def __init__(self, cassette, latency_scale):
+        self._cassette = cassette
+        self._latency_scale = latency_scale
+
+    def create(self, **kwargs):
+        request = _openai_request(kwargs)
+        interaction = self._cassette._match('openai', _openai_shape(request), request)
+        time.sleep(interaction['latency'] * self._latency_scale)
+        if interaction['error']:
+            raise RuntimeError(interaction['error'])
+        return _deserialize_completion(interaction['response'])
+
+
+class _ReplayOpenAI:
+    def __init__(self, cassette, latency_scale):
+        self.chat = SimpleNamespace(completions=_ReplayCompletions(cassette, latency_scale))
+
+
+def replay_cassette(cassette, latency_scale=1.0, tts=None):
+    """Drive a recorded conversation through the current code and time each turn"""
+    from ai_service import AIConversationService
+    from app import finalize_conversation, run_customer_turn
+    from conversation_simulator import VoiceConversationSimulator
+    from elevenlabs_service import AUDIO_PROFILES, DEFAULT_AUDIO_PROFILE
+
+    customer = cassette.data['customer']
+    ai_service = AIConversationService(client=cassette.replay_openai(latency_scale))
+    simulator = VoiceConversationSimulator(customer['name'], customer['phone'], customer['sector'], ai_service=ai_service)
+    post = cassette.replay_post(latency_scale)
+    # Only lines the client actually asked to hear were synthesized while recording, in its format
+    profiles = {output_format: profile for profile, (output_format, _) in AUDIO_PROFILES.items()}
+    spoken = {
+        i['request']['json']['text']: profiles.get(i['request']['output_format'], DEFAULT_AUDIO_PROFILE)
+        for i in cassette.data['interactions'] if i['provider'] == 'elevenlabs'
+    }
+
+    def speak(text):
+        if tts is not None and text in spoken:
+            tts.text_to_speech(text, profile=spoken[text], transport=post)
+
+    started = time.perf_counter()
+    opening = simulator.get_opening_message(cassette.data.get('prepared_opening'))
+    speak(opening)
+
+    # Replay through the same entry point the turns were recorded from
+    if cassette.data.get('source') == 'campaign':
+        def run_turn(utterance):
+            ai_response = simulator.get_next_ai_response(utterance)
+            return {'ai_response': ai_response, 'conversation_ended': simulator.closing_sent}
+    else:
+        def run_turn(utterance):
+            return run_customer_turn(cassette.data.get('conversation_id'), simulator, utterance)
+
+    turns = []
+    for recorded in cassette.data['turns']:
+        turn_started = time.perf_counter()
+        result = run_turn(recorded['utterance'])
+        if result.get('ai_response'):
+            speak(result['ai_response'])
+        seconds = time.perf_counter() - turn_started
+        turns.append({
+            'utterance': recorded['utterance'],
+            'seconds': round(seconds, 4),
+            'recorded_seconds': recorded['seconds'],
+            'diverged': result.get('ai_response') != recorded['ai_response']
+        })
+        if result.get('conversation_ended'):
+            break
+    finalize_conversation(simulator)
+
+    return {
+        'cassette': os.path.basename(cassette.path),
+        'sector': customer['sector'],
+        'opening_diverged': opening != cassette.data.get('opening'),
+        'seconds': round(time.perf_counter() - started, 4),
+        'turns': turns,
+        'matches': dict(cassette.stats)
+    }
+
+
+def _cassette_paths(target):
+    if os.path.isdir(target):
+        return sorted(os.path.join(target, name) for name in os.listdir(target) if name.endswith('.json'))
+    return [target]
+
+
+def print_replay_report(results, latency_scale):
+    turn_seconds = sorted(turn['seconds'] for result in results for turn in result['turns'])
+    recorded = [turn['recorded_seconds'] for result in results for turn in result['turns']]
+    matches = {kind: sum(result['matches'][kind] for result in results) for kind in ('exact', 'fuzzy', 'repeat', 'miss')}
+
+    print(f"\n{'='*50}")
+    print("CASSETTE REPLAY")
+    print(f"{'='*50}")
+    print(f"Cassettes: {len(results)}, turns: {len(turn_seconds)}, latency scale: {latency_scale}")
+    if turn_seconds:
+        p95 = turn_seconds[min(len(turn_seconds) - 1, int(round(0.95 * (len(turn_seconds) - 1))))]
+        print(f"Turn latency: mean {statistics.mean(turn_seconds):.3f}s, p50 {statistics.median(turn_seconds):.3f}s, p95 {p95:.3f}s")
+        print(f"Recorded turn latency: mean {statistics.mean(recorded):.3f}s")
+    print(f"Diverged turns: {sum(turn['diverged'] for result in results for turn in result['turns'])}")
+    print(f"Provider calls: {matches}")
+    print(f"{'='*50}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded conversations against the current code")
+    parser.add_argument('target', help="Cassette file or directory of cassettes")
+    parser.add_argument('--latency-scale', type=float, default=float(os.getenv('CASSETTE_LATENCY_SCALE', '1.0')),
+                        help="Multiply recorded provider latency (0 = no waiting)")
+    parser.add_argument('--output', help="Write per-turn timings as JSON for comparing runs")
+    parser.add_argument('--verbose', action='store_true', help="Show per-turn simulator logs")
+    args = parser.parse_args(argv)
+
+    from elevenlabs_service import ElevenLabsTTS
+
+    results = []
+    log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log_sink:
+        for path in _cassette_paths(args.target):
+            tts = ElevenLabsTTS()
+            # Replay needs no credentials; audio comes from the cassette
+            tts.enabled = True
+            results.append(replay_cassette(Cassette.load(path), args.latency_scale, tts))
+
+    print_replay_report(results, args.latency_scale)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'latency_scale': args.latency_scale, 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"📄 Replay timings written to {args.output}")
+    return 0 if not any(result['matches']['miss'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
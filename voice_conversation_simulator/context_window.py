@@ -0,0 +1,121 @@
+import os
+import re
+from collections import OrderedDict
+
+from metrics import metrics
+
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.getenv('LLM_HISTORY_TOKEN_BUDGET', '320'))
+
+# Share of the budget the running summary may use; the rest goes to verbatim turns
+SUMMARY_BUDGET_SHARE = 0.35
+MIN_VERBATIM_TURNS = 2
+FACT_MAX_WORDS = 14
+
+# Clauses worth remembering once the turn that contained them is no longer sent verbatim
+_FACT_RE = re.compile(
+    r"\d|salary|income|earn|budget|lakh|crore|bhk|loan|card|checkup|consult|"
+    r"appointment|visit|meeting|callback|call back|tomorrow|today|monday|tuesday|"
+    r"wednesday|thursday|friday|saturday|sunday|morning|afternoon|evening|\bam\b|\bpm\b|"
+    r"married|family|kids|children|job|work|business|age|years|doctor|pain|insurance",
+    re.IGNORECASE
+)
+_CLAUSE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|,\s+(?:and|but)\s+")
+
+
+def count_tokens(text):
+    """Approximate token count (~4 characters per token), matching the rate limiter's estimate"""
+    return len(text) // 4 + 1
+
+
+def _shorten(clause):
+    words = clause.split()
+    if len(words) > FACT_MAX_WORDS:
+        return ' '.join(words[:FACT_MAX_WORDS]) + '…'
+    return clause.strip()
+
+
+def _split_entry(entry):
+    if entry.startswith("AI Agent:"):
+        return 'assistant', entry[len("AI Agent:"):].strip()
+    if entry.startswith("Customer:"):
+        return 'user', entry[len("Customer:"):].strip()
+    return None, entry
+
+
+class ConversationContext:
+    """
+    Per-conversation prompt history that fits a token budget.
+
+    The newest turns are sent verbatim, newest first, until the budget runs
+    out. Turns that fall out of that window are folded once into a running
+    summary of short facts (amounts, preferences, times, questions already
+    asked), so each turn only processes the entries that just aged out.
+    """
+
+    def __init__(self, token_budget=None):
+        self.token_budget = token_budget or DEFAULT_HISTORY_TOKEN_BUDGET
+        self.summary_budget = int(self.token_budget * SUMMARY_BUDGET_SHARE)
+        self._facts = OrderedDict()
+        self._summary_tokens = 0
+        self._folded_upto = 0
+
+    def _add_fact(self, fact):
+        if fact in self._facts:
+            return
+        self._facts[fact] = count_tokens(fact)
+        self._summary_tokens += self._facts[fact]
+        # Oldest facts go first once the summary outgrows its share of the budget
+        while self._summary_tokens > self.summary_budget and len(self._facts) > 1:
+            _, tokens = self._facts.popitem(last=False)
+            self._summary_tokens -= tokens
+
+    def _fold(self, entry):
+        role, text = _split_entry(entry)
+        for clause in _CLAUSE_SPLIT_RE.split(text):
+            clause = clause.strip()
+            if not clause:
+                continue
+            if role == 'user' and _FACT_RE.search(clause):
+                self._add_fact(f"Customer: {_shorten(clause)}")
+            elif role == 'assistant' and clause.endswith('?'):
+                self._add_fact(f"Agent already asked: {_shorten(clause)}")
+            elif role == 'assistant' and _FACT_RE.search(clause) and re.search(r"\d", clause):
+                self._add_fact(f"Agent said: {_shorten(clause)}")
+
+    def build(self, conversation_history, customer_response=None, customer_preference=None):
+        """
+        Return (recent_entries, summary_text) for the next prompt.
+
+        `recent_entries` are the verbatim log lines to send; the current customer
+        utterance is left out when it is the last log entry, since it is sent
+        separately.
+        """
+        history = list(conversation_history)
+        if customer_response is not None and history and history[-1] == f"Customer: {customer_response}":
+            history.pop()
+
+        verbatim_budget = self.token_budget - self._summary_tokens
+        start = len(history)
+        used = 0
+        while start > 0:
+            tokens = count_tokens(history[start - 1])
+            if used + tokens > verbatim_budget and len(history) - start >= MIN_VERBATIM_TURNS:
+                break
+            used += tokens
+            start -= 1
+
+        # Fold only the entries that aged out since the last turn
+        for entry in history[self._folded_upto:start]:
+            self._fold(entry)
+        self._folded_upto = max(self._folded_upto, start)
+        recent = history[self._folded_upto:]
+
+        summary_lines = []
+        if customer_preference:
+            summary_lines.append(f"Customer preference: {customer_preference}")
+        summary_lines.extend(self._facts)
+        summary = '\n'.join(f"- {line}" for line in summary_lines)
+
+        tokens = sum(count_tokens(entry) for entry in recent) + (count_tokens(summary) if summary else 0)
+        metrics.observe('prompt_history_tokens', tokens)
+        return recent, summary
@@ -1,12 +1,35 @@
 from datetime import datetime, timedelta
+import copy
+import re
+import threading
 import time
 from ai_service import AIConversationService
 from conversation_flows import get_conversation_flows
+from flow_engine import flow_engine
+from echo_filter import EchoGuard
+from context_window import ConversationContext
+from usage_accounting import ConversationUsage
+from appointment_slots import slot_book, parse_slot, format_slot
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_NEGATIONS = {
+    'no', 'not', 'none', 'nope', 'nah', 'neither', 'nor', 'never', 'nothing',
+    "don't", 'dont', "doesn't", 'doesnt', "can't", 'cant', "won't", 'wont', "isn't", 'isnt'
+}
+_OFFER_POSITIONS = {'first': 0, '1st': 0, 'second': 1, '2nd': 1, 'third': 2, '3rd': 2}
+_ACCEPT_WORDS = {
+    'ok', 'okay', 'yes', 'yeah', 'yep', 'sure', 'fine', 'works', 'good', 'great', 'perfect', 'alright'
+}
+# Words that may surround a bare acceptance ("yes that works for me", "okay sounds good")
+_ACCEPT_FILLER = {
+    'that', "that's", 'thats', 'it', 'is', 'for', 'me', 'sounds', 'with', 'the', 'one', 'then',
+    'please', 'book', 'go', 'ahead', "let's", 'lets', 'do', 'i', "i'm", 'im', 'am', 'very', 'all', 'right'
+}
 
 class VoiceConversationSimulator:
     """Enhanced AI-powered voice conversation simulator with empathy and realism"""
     
-    def __init__(self, customer_name, phone_number, sector):
+    def __init__(self, customer_name, phone_number, sector, ai_service=None):
         self.customer_name = customer_name
         self.phone_number = phone_number
         self.sector = sector
@@ -40,7 +63,35 @@ class VoiceConversationSimulator:
         # NEW: Track consecutive closing messages to prevent loops
         self.consecutive_closing_messages = 0
         
-        self.ai_service = AIConversationService()
+        self.ai_service = ai_service or AIConversationService()
+        
+        # Drops mic-captured TTS and repeated utterances before they cost an LLM call
+        self.echo_guard = EchoGuard()
+        
+        # Serializes turns - the browser can fire an interruption and a retry concurrently
+        self.turn_lock = threading.Lock()
+        # Results of the first end_conversation; a repeated end returns them instead of saving again
+        self.end_results = None
+        
+        # Token-budgeted prompt history; keeps its running summary across turns
+        self.context = ConversationContext()
+        
+        # Provider tokens/characters and cost for this call, with the optional budget
+        self.usage = ConversationUsage(sector)
+        
+        # Stage from the compiled flow table; only new log entries are scanned each turn
+        self.stage_tracker = flow_engine.tracker(sector)
+        
+        # Set when this call's provider traffic is being recorded (cassettes.py)
+        self.cassette = None
+        
+        # Slot reserved for this customer (appointment_slots.Booking), if any
+        self.appointment = None
+        self._slot_conflict = False
+        self._offered_slots = []
+        
+        # Reply started from interim speech (speculation.ReplySpeculator), attached on the first interim transcript
+        self.speculation = None
         
         self.customer_info = {
             'name': customer_name,
@@ -48,9 +99,9 @@ class VoiceConversationSimulator:
             'sector': sector
         }
     
-    def get_opening_message(self):
-        """Generate personalized AI opening message"""
-        opening = self.ai_service.generate_opening_message(self.customer_info)
+    def get_opening_message(self, prepared_opening=None):
+        """Generate personalized AI opening message (or use one prepared ahead of the call)"""
+        opening = prepared_opening or self.ai_service.generate_opening_message(self.customer_info, usage=self.usage)
         self.last_ai_message = opening
         self.conversation_log.append(f"AI Agent: {opening}")
         return opening
@@ -157,14 +208,30 @@ class VoiceConversationSimulator:
             print(f"[DEBUG] Conversation ending - Customer expressed inconvenience")
             return closing_message
 
-        # Generate AI response for normal conversation
-        ai_result = self.ai_service.generate_response(
-            customer_response=customer_response,
-            conversation_history=self.conversation_log,
-            customer_info=self.customer_info,
-            conversation_state=self.conversation_state,
-            customer_preference=self.customer_preference
-        )
+        current_stage = self.stage_tracker.stage(self.conversation_log, self.customer_preference)
+        appointment_note = self._handle_appointment(customer_response, current_stage)
+
+        # A reply speculated from interim speech is used if it was made from the same state and near-same words
+        speculative = None
+        if self.speculation is not None:
+            speculative = self.speculation.commit(customer_response, self._speculation_key(
+                len(self.conversation_log) - 1, current_stage, self.customer_preference, appointment_note
+            ))
+        if speculative is not None:
+            ai_result, self.context = speculative
+        else:
+            # Generate AI response for normal conversation
+            ai_result = self.ai_service.generate_response(
+                customer_response=customer_response,
+                conversation_history=self.conversation_log,
+                customer_info=self.customer_info,
+                conversation_state=self.conversation_state,
+                customer_preference=self.customer_preference,
+                current_stage=current_stage,
+                context=self.context,
+                usage=self.usage,
+                appointment_note=appointment_note
+            )
         
         ai_response = ai_result['ai_response']
         analysis = ai_result['analysis']
@@ -207,8 +274,106 @@ class VoiceConversationSimulator:
         self.conversation_log.append(f"AI Agent: {ai_response}")
         return ai_response
     
+    def _handle_appointment(self, customer_response, current_stage):
+        """Reserve the slot the customer named, or list real free slots; returns a note for the agent prompt"""
+        sector = flow_engine.sector(self.sector)
+        self._slot_conflict = False
+        if not self._is_scheduling_turn(current_stage):
+            return None
+
+        config = sector.appointments
+        start = parse_slot(customer_response) or self._accepted_offer(customer_response)
+        self._offered_slots = []
+        if start is None:
+            if self.appointment is not None or current_stage != sector.scheduling_stage:
+                return None
+            free = slot_book.free_slots(self.sector, config)
+            if not free:
+                return None
+            self._offered_slots = free
+            return f"FREE SLOTS (only offer these): {'; '.join(format_slot(slot) for slot in free)}"
+
+        booking, alternatives = slot_book.reserve(
+            self.sector, config, start, customer=self.customer_name, phone=self.phone_number, replaces=self.appointment
+        )
+        if booking is None:
+            self._slot_conflict = True
+            print(f"[DEBUG] Requested slot {start} is not available")
+            self._offered_slots = alternatives
+            offers = '; '.join(format_slot(slot) for slot in alternatives) or 'another day'
+            return f"{format_slot(start)} IS NOT AVAILABLE. Do not confirm it. Offer these free slots instead: {offers}"
+
+        self.appointment = booking
+        self.meeting_scheduled_with_time = True
+        self.application_initiated = True
+        print(f"[DEBUG] ✅ Booked {booking.start} with {booking.assignee}")
+        return f"BOOKED: {format_slot(booking.start)} with {booking.assignee}. Confirm this exact day and time."
+
+    def _is_scheduling_turn(self, current_stage):
+        return current_stage == flow_engine.sector(self.sector).scheduling_stage or any(
+            phrase in self.last_ai_message.lower() for phrase in ['schedule', 'what time', 'when would', 'convenient', 'which day']
+        )
+
+    def _speculation_key(self, history_length, stage, customer_preference, appointment_note=None):
+        return (history_length, self.conversation_state, stage, customer_preference, appointment_note)
+
+    def plan_speculative_reply(self, customer_response):
+        """
+        generate_response() arguments for a turn that hasn't been submitted yet, without touching
+        this call's state. Returns (plan, None), or (None, reason) when the turn must not be
+        speculated: it would end the call, book a slot, or is being recorded.
+        """
+        if self.closing_sent or self.meeting_scheduled_with_time:
+            return None, 'closing'
+        if self.cassette is not None:
+            return None, 'recording'
+        if (self._check_for_explicit_disinterest(customer_response) or self._check_for_explicit_end(customer_response)
+                or self._check_for_inconvenience(customer_response)):
+            return None, 'ending'
+
+        history = self.conversation_log + [f"Customer: {customer_response}"]
+        customer_preference = self._preference_after(customer_response)
+        current_stage = self.stage_tracker.preview(history, customer_preference)
+        if self._is_scheduling_turn(current_stage):
+            # Slots are reserved as part of the real turn
+            return None, 'scheduling'
+        return {
+            'kwargs': {
+                'customer_response': customer_response,
+                'conversation_history': history,
+                'customer_info': self.customer_info,
+                'conversation_state': self.conversation_state,
+                'customer_preference': customer_preference,
+                'current_stage': current_stage,
+                # The running summary is folded on a copy; it replaces the real one only if the reply is used
+                'context': copy.deepcopy(self.context),
+                'usage': self.usage
+            },
+            'key': self._speculation_key(len(self.conversation_log), current_stage, customer_preference)
+        }, None
+
+    def _accepted_offer(self, customer_response):
+        """The offered slot the customer agreed to ("okay", "the second one"), or None"""
+        if not self._offered_slots:
+            return None
+        words = _WORD_RE.findall(customer_response.lower())
+        if not words or any(word in _NEGATIONS for word in words):
+            return None
+        for word in words:
+            position = _OFFER_POSITIONS.get(word)
+            if position is not None:
+                return self._offered_slots[position] if position < len(self._offered_slots) else None
+        # Only a bare acceptance takes the first slot; anything more is left to the agent
+        if any(word in _ACCEPT_WORDS for word in words) and all(
+                word in _ACCEPT_WORDS or word in _ACCEPT_FILLER for word in words):
+            return self._offered_slots[0]
+        return None
+
     def _check_meeting_scheduled(self, ai_response, customer_response):
         """Check if meeting was explicitly scheduled with specific time - FIXED FOR REAL ESTATE"""
+        if self._slot_conflict:
+            # The named slot was taken - keywords like "tomorrow" must not count as a booking
+            return
         ai_lower = ai_response.lower()
         customer_lower = customer_response.lower()
         
@@ -286,38 +451,25 @@ class VoiceConversationSimulator:
             return True
         return False
     
-    def _extract_customer_preference(self, response):
-        """Extract and update customer preferences from response"""
+    def _preference_after(self, response):
+        """The customer preference once this response is taken into account"""
         response_lower = response.lower()
+        preference = self.customer_preference
         
         # Check for follow-up requests (but NOT if they said "not busy")
         if "not busy" not in response_lower and "i'm not busy" not in response_lower:
             follow_up_keywords = ['call me tomorrow', 'call tomorrow', 'tomorrow', 'later', 'busy', 'stressed']
             if any(keyword in response_lower for keyword in follow_up_keywords):
-                self.customer_preference = 'follow_up_requested'
-                print(f"[DEBUG] Customer requested follow-up")
+                preference = 'follow_up_requested'
         
-        if self.sector == 'banking':
-            if 'credit card' in response_lower:
-                self.customer_preference = 'credit card'
-                print(f"[DEBUG] Updated preference to: credit card")
-            elif 'personal loan' in response_lower or 'loan' in response_lower:
-                self.customer_preference = 'personal loan'
-                print(f"[DEBUG] Updated preference to: personal loan")
-        elif self.sector == 'real_estate':
-            if '1 bhk' in response_lower or '1bhk' in response_lower:
-                self.customer_preference = '1 BHK'
-            elif '2 bhk' in response_lower or '2bhk' in response_lower:
-                self.customer_preference = '2 BHK'
-            elif '3 bhk' in response_lower or '3bhk' in response_lower:
-                self.customer_preference = '3 BHK'
-        elif self.sector == 'medical':
-            if 'health checkup' in response_lower or 'checkup' in response_lower:
-                self.customer_preference = 'health checkup'
-                print(f"[DEBUG] Updated preference to: health checkup")
-            elif 'consultation' in response_lower:
-                self.customer_preference = 'medical consultation'
-                print(f"[DEBUG] Updated preference to: medical consultation")
+        return flow_engine.sector(self.sector).match_preference(response_lower) or preference
+    
+    def _extract_customer_preference(self, response):
+        """Extract and update customer preferences from response"""
+        preference = self._preference_after(response)
+        if preference != self.customer_preference:
+            self.customer_preference = preference
+            print(f"[DEBUG] Updated preference to: {preference}")
     
     def _check_for_explicit_completion(self, customer_response):
         """Check if customer has EXPLICITLY confirmed a concrete next step"""
@@ -413,28 +565,16 @@ class VoiceConversationSimulator:
         else:
             follow_up_time = 'at a better time'
         
-        closings = {
-            'banking': f"I completely understand, {self.customer_name}. I'll give you a call {follow_up_time} to discuss our banking services. Thank you for your time!",
-            'real_estate': f"No problem at all, {self.customer_name}! I'll reach out {follow_up_time} regarding our properties. Have a great day!",
-            'medical': f"Of course, {self.customer_name}. I'll contact you {follow_up_time} about our health services. Take care!"
-        }
-        
-        return closings.get(self.sector, f"I understand, {self.customer_name}. I'll call you {follow_up_time}. Thank you!")
+        template = flow_engine.sector(self.sector).templates['follow_up_closing']
+        return template.format(name=self.customer_name, when=follow_up_time)
     
     def _handle_completion(self):
         """Handle conversation completion"""
         self.application_initiated = True
         self.end_time = datetime.now()
         
-        if self.sector == 'real_estate':
-            closing = f"Perfect, {self.customer_name}! I've scheduled your site visit for this weekend. You'll receive a confirmation call with all the details within 24 hours. Thank you for your interest!"
-        elif self.sector == 'banking':
-            product = self.customer_preference or 'application'
-            closing = f"Excellent! I'll send you the {product} details and application link right away via SMS. You should receive it within the next few minutes. Thank you for choosing us!"
-        elif self.sector == 'medical':
-            closing = f"Great! Your consultation appointment is being scheduled. Our team will call you within 24 hours to confirm the exact date and time. Take care!"
-        else:
-            closing = f"Thank you so much, {self.customer_name}! I'll process this right away and you'll receive confirmation shortly. Have a wonderful day!"
+        template = flow_engine.sector(self.sector).templates['completion_closing']
+        closing = template.format(name=self.customer_name, product=self.customer_preference or 'application')
         
         self.conversation_log.append(f"AI Agent: {closing}")
         self.closing_sent = True
@@ -462,15 +602,15 @@ class VoiceConversationSimulator:
         # CRITICAL FIX FOR MEDICAL: Require MINIMUM interactions AND substantive questions
         # Medical needs at least: Opening -> Service type -> Details -> Schedule -> Confirm
         min_interactions = 6
-        min_substantive_questions = 2  # Must ask at least 2 real questions beyond opening
+        min_substantive_questions = flow_engine.sector(self.sector).min_substantive_questions
         
         if self.total_interactions < min_interactions:
             print(f"[DEBUG] Conversation too short ({self.total_interactions}/{min_interactions} interactions) - NOT ending")
             return False
         
-        # NEW: For medical, ensure we've asked substantive questions
-        if self.sector == 'medical' and self.substantive_questions_asked < min_substantive_questions:
-            print(f"[DEBUG] MEDICAL: Not enough substantive questions ({self.substantive_questions_asked}/{min_substantive_questions}) - NOT ending")
+        # Sectors like medical must have asked substantive questions first (min_substantive_questions in flows.json)
+        if self.substantive_questions_asked < min_substantive_questions:
+            print(f"[DEBUG] {self.sector.upper()}: Not enough substantive questions ({self.substantive_questions_asked}/{min_substantive_questions}) - NOT ending")
             return False
         
         last_ai_lower = self.last_ai_message.lower()
@@ -575,14 +715,13 @@ class VoiceConversationSimulator:
         if self.meeting_scheduled_with_time or (self.application_initiated and self.explicit_confirmation_received):
             self.action_required = 'Yes'
             product = self.customer_preference or 'service'
-            if self.sector == 'medical':
-                self.next_action = f"Schedule {product.title()} Appointment - CONFIRMED"
-            elif self.sector == 'real_estate':
-                self.next_action = f"Site Visit Scheduled - CONFIRMED"
-            else:
-                self.next_action = f"Process {product.title()} Application/Booking - MEETING SCHEDULED"
+            templates = flow_engine.sector(self.sector).templates
+            self.next_action = templates['scheduled_action'].format(Product=product.title())
             self.action_assignee = 'Application Team'
-            self.remarks = f"Customer {self.customer_name} scheduled {'appointment' if self.sector == 'medical' else 'site visit' if self.sector == 'real_estate' else 'meeting'} with specific time. Follow up as scheduled."
+            if self.appointment is not None:
+                self.next_action += f" - {format_slot(self.appointment.start)}"
+                self.action_assignee = self.appointment.assignee
+            self.remarks = f"Customer {self.customer_name} scheduled {templates['scheduled_noun']} with specific time. Follow up as scheduled."
         elif self.customer_preference == 'follow_up_requested':
             self.action_required = 'Yes'
             self.next_action = 'Follow-up Call Tomorrow'
@@ -614,6 +753,7 @@ class VoiceConversationSimulator:
         
         conversation_duration = (self.end_time - self.start_time).total_seconds() / 60 if self.end_time else 0
         self.remarks += f" Duration: {conversation_duration:.1f}min. Interactions: {self.total_interactions}. Meaningful responses: {self.meaningful_responses_count}."
+        self.usage.record_outcome(self.customer_interest_level, self.lead_score)
     
     def _set_high_interest_actions(self):
         """Set actions for high-interest customers"""
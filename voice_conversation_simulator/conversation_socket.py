@@ -0,0 +1,178 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+_connections = 0
+_connections_lock = threading.Lock()
+
+
+class ConversationSocket:
+    """
+    Full-duplex channel for one conversation.
+
+    Browser → server (JSON text frames):
+        {"type": "transcript", "text": ..., "turn_id": ...}
+        {"type": "barge_in"}   customer talked over the agent - drop pending audio
+        {"type": "speak", "text": ...}   push audio for a line sent elsewhere
+        {"type": "end"}
+        {"type": "ping"}
+
+    Server → browser:
+        {"type": "turn", "turn_id": ..., ...}   same body as /api/process_response
+        {"type": "audio", "turn_id": ..., "mimetype": ..., "profile": ...}
+            followed by one binary frame with the audio
+        {"type": "audio_unavailable", "turn_id": ...}   use browser TTS
+        {"type": "ended", "results": ...}
+        {"type": "error", "error": ...}   also sent instead of "ended" if ending fails
+
+    Turns run one at a time on a worker thread so a barge-in can be read
+    while a reply is still being generated; audio is synthesized on a
+    separate thread and pushed as soon as it is ready.
+    """
+
+    def __init__(self, ws, conversation_id, run_turn, synthesize, end_conversation, audio_profile, mimetype, on_interim=None):
+        self.ws = ws
+        self.conversation_id = conversation_id
+        self.run_turn = run_turn
+        self.synthesize = synthesize
+        self.end_conversation = end_conversation
+        self.on_interim = on_interim
+        self.audio_profile = audio_profile
+        self.mimetype = mimetype
+        self._send_lock = threading.Lock()
+        # Bumped on every new turn or barge-in; audio for an older generation is dropped
+        self._generation = 0
+        self._turns = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ws-turn-{conversation_id[:8]}")
+        self._audio = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ws-audio-{conversation_id[:8]}")
+        self._closed = False
+
+    def _send(self, payload):
+        if self._closed:
+            return False
+        try:
+            with self._send_lock:
+                if isinstance(payload, bytes):
+                    self.ws.send(payload)
+                else:
+                    self.ws.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            print(f"[WS] Send failed for {self.conversation_id}: {e}")
+            self._closed = True
+            return False
+
+    def _send_audio_frames(self, header, audio):
+        # Header and binary frame must not interleave with another turn's audio
+        with self._send_lock:
+            if self._closed:
+                return
+            try:
+                self.ws.send(json.dumps(header))
+                self.ws.send(audio)
+            except Exception as e:
+                print(f"[WS] Send failed for {self.conversation_id}: {e}")
+                self._closed = True
+
+    def _push_audio(self, turn_id, text, generation):
+        if generation != self._generation:
+            metrics.incr('ws_audio_dropped', reason='superseded')
+            return
+        audio = self.synthesize(text, self.audio_profile)
+        if generation != self._generation:
+            # Customer barged in while we were synthesizing
+            metrics.incr('ws_audio_dropped', reason='barge_in')
+            return
+        if not audio:
+            self._send({'type': 'audio_unavailable', 'turn_id': turn_id})
+            return
+        self._send_audio_frames(
+            {'type': 'audio', 'turn_id': turn_id, 'mimetype': self.mimetype, 'profile': self.audio_profile, 'bytes': len(audio)},
+            audio
+        )
+        metrics.incr('ws_audio_pushed', profile=self.audio_profile)
+
+    def _handle_transcript(self, message, generation):
+        turn_id = message.get('turn_id')
+        try:
+            result, source = self.run_turn(message.get('text', ''), turn_id)
+        except Exception as e:
+            print(f"[WS] Error processing turn {turn_id}: {e}")
+            self._send({'type': 'error', 'turn_id': turn_id, 'error': str(e)})
+            return
+        self._send(dict(result, type='turn', turn_id=turn_id, source=source))
+        ai_response = result.get('ai_response')
+        if ai_response and message.get('audio', True):
+            self._audio.submit(self._push_audio, turn_id, ai_response, generation)
+
+    def _end(self):
+        try:
+            results = self.end_conversation()
+        except Exception as e:
+            print(f"[WS] Error ending conversation {self.conversation_id}: {e}")
+            self._send({'type': 'error', 'error': f"Could not end conversation: {e}"})
+            return
+        self._send({'type': 'ended', 'results': results})
+
+    def speak(self, text, turn_id='opening'):
+        """Push audio for a line the server already sent some other way (e.g. the opening)"""
+        self._audio.submit(self._push_audio, turn_id, text, self._generation)
+
+    def _dispatch(self, message):
+        kind = message.get('type')
+        metrics.incr('ws_messages', type=kind or 'unknown')
+        if kind == 'transcript':
+            self._generation += 1
+            self._turns.submit(self._handle_transcript, message, self._generation)
+        elif kind == 'interim':
+            # Partial speech - may start a speculative reply; nothing is sent back
+            if self.on_interim is not None:
+                self.on_interim(message.get('text', ''))
+        elif kind == 'barge_in':
+            self._generation += 1
+        elif kind == 'speak':
+            self.speak(message.get('text', ''), message.get('turn_id', 'speak'))
+        elif kind == 'end':
+            self._generation += 1
+            # Let any queued turn finish first so the saved record is complete
+            self._turns.submit(self._end).result()
+            return False
+        elif kind == 'ping':
+            self._send({'type': 'pong'})
+        else:
+            self._send({'type': 'error', 'error': f"Unknown message type '{kind}'"})
+        return True
+
+    def serve(self, opening_text=None):
+        global _connections
+        with _connections_lock:
+            _connections += 1
+            metrics.set_gauge('ws_connections', _connections)
+        print(f"[WS] 🔌 Connected: {self.conversation_id} (audio: {self.audio_profile})")
+        self._send({'type': 'ready', 'conversation_id': self.conversation_id, 'audio_profile': self.audio_profile})
+        if opening_text:
+            self.speak(opening_text)
+        try:
+            while not self._closed:
+                try:
+                    raw = self.ws.receive()
+                except Exception:
+                    break
+                if raw is None:
+                    break
+                try:
+                    message = json.loads(raw)
+                except (TypeError, ValueError):
+                    self._send({'type': 'error', 'error': 'Messages must be JSON text frames'})
+                    continue
+                if not self._dispatch(message):
+                    break
+        finally:
+            self._closed = True
+            self._turns.shutdown(wait=False)
+            self._audio.shutdown(wait=False)
+            with _connections_lock:
+                _connections -= 1
+                metrics.set_gauge('ws_connections', _connections)
+            print(f"[WS] Disconnected: {self.conversation_id}")
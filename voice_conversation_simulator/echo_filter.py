@@ -0,0 +1,102 @@
+import re
+import time
+from collections import deque
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Echo checks need a few words to be meaningful - "yes" is in half of all AI lines
+MIN_ECHO_WORDS = 3
+ECHO_WORD_OVERLAP = 0.8
+ECHO_BIGRAM_OVERLAP = 0.6
+# An echo replays most of the AI line; a short answer naming one of the offered options doesn't
+ECHO_MIN_COVERAGE = 0.6
+
+DUPLICATE_WINDOW_SECONDS = 8.0
+DUPLICATE_SIMILARITY = 0.9
+
+
+def tokenize(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+def _bigrams(words):
+    return set(zip(words, words[1:]))
+
+
+class EchoGuard:
+    """
+    Per-conversation filter that rejects the agent's own TTS picked up by the
+    mic, and near-duplicate customer turns, before they reach the LLM.
+
+    The word/bigram index of the last AI message is built once when the
+    message changes; each check is then a few set lookups over the
+    utterance's own words.
+    """
+
+    def __init__(self, recent_turns=3):
+        self._ai_text = None
+        self._ai_joined = ''
+        self._ai_length = 0
+        self._ai_words = set()
+        self._ai_bigrams = set()
+        self._recent = deque(maxlen=recent_turns)
+        self.suppressed = {'echo': 0, 'duplicate': 0}
+
+    def index_ai_message(self, ai_message):
+        """Rebuild the AI-side index only when the message actually changed"""
+        if ai_message == self._ai_text:
+            return
+        words = tokenize(ai_message)
+        self._ai_text = ai_message
+        self._ai_joined = ' '.join(words)
+        self._ai_length = len(words)
+        self._ai_words = set(words)
+        self._ai_bigrams = _bigrams(words)
+
+    def _is_echo(self, words):
+        if len(words) < MIN_ECHO_WORDS or not self._ai_words:
+            return False
+        if len(words) < ECHO_MIN_COVERAGE * self._ai_length:
+            return False
+        if ' '.join(words) in self._ai_joined:
+            return True
+        # A misheard echo still has both the AI's words and their order
+        word_overlap = sum(1 for w in words if w in self._ai_words) / len(words)
+        bigrams = _bigrams(words)
+        bigram_overlap = len(bigrams & self._ai_bigrams) / len(bigrams) if bigrams else 0.0
+        return word_overlap >= ECHO_WORD_OVERLAP and bigram_overlap >= ECHO_BIGRAM_OVERLAP
+
+    def _is_duplicate(self, words, now):
+        word_set = set(words)
+        for previous_words, previous_set, seen_at, ai_text in self._recent:
+            if now - seen_at > DUPLICATE_WINDOW_SECONDS:
+                continue
+            if len(words) < MIN_ECHO_WORDS:
+                # Short answers ("yes", "okay") legitimately repeat across AI turns
+                if words == previous_words and ai_text == self._ai_text:
+                    return True
+                continue
+            union = word_set | previous_set
+            if union and len(word_set & previous_set) / len(union) >= DUPLICATE_SIMILARITY:
+                return True
+        return False
+
+    def check(self, utterance, ai_message):
+        """
+        Return None if the utterance should be processed, or the reason
+        ('echo' / 'duplicate') it should be dropped.
+        """
+        self.index_ai_message(ai_message)
+        words = tokenize(utterance)
+        now = time.monotonic()
+
+        if self._is_echo(words):
+            reason = 'echo'
+        elif self._is_duplicate(words, now):
+            reason = 'duplicate'
+        else:
+            self._recent.append((words, set(words), now, self._ai_text))
+            return None
+
+        self.suppressed[reason] += 1
+        return reason
@@ -1,9 +1,60 @@
 import os
-import requests
+import struct
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from rate_limiter import get_limiter, RateLimitExceeded, PRIORITY_TURN
+from metrics import metrics
 
 load_dotenv()
 
+# Client-facing profile -> (ElevenLabs output_format, Content-Type)
+AUDIO_PROFILES = {
+    'standard': ('mp3_44100_128', 'audio/mpeg'),
+    'mobile': ('mp3_44100_64', 'audio/mpeg'),
+    'low_bandwidth': ('mp3_22050_32', 'audio/mpeg'),
+    'opus': ('opus_48000_32', 'audio/ogg'),
+    'pcm': ('pcm_16000', 'audio/wav'),
+}
+
+DEFAULT_AUDIO_PROFILE = os.getenv('TTS_DEFAULT_AUDIO_PROFILE', 'standard')
+
+# Network Information API effectiveType -> profile
+NETWORK_PROFILES = {
+    'slow-2g': 'low_bandwidth',
+    '2g': 'low_bandwidth',
+    '3g': 'mobile',
+}
+
+
+def resolve_audio_profile(requested=None, network=None, save_data=False, accept=None):
+    """Pick the audio profile for a client from its explicit choice, network hints and Accept header"""
+    if requested in AUDIO_PROFILES:
+        profile = requested
+    elif save_data:
+        profile = 'low_bandwidth'
+    else:
+        profile = NETWORK_PROFILES.get(network, DEFAULT_AUDIO_PROFILE)
+
+    # Only honour non-MP3 profiles when the client says it can play them
+    if accept and profile in ('opus', 'pcm'):
+        content_type = AUDIO_PROFILES[profile][1]
+        if content_type not in accept and 'audio/*' not in accept and '*/*' not in accept:
+            profile = 'mobile' if profile == 'opus' else DEFAULT_AUDIO_PROFILE
+    return profile
+
+
+def wrap_pcm_as_wav(pcm_data, sample_rate=16000, channels=1, sample_width=2):
+    """Prefix raw little-endian PCM with a 44-byte WAV header so browsers can play it directly"""
+    byte_rate = sample_rate * channels * sample_width
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + len(pcm_data), b'WAVE', b'fmt ', 16, 1, channels,
+        sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b'data', len(pcm_data)
+    )
+    return header + pcm_data
+
 class ElevenLabsTTS:
     def __init__(self):
         self.api_key = os.getenv('ELEVENLABS_API_KEY')
@@ -22,6 +73,12 @@ class ElevenLabsTTS:
             print(f"Voice ID: {self.voice_id}")
         print(f"{'='*50}\n")
         
+        # Repeated phrases (closings, prepared openings) are served from memory; key includes the format
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_max_bytes = int(os.getenv('TTS_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+        self._cache_lock = threading.Lock()
+        
         if self.api_key and self.voice_id:
             self.enabled = True
             print(f"✅ ElevenLabs TTS enabled")
@@ -33,15 +90,52 @@ class ElevenLabsTTS:
             if not self.voice_id:
                 print("   ❌ Missing ELEVENLABS_VOICE_ID in .env")
     
-    def text_to_speech(self, text):
+    def _cache_get(self, key):
+        with self._cache_lock:
+            audio = self._cache.get(key)
+            if audio is not None:
+                self._cache.move_to_end(key)
+            return audio
+    
+    def _cache_put(self, key, audio):
+        if len(audio) > self._cache_max_bytes:
+            return
+        with self._cache_lock:
+            if key in self._cache:
+                return
+            self._cache[key] = audio
+            self._cache_bytes += len(audio)
+            while self._cache_bytes > self._cache_max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+    
+    def text_to_speech(self, text, priority=PRIORITY_TURN, profile=None, usage=None, stage=None, transport=None):
+        """Synthesize text; `transport` replaces requests.post (cassette record/replay)"""
         if not self.enabled:
             print("⚠️ ElevenLabs disabled - API key or Voice ID missing")
             return None
         
-        url = f"{self.base_url}/text-to-speech/{self.voice_id}"
+        profile = profile if profile in AUDIO_PROFILES else DEFAULT_AUDIO_PROFILE
+        output_format = AUDIO_PROFILES[profile][0]
+        cache_key = (self.voice_id, output_format, text)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            metrics.incr('tts_cache_hit', profile=profile)
+            metrics.incr('tts_bytes_sent', len(cached), profile=profile)
+            return cached
+        
+        # Characters are the ElevenLabs quota unit; shed to browser TTS rather than queue forever
+        limiter = get_limiter('elevenlabs')
+        try:
+            limiter.acquire(priority, tokens=len(text))
+        except RateLimitExceeded as e:
+            print(f"[ELEVENLABS] ⚠️ {e} - falling back to browser TTS")
+            return None
+        
+        url = f"{self.base_url}/text-to-speech/{self.voice_id}?output_format={output_format}"
         
         headers = {
-            "Accept": "audio/mpeg",
+            "Accept": AUDIO_PROFILES[profile][1],
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
@@ -59,18 +153,30 @@ class ElevenLabsTTS:
             }
         }
         
+        import requests  # deferred to the first synthesis to keep app start-up light
         try:
             print(f"\n[ELEVENLABS] Making request to: {url}")
             print(f"[ELEVENLABS] Text length: {len(text)} chars")
             
-            response = requests.post(url, json=data, headers=headers, timeout=15)
+            post = transport or requests.post
+            response = post(url, json=data, headers=headers, timeout=15)
             
             print(f"[ELEVENLABS] Response status: {response.status_code}")
             
             if response.status_code == 200:
-                audio_size = len(response.content)
-                print(f"[ELEVENLABS] ✅ Success! Audio size: {audio_size} bytes")
-                return response.content
+                audio = response.content
+                if output_format.startswith('pcm_'):
+                    audio = wrap_pcm_as_wav(audio, sample_rate=int(output_format.split('_')[1]))
+                print(f"[ELEVENLABS] ✅ Success! Audio size: {len(audio)} bytes ({output_format})")
+                self._cache_put(cache_key, audio)
+                metrics.incr('tts_bytes_sent', len(audio), profile=profile)
+                if usage is not None:
+                    usage.record_tts(len(text), stage)
+                return audio
+            elif response.status_code == 429:
+                limiter.backoff(float(response.headers.get('Retry-After', 5)))
+                print(f"[ELEVENLABS] ❌ Rate limited (429)")
+                return None
             else:
                 print(f"[ELEVENLABS] ❌ Error: {response.status_code}")
                 print(f"[ELEVENLABS] Response: {response.text[:200]}")
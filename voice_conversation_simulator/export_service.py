@@ -0,0 +1,236 @@
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+EXPORT_MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def encode_cursor(position):
+    """Encode a read position as an opaque URL-safe cursor"""
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if (not isinstance(position, dict) or not isinstance(position.get('row'), int)
+            or not isinstance(position.get('shard'), str)):
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"'{field}' must be a date in YYYY-MM-DD format")
+
+
+def _parse_score(value, field):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"'{field}' must be a number")
+
+
+def _normalize_sector(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def parse_export_params(args):
+    """Validate export query parameters (format, filters, pagination)"""
+    export_format = (args.get('format') or 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    filters = {
+        'date_from': _parse_date(args['date_from'], 'date_from') if args.get('date_from') else None,
+        'date_to': _parse_date(args['date_to'], 'date_to') if args.get('date_to') else None,
+        'sector': _normalize_sector(args['sector']) if args.get('sector') else None,
+        'min_score': _parse_score(args['min_score'], 'min_score') if args.get('min_score') else None,
+        'max_score': _parse_score(args['max_score'], 'max_score') if args.get('max_score') else None,
+    }
+
+    limit = None
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError("'limit' must be an integer")
+        if limit < 1:
+            raise ValueError("'limit' must be positive")
+        limit = min(limit, EXPORT_MAX_PAGE_SIZE)
+
+    return {
+        'format': export_format,
+        'filters': filters,
+        'limit': limit,
+        'cursor': decode_cursor(args.get('cursor')),
+    }
+
+
+def _record_matches(record, filters):
+    """Apply date/sector/score filters to a single record"""
+    if filters['date_from'] or filters['date_to']:
+        date_value = record.get('Date')
+        if isinstance(date_value, datetime):
+            date_value = date_value.strftime('%Y-%m-%d')
+        date_value = str(date_value or '')
+        if filters['date_from'] and date_value < filters['date_from']:
+            return False
+        if filters['date_to'] and date_value > filters['date_to']:
+            return False
+
+    if filters['sector'] and _normalize_sector(record.get('Sector')) != filters['sector']:
+        return False
+
+    if filters['min_score'] is not None or filters['max_score'] is not None:
+        try:
+            score = float(record.get('Lead Score (1-10)'))
+        except (TypeError, ValueError):
+            return False
+        if filters['min_score'] is not None and score < filters['min_score']:
+            return False
+        if filters['max_score'] is not None and score > filters['max_score']:
+            return False
+
+    return True
+
+
+def iter_log_rows(excel_path, start_row=2):
+    """Yield (row_number, record) pairs from one log workbook in read-only mode"""
+    if not os.path.exists(excel_path):
+        return
+
+    import openpyxl  # loaded on first export, not at app start
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook['Conversations']
+        header = None
+        for row_number, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+            if row_number == 1:
+                header = [str(h) for h in values if h is not None]
+                continue
+            if row_number < start_row:
+                continue
+            if values is None or all(v is None for v in values):
+                continue
+            yield row_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_shard_rows(shards, cursor=None):
+    """Yield (shard_name, row_number, record) across shards in order, resuming at the cursor"""
+    resuming = cursor is not None
+    for name, path in shards:
+        if resuming and name != cursor['shard']:
+            continue
+        start_row = cursor['row'] if resuming else 2
+        resuming = False
+        for row_number, record in iter_log_rows(path, start_row):
+            yield name, row_number, record
+
+
+def select_records(shards, filters, limit=None, cursor=None):
+    """
+    Select matching records starting at the cursor.
+
+    Without a limit this is a lazy generator over every shard. With a limit
+    at most `limit` records are held, so the next cursor can be known before
+    the response starts streaming.
+    """
+    if cursor and cursor['shard'] not in [name for name, _ in shards]:
+        raise ValueError('Cursor refers to an unknown log shard')
+
+    matches = (
+        (shard_name, row_number, record)
+        for shard_name, row_number, record in iter_shard_rows(shards, cursor)
+        if _record_matches(record, filters)
+    )
+
+    if limit is None:
+        return (record for _, _, record in matches), None
+
+    page = []
+    next_cursor = None
+    for shard_name, row_number, record in matches:
+        if len(page) == limit:
+            next_cursor = encode_cursor({'shard': shard_name, 'row': row_number})
+            break
+        page.append(record)
+    return iter(page), next_cursor
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(records, columns):
+    """Yield CSV text one row at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(records, columns):
+    """Yield one JSON object per line"""
+    for record in records:
+        yield json.dumps({col: record.get(col) for col in columns}, default=_json_default, ensure_ascii=False) + '\n'
+
+
+def stream_xlsx(records, columns):
+    """Build the workbook in openpyxl write-only mode and yield the file in chunks"""
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Conversations')
+    worksheet.append(columns)
+    for record in records:
+        worksheet.append([record.get(col) for col in columns])
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_export(export_format, records, columns):
+    """Dispatch to the serializer for the requested format"""
+    serializers = {
+        'csv': stream_csv,
+        'jsonl': stream_jsonl,
+        'xlsx': stream_xlsx,
+    }
+    return serializers[export_format](records, columns)
@@ -0,0 +1,282 @@
+"""
+Declarative conversation flows.
+
+Sectors, agent personas, scripted lines, stages, stage-transition keywords
+and prompt fragments live in flows.json (or CONVERSATION_FLOWS_PATH). The
+file is compiled once into an immutable table; edits are picked up on the
+next lookup after FLOWS_RELOAD_SECONDS without restarting, and a file that
+fails validation leaves the previous table in place.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from metrics import metrics
+
+DEFAULT_FLOWS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flows.json')
+
+REQUIRED_SECTOR_KEYS = ['persona', 'opening', 'interested', 'not_interested', 'closing', 'stages', 'instructions']
+REQUIRED_TEMPLATES = ['fallback_opening', 'follow_up_closing', 'completion_closing', 'scheduled_action', 'scheduled_noun']
+PREFERENCE_PLACEHOLDER = '{customer_preference}'
+ROUTED_CALLS = ('generation', 'analysis')
+
+# One model configuration; llm=False means answer without a model (stage template / heuristic analysis)
+ModelTier = namedtuple('ModelTier', ['name', 'llm', 'model', 'max_tokens', 'temperature'])
+
+
+# Used when the flow file defines no tiers: today's single-model behaviour
+DEFAULT_MODEL_TIERS = {
+    'template': {'llm': False},
+    'standard': {'model': 'gpt-4o-mini', 'max_tokens': 100, 'temperature': 0.7},
+    'analysis': {'model': 'gpt-4o-mini', 'max_tokens': 60, 'temperature': 0.3},
+    'heuristic': {'llm': False}
+}
+DEFAULT_ROUTING = {'generation': 'standard', 'analysis': 'analysis'}
+
+# Bookable hours [open, close), weekdays (Monday=0) and who takes the appointment
+DEFAULT_APPOINTMENTS = {'assignees': ['Application Team'], 'duration_minutes': 30, 'hours': [10, 18], 'days': [0, 1, 2, 3, 4, 5]}
+
+
+def _compile_tiers(raw_tiers):
+    tiers = {}
+    for name, spec in raw_tiers.items():
+        llm = spec.get('llm', True)
+        if llm and ('max_tokens' not in spec or 'temperature' not in spec):
+            raise ValueError(f"Model tier '{name}' needs max_tokens and temperature")
+        tiers[name] = ModelTier(name, llm, spec.get('model'), spec.get('max_tokens'), spec.get('temperature'))
+    return MappingProxyType(tiers)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class CompiledSector:
+    """Read-only, lookup-ready view of one sector's flow"""
+
+    __slots__ = ('name', 'persona', 'flows', 'stages', 'stage_rules', 'default_stage', 'preference_stage',
+                 'scheduling_stage', 'min_substantive_questions', 'preferences', 'instructions', 'templates',
+                 'routes', 'default_route', 'appointments')
+
+    def __init__(self, name, raw, default_stage, tiers, default_routing):
+        missing = [key for key in REQUIRED_SECTOR_KEYS if key not in raw]
+        if missing:
+            raise ValueError(f"Sector '{name}' is missing {', '.join(missing)}")
+        templates = raw.get('templates', {})
+        missing = [key for key in REQUIRED_TEMPLATES if key not in templates]
+        if missing:
+            raise ValueError(f"Sector '{name}' is missing templates {', '.join(missing)}")
+
+        stages = tuple(raw['stages'])
+        known_stages = set(stages)
+        for rule in raw.get('stage_rules', []):
+            if rule['stage'] not in known_stages:
+                raise ValueError(f"Sector '{name}' rule targets unknown stage '{rule['stage']}'")
+        for key in ('preference_stage', 'scheduling_stage'):
+            if raw.get(key) and raw[key] not in known_stages:
+                raise ValueError(f"Sector '{name}' {key} '{raw[key]}' is not one of its stages")
+
+        self.name = name
+        self.persona = _freeze(raw['persona'])
+        self.flows = _freeze({key: raw[key] for key in ('opening', 'interested', 'not_interested', 'closing')})
+        self.stages = stages
+        # Ordered (stage, keywords): the first rule whose keyword has appeared in the call wins
+        self.stage_rules = tuple((rule['stage'], tuple(k.lower() for k in rule['keywords'])) for rule in raw.get('stage_rules', []))
+        self.default_stage = raw.get('default_stage', default_stage)
+        self.preference_stage = raw.get('preference_stage')
+        self.scheduling_stage = raw.get('scheduling_stage')
+        # Real questions the agent must have asked before the call may end
+        self.min_substantive_questions = raw.get('min_substantive_questions', 0)
+        self.preferences = tuple(
+            (pref['value'], tuple(k.lower() for k in pref['keywords'])) for pref in raw.get('preferences', [])
+        )
+
+        # Instructions are joined once; only those naming the preference are filled per turn
+        product_fallback = raw.get('product_fallback', 'service')
+        instructions = {}
+        for stage, lines in raw['instructions'].items():
+            text = '\n' + ('\n'.join(lines) if isinstance(lines, list) else lines) + '\n'
+            instructions[stage] = (text, PREFERENCE_PLACEHOLDER in text, product_fallback)
+        self.instructions = MappingProxyType(instructions)
+        self.templates = _freeze(templates)
+        appointments = dict(DEFAULT_APPOINTMENTS, **raw.get('appointments', {}))
+        if not appointments['assignees'] or not 0 <= appointments['hours'][0] < appointments['hours'][1] <= 24:
+            raise ValueError(f"Sector '{name}' appointments need assignees and valid opening hours")
+        self.appointments = _freeze(appointments)
+
+        # Every (stage, call) resolved to its model tier up front
+        def resolve(tier_name, where):
+            if tier_name not in tiers:
+                raise ValueError(f"Sector '{name}' {where} uses unknown model tier '{tier_name}'")
+            return tiers[tier_name]
+
+        self.default_route = MappingProxyType({call: resolve(default_routing[call], 'default routing') for call in ROUTED_CALLS})
+        stage_routing = raw.get('routing', {})
+        for stage in stage_routing:
+            if stage not in known_stages:
+                raise ValueError(f"Sector '{name}' routes unknown stage '{stage}'")
+        self.routes = MappingProxyType({
+            stage: MappingProxyType({
+                call: resolve(stage_routing.get(stage, {}).get(call, default_routing[call]), f"stage '{stage}'")
+                for call in ROUTED_CALLS
+            })
+            for stage in stages
+        })
+
+    def route(self, stage, call):
+        """Model tier for a 'generation' or 'analysis' call at this stage"""
+        return self.routes.get(stage, self.default_route)[call]
+
+    def instructions_for(self, stage, customer_preference=None):
+        entry = self.instructions.get(stage)
+        if entry is None:
+            return ''
+        text, needs_preference, fallback = entry
+        if needs_preference:
+            return text.replace(PREFERENCE_PLACEHOLDER, customer_preference or fallback)
+        return text
+
+    def match_preference(self, text_lower):
+        for value, keywords in self.preferences:
+            if any(keyword in text_lower for keyword in keywords):
+                return value
+        return None
+
+
+class FlowTable:
+    """Immutable compiled flows for every sector"""
+
+    def __init__(self, raw, source='', mtime=0.0):
+        sectors = raw.get('sectors')
+        if not sectors:
+            raise ValueError("Flow file defines no sectors")
+        default_stage = raw.get('default_stage', 'identify_need')
+        self.tiers = _compile_tiers(raw.get('model_tiers', DEFAULT_MODEL_TIERS))
+        default_routing = dict(DEFAULT_ROUTING, **raw.get('routing', {}))
+        self.sectors = MappingProxyType({
+            name: CompiledSector(name, spec, default_stage, self.tiers, default_routing) for name, spec in sectors.items()
+        })
+        self.flows = MappingProxyType({name: sector.flows for name, sector in self.sectors.items()})
+        self.personas = MappingProxyType({name: sector.persona for name, sector in self.sectors.items()})
+        self.scheduling_stages = frozenset(s.scheduling_stage for s in self.sectors.values() if s.scheduling_stage)
+        self.version = raw.get('version')
+        self.source = source
+        self.mtime = mtime
+
+    def sector(self, name):
+        try:
+            return self.sectors[name]
+        except KeyError:
+            raise ValueError(f"Unknown sector '{name}'") from None
+
+
+class FlowEngine:
+    """Holds the current FlowTable and swaps in a freshly compiled one when the file changes"""
+
+    def __init__(self, path=None, check_interval=None):
+        self.path = path or os.getenv('CONVERSATION_FLOWS_PATH', DEFAULT_FLOWS_PATH)
+        if check_interval is None:
+            check_interval = float(os.getenv('FLOWS_RELOAD_SECONDS', '2'))
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._table = self._compile()
+
+    def _compile(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        return FlowTable(raw, source=self.path, mtime=os.path.getmtime(self.path))
+
+    def reload(self, force=False):
+        """Recompile if the file changed (or always with force); returns True when a new table is live"""
+        with self._lock:
+            try:
+                if not force and os.path.getmtime(self.path) == self._table.mtime:
+                    return False
+                table = self._compile()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[FLOWS] ❌ Reload failed, keeping previous flows: {e}")
+                metrics.incr('flows_reloads', result='error')
+                return False
+            self._table = table
+        print(f"[FLOWS] ✅ Loaded {len(table.sectors)} sectors from {self.path}")
+        metrics.incr('flows_reloads', result='ok')
+        return True
+
+    @property
+    def table(self):
+        now = time.monotonic()
+        if self.check_interval and now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+        return self._table
+
+    def sector(self, name):
+        return self.table.sector(name)
+
+    def tracker(self, sector):
+        return StageTracker(self, sector)
+
+
+class StageTracker:
+    """
+    Per-conversation stage detection that only scans log entries added since
+    the last turn, so each lookup costs the same however long the call runs.
+    """
+
+    def __init__(self, engine, sector):
+        self.engine = engine
+        self.sector_name = sector
+        self._table = None
+        self._matched = set()
+        self._scanned = 0
+
+    def stage(self, conversation_history, customer_preference=None):
+        table = self.engine.table
+        sector = table.sector(self.sector_name)
+        if table is not self._table:
+            # Flows were reloaded - rules may differ, so rescan once
+            self._table = table
+            self._matched = set()
+            self._scanned = 0
+
+        self._scan(sector, conversation_history[self._scanned:], self._matched)
+        self._scanned = len(conversation_history)
+        return self._resolve(sector, self._matched, customer_preference)
+
+    def preview(self, conversation_history, customer_preference=None):
+        """The stage this history would be at, without advancing the tracker (for speculative turns)"""
+        table = self.engine.table
+        sector = table.sector(self.sector_name)
+        if table is self._table:
+            matched, scanned = set(self._matched), self._scanned
+        else:
+            matched, scanned = set(), 0
+        self._scan(sector, conversation_history[scanned:], matched)
+        return self._resolve(sector, matched, customer_preference)
+
+    @staticmethod
+    def _scan(sector, entries, matched):
+        for entry in entries:
+            entry_lower = entry.lower()
+            for index, (_, keywords) in enumerate(sector.stage_rules):
+                if index not in matched and any(keyword in entry_lower for keyword in keywords):
+                    matched.add(index)
+
+    @staticmethod
+    def _resolve(sector, matched, customer_preference):
+        if matched:
+            return sector.stage_rules[min(matched)][0]
+        if customer_preference and sector.preference_stage:
+            return sector.preference_stage
+        return sector.default_stage
+
+
+flow_engine = FlowEngine()
@@ -0,0 +1,195 @@
+"""
+Follow-up lead queue.
+
+Every finished call that needs action becomes a lead in its assignee's
+min-heap, ordered by lead score (highest first) and then age (oldest
+first). Popping or peeking the best lead is O(log n). A newer call to the
+same phone number and sector replaces the older lead, or removes it when
+the newer call needs no follow-up.
+
+State is kept as an append-only JSONL journal (LEAD_QUEUE_PATH) that is
+replayed on first use and compacted once it is mostly dead entries, so the
+queue survives restarts without rewriting everything on each change.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from metrics import metrics
+
+COMPACT_MIN_EVENTS = 1000
+
+
+class LeadQueue:
+    def __init__(self, path=None):
+        self.path = path or os.getenv('LEAD_QUEUE_PATH', 'lead_queue.jsonl')
+        self._lock = threading.Lock()
+        self._heaps = None          # assignee -> [(-score, queued_at, seq, lead_id)]
+        self._leads = {}            # lead_id -> lead, only while queued
+        self._by_customer = {}      # (phone, sector) -> lead_id
+        self._seq = itertools.count()
+        self._journal_events = 0
+
+    # -- persistence -------------------------------------------------------
+
+    def _load(self):
+        if self._heaps is not None:
+            return
+        self._heaps = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line after a crash
+                    self._journal_events += 1
+                    if event['op'] == 'push':
+                        self._push(event['lead'])
+                    else:
+                        self._discard(event['lead_id'])
+            print(f"[LEADS] ✅ Loaded {len(self._leads)} queued leads from {self.path}")
+
+    def _journal(self, event):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event) + '\n')
+        self._journal_events += 1
+        if self._journal_events >= COMPACT_MIN_EVENTS and self._journal_events > 2 * len(self._leads):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal as one push per live lead and drop stale heap entries"""
+        tmp_path = self.path + '.tmp'
+        live = sorted(self._leads.values(), key=lambda lead: lead['queued_at'])
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for lead in live:
+                f.write(json.dumps({'op': 'push', 'lead': lead}) + '\n')
+        os.replace(tmp_path, self.path)
+        self._journal_events = len(live)
+        for name, heap in self._heaps.items():
+            heap[:] = [entry for entry in heap if entry[3] in self._leads]
+            heapq.heapify(heap)
+
+    # -- heap operations (caller holds the lock) ---------------------------
+
+    def _push(self, lead):
+        key = (lead['phone'], lead['sector'])
+        previous = self._by_customer.get(key)
+        if previous is not None:
+            self._discard(previous)
+        self._leads[lead['lead_id']] = lead
+        self._by_customer[key] = lead['lead_id']
+        heap = self._heaps.setdefault(lead['assignee'], [])
+        heapq.heappush(heap, (-lead['lead_score'], lead['queued_at'], next(self._seq), lead['lead_id']))
+
+    def _discard(self, lead_id):
+        # Heap entries are dropped lazily when they reach the top
+        lead = self._leads.pop(lead_id, None)
+        if lead is not None and self._by_customer.get((lead['phone'], lead['sector'])) == lead_id:
+            del self._by_customer[(lead['phone'], lead['sector'])]
+        return lead
+
+    def _top(self, assignee):
+        heap = self._heaps.get(assignee)
+        while heap and heap[0][3] not in self._leads:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _best_assignee(self, assignee=None):
+        if assignee is not None:
+            return assignee if self._top(assignee) else None
+        tops = [(top, name) for name in list(self._heaps) for top in [self._top(name)] if top]
+        return min(tops)[1] if tops else None
+
+    # -- public API --------------------------------------------------------
+
+    def push(self, lead):
+        with self._lock:
+            self._load()
+            self._push(lead)
+            self._journal({'op': 'push', 'lead': lead})
+        metrics.incr('lead_queue_pushes', assignee=lead['assignee'])
+        metrics.set_gauge('lead_queue_depth', len(self._leads))
+
+    def push_record(self, record):
+        """Queue a finished call from its conversation log record; calls needing no action are skipped"""
+        if record.get('Action Required') != 'Yes' or record.get('Interest Level') == 'Not Interested':
+            # The newer call still replaces the customer's older lead, e.g. they have since declined
+            self.drop_customer(record.get('Phone Number'), record.get('Sector'))
+            return None
+        lead = {
+            'lead_id': record['Conversation ID'],
+            'customer_name': record.get('Customer Name'),
+            'phone': str(record.get('Phone Number') or ''),
+            'sector': record.get('Sector'),
+            'lead_score': float(record.get('Lead Score (1-10)') or 0),
+            'interest_level': record.get('Interest Level'),
+            'next_action': record.get('Next Action'),
+            'assignee': record.get('Action Assignee') or 'Unassigned',
+            'remarks': record.get('Conversation Summary'),
+            'appointment_start': record.get('Appointment Start'),
+            'call_date': record.get('Date'),
+            'queued_at': time.time()
+        }
+        self.push(lead)
+        return lead
+
+    def drop_customer(self, phone, sector):
+        """Remove the queued lead for this phone number and sector, if any"""
+        with self._lock:
+            self._load()
+            lead_id = self._by_customer.get((str(phone or ''), sector))
+            if lead_id is None:
+                return None
+            lead = self._discard(lead_id)
+            self._journal({'op': 'pop', 'lead_id': lead_id})
+        metrics.incr('lead_queue_dropped', assignee=lead['assignee'])
+        metrics.set_gauge('lead_queue_depth', len(self._leads))
+        return lead
+
+    def peek(self, assignee=None, limit=1):
+        """Best `limit` leads for one assignee (or across all), without removing them"""
+        with self._lock:
+            self._load()
+            names = [assignee] if assignee is not None else list(self._heaps)
+            # Walk the heaps' trees best-first from their roots: O(limit log limit), nothing is popped
+            frontier = [(heap[0], id(heap), 0, heap) for name in names
+                        for heap in [self._heaps.get(name)] if self._top(name)]
+            heapq.heapify(frontier)
+            leads = []
+            while frontier and len(leads) < limit:
+                entry, _, position, heap = heapq.heappop(frontier)
+                if entry[3] in self._leads:
+                    leads.append(self._leads[entry[3]])
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child], id(heap), child, heap))
+            return leads
+
+    def pop(self, assignee=None):
+        """Remove and return the best lead for the assignee (or across all assignees), or None"""
+        with self._lock:
+            self._load()
+            name = self._best_assignee(assignee)
+            if name is None:
+                return None
+            entry = heapq.heappop(self._heaps[name])
+            lead = self._discard(entry[3])
+            self._journal({'op': 'pop', 'lead_id': entry[3]})
+        metrics.incr('lead_queue_pops', assignee=name)
+        metrics.set_gauge('lead_queue_depth', len(self._leads))
+        return lead
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            counts = {}
+            for lead in self._leads.values():
+                counts[lead['assignee']] = counts.get(lead['assignee'], 0) + 1
+            return {'path': os.path.abspath(self.path), 'queued': len(self._leads), 'by_assignee': counts}
@@ -0,0 +1,274 @@
+"""
+Local interest and lead scoring.
+
+Each customer turn becomes a sparse vector of signed hashed word n-grams
+plus a few conversation features (sector, stage, turn number, ...). Two
+logistic heads are evaluated in NumPy: a multinomial one over interest
+levels and a binary one for "keep the call going". Weights are trained
+offline from the conversation logs and saved as an .npz file.
+
+Usage:
+    python lead_scorer.py train --log-dir conversation_logs --output lead_scorer.npz
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from metrics import metrics
+
+INTEREST_LEVELS = ('High', 'Medium', 'Low', 'Not Interested')
+# Same scale as AIConversationService._calculate_lead_score
+LEVEL_SCORES = np.array([8.0, 6.0, 4.0, 2.0])
+HASH_BITS = 12
+DENSE_FEATURES = 4   # turn position, utterance length, has digits, asks a question
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _hashed(tokens, dims):
+    """Token strings -> (indices, signs); the sign bit keeps collisions from always adding up"""
+    indices = np.empty(len(tokens), dtype=np.int64)
+    signs = np.empty(len(tokens), dtype=np.float32)
+    mask = dims - 1
+    for position, token in enumerate(tokens):
+        h = zlib.crc32(token.encode('utf-8'))
+        indices[position] = h & mask
+        signs[position] = 1.0 if h & 0x80000000 else -1.0
+    return indices, signs
+
+
+def featurize(customer_response, sector, stage, turn, agent_message='', hash_bits=HASH_BITS):
+    """Sparse hashed features plus the dense conversation features for one customer turn"""
+    words = _WORD.findall(customer_response.lower())
+    tokens = [f"w:{w}" for w in words]
+    tokens += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    # What the customer is answering matters as much as the answer
+    tokens += [f"a:{w}" for w in set(_WORD.findall(agent_message.lower()))]
+    tokens += [f"sector:{sector}", f"stage:{stage}", f"sector_stage:{sector}/{stage}", "bias"]
+    indices, signs = _hashed(tokens, 1 << hash_bits)
+
+    dense = np.array([
+        min(turn, 10) / 10.0,
+        np.log1p(len(words)) / 3.0,
+        1.0 if any(c.isdigit() for c in customer_response) else 0.0,
+        1.0 if '?' in customer_response else 0.0
+    ], dtype=np.float32)
+    return indices, signs, dense
+
+
+class LeadScorer:
+    """Logistic interest and continue heads over hashed features"""
+
+    def __init__(self, interest_weights, interest_bias, continue_weights, continue_bias,
+                 hash_bits=HASH_BITS, trained_on=0, trained_at=None):
+        self.interest_weights = interest_weights      # (dims + dense, levels)
+        self.interest_bias = interest_bias
+        self.continue_weights = continue_weights      # (dims + dense,)
+        self.continue_bias = float(continue_bias)
+        self.hash_bits = hash_bits
+        self.dims = 1 << hash_bits
+        self.trained_on = trained_on
+        self.trained_at = trained_at
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(
+            data['interest_weights'], data['interest_bias'], data['continue_weights'], data['continue_bias'],
+            hash_bits=int(data['hash_bits']), trained_on=int(data['trained_on']), trained_at=str(data['trained_at'])
+        )
+
+    def save(self, path):
+        np.savez(
+            path, interest_weights=self.interest_weights, interest_bias=self.interest_bias,
+            continue_weights=self.continue_weights, continue_bias=self.continue_bias,
+            hash_bits=self.hash_bits, trained_on=self.trained_on, trained_at=self.trained_at or ''
+        )
+
+    def score(self, customer_response, sector, stage, turn, agent_message=''):
+        """Interest level, continue probability and a continuous 1-10 lead score"""
+        started = time.perf_counter()
+        indices, signs, dense = featurize(customer_response, sector, stage, turn, agent_message, self.hash_bits)
+
+        logits = self.interest_bias + signs @ self.interest_weights[indices] + dense @ self.interest_weights[self.dims:]
+        logits = logits - logits.max()
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum()
+        continue_logit = self.continue_bias + signs @ self.continue_weights[indices] + dense @ self.continue_weights[self.dims:]
+        continue_probability = 1.0 / (1.0 + np.exp(-continue_logit))
+
+        best = int(probabilities.argmax())
+        metrics.observe('lead_scorer_seconds', time.perf_counter() - started)
+        return {
+            'interest_level': INTEREST_LEVELS[best],
+            'confidence': float(probabilities[best]),
+            'probabilities': {level: round(float(p), 4) for level, p in zip(INTEREST_LEVELS, probabilities)},
+            'continue_probability': float(continue_probability),
+            'lead_score': round(float(probabilities @ LEVEL_SCORES), 1)
+        }
+
+
+def examples_from_record(record):
+    """(customer, agent, sector, stage, turn, interest index, continued) for each customer turn of one logged call"""
+    from flow_engine import flow_engine
+
+    level = record.get('Interest Level')
+    sector = (record.get('Sector') or '').strip().lower().replace(' ', '_')
+    transcript = record.get('Full Conversation Log') or ''
+    if level not in INTEREST_LEVELS or sector not in flow_engine.table.sectors:
+        return []
+
+    # Replay stage detection over the transcript so training sees the stage the live call saw
+    tracker = flow_engine.tracker(sector)
+    history, turns = [], []
+    agent_message = ''
+    for line in transcript.split('\n'):
+        if line.startswith('Customer: '):
+            customer = line[len('Customer: '):]
+            history.append(line)
+            stage = tracker.stage(history)
+            turns.append([customer, agent_message, sector, stage, len(turns) + 1, INTEREST_LEVELS.index(level), 1.0])
+        elif line.startswith('AI Agent: '):
+            agent_message = line[len('AI Agent: '):]
+            history.append(line)
+    if turns:
+        turns[-1][-1] = 0.0   # the call ended after the customer's last turn
+    return [tuple(turn) for turn in turns]
+
+
+def load_examples(log_dir):
+    from export_service import iter_log_rows
+    from log_shards import ShardedConversationLog
+
+    examples = []
+    for _, path in ShardedConversationLog(log_dir).find_shards():
+        for _, record in iter_log_rows(path):
+            examples.extend(examples_from_record(record))
+    return examples
+
+
+def train(examples, hash_bits=HASH_BITS, epochs=30, learning_rate=0.5, l2=1e-4, batch_size=256, seed=0):
+    """Mini-batch gradient descent on both heads; returns a LeadScorer"""
+    dims = 1 << hash_bits
+    width = dims + DENSE_FEATURES
+    features = [featurize(customer, sector, stage, turn, agent, hash_bits)
+                for customer, agent, sector, stage, turn, _, _ in examples]
+    interest = np.array([example[5] for example in examples])
+    continued = np.array([example[6] for example in examples], dtype=np.float32)
+
+    interest_weights = np.zeros((width, len(INTEREST_LEVELS)), dtype=np.float32)
+    interest_bias = np.zeros(len(INTEREST_LEVELS), dtype=np.float32)
+    continue_weights = np.zeros(width, dtype=np.float32)
+    continue_bias = 0.0
+    rng = np.random.default_rng(seed)
+
+    for _ in range(epochs):
+        order = rng.permutation(len(examples))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            x = np.zeros((len(batch), width), dtype=np.float32)
+            for row, index in enumerate(batch):
+                indices, signs, dense = features[index]
+                np.add.at(x[row], indices, signs)
+                x[row, dims:] = dense
+
+            logits = x @ interest_weights + interest_bias
+            logits -= logits.max(axis=1, keepdims=True)
+            probabilities = np.exp(logits)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            probabilities[np.arange(len(batch)), interest[batch]] -= 1.0
+            interest_weights -= learning_rate * (x.T @ probabilities / len(batch) + l2 * interest_weights)
+            interest_bias -= learning_rate * probabilities.mean(axis=0)
+
+            error = 1.0 / (1.0 + np.exp(-(x @ continue_weights + continue_bias))) - continued[batch]
+            continue_weights -= learning_rate * (x.T @ error / len(batch) + l2 * continue_weights)
+            continue_bias -= learning_rate * float(error.mean())
+
+    return LeadScorer(interest_weights, interest_bias, continue_weights, continue_bias, hash_bits=hash_bits,
+                      trained_on=len(examples), trained_at=datetime.now().isoformat(timespec='seconds'))
+
+
+def evaluate(scorer, examples):
+    """Interest accuracy and continue accuracy on held-out examples"""
+    if not examples:
+        return {'examples': 0}
+    interest_hits = continue_hits = 0
+    for customer, agent, sector, stage, turn, level, continued in examples:
+        result = scorer.score(customer, sector, stage, turn, agent)
+        interest_hits += result['interest_level'] == INTEREST_LEVELS[level]
+        continue_hits += (result['continue_probability'] >= 0.5) == bool(continued)
+    return {
+        'examples': len(examples),
+        'interest_accuracy': round(interest_hits / len(examples), 3),
+        'continue_accuracy': round(continue_hits / len(examples), 3)
+    }
+
+
+_scorer = None
+_scorer_loaded = False
+_scorer_lock = threading.Lock()
+
+
+def get_lead_scorer():
+    """Process-wide scorer from LEAD_SCORER_MODEL, or None when no model has been trained"""
+    global _scorer, _scorer_loaded
+    if _scorer_loaded:
+        return _scorer
+    with _scorer_lock:
+        if not _scorer_loaded:
+            path = os.getenv('LEAD_SCORER_MODEL', 'lead_scorer.npz')
+            if os.path.exists(path):
+                try:
+                    _scorer = LeadScorer.load(path)
+                    print(f"[SCORER] ✅ Loaded lead scorer from {path} ({_scorer.trained_on} training turns)")
+                except Exception as e:
+                    print(f"[SCORER] ❌ Could not load {path}, using LLM analysis: {e}")
+            else:
+                print(f"[SCORER] No lead scorer at {path} - using LLM analysis")
+            _scorer_loaded = True
+    return _scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local lead scorer from conversation logs")
+    parser.add_argument('command', choices=['train'])
+    parser.add_argument('--log-dir', default=os.getenv('CONVERSATION_LOG_DIR', 'conversation_logs'))
+    parser.add_argument('--output', default=os.getenv('LEAD_SCORER_MODEL', 'lead_scorer.npz'))
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--holdout', type=float, default=0.2, help="Share of calls kept back for evaluation")
+    args = parser.parse_args(argv)
+
+    examples = load_examples(args.log_dir)
+    if not examples:
+        print(f"❌ No labelled conversations found in {args.log_dir}")
+        return 1
+    # Hold out the most recent turns rather than a random sample
+    split = int(len(examples) * (1 - args.holdout))
+    scorer = train(examples[:split], epochs=args.epochs)
+    report = evaluate(scorer, examples[split:])
+    # Ship a model trained on everything once the held-out numbers are known
+    scorer = train(examples, epochs=args.epochs)
+    scorer.save(args.output)
+
+    print(f"\n{'='*50}")
+    print("LEAD SCORER")
+    print(f"{'='*50}")
+    print(f"Training turns: {len(examples)}")
+    print(f"Held-out turns: {report['examples']}")
+    if report['examples']:
+        print(f"Interest accuracy: {report['interest_accuracy']:.1%}")
+        print(f"Continue accuracy: {report['continue_accuracy']:.1%}")
+    print(f"Saved: {args.output}")
+    print(f"{'='*50}\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Instant answers for off-topic turns that need no model.
+
+Arithmetic ("what is 25*4") is evaluated with a whitelisted AST walker and
+identity questions ("who are you?") are answered from the sector persona.
+The caller appends the stage's redirect question, so the call gets back
+on track without an LLM round trip.
+"""
+import ast
+import operator
+import re
+
+# Keeps a spoken calculation from turning into a CPU or memory bomb
+MAX_EXPRESSION_CHARS = 80
+MAX_EXPONENT = 64
+MAX_MAGNITUDE = 1e15
+# A longer utterance asks something besides "who are you?"; the persona line alone would drop it
+MAX_IDENTITY_WORDS = 10
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+_UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+_SPOKEN_OPERATORS = [
+    (re.compile(r'\bmultiplied by\b'), '*'),
+    (re.compile(r'\bdivided by\b'), '/'),
+    (re.compile(r'\b(?:times|into)\b'), '*'),
+    (re.compile(r'\bplus\b'), '+'),
+    (re.compile(r'\bminus\b'), '-'),
+    (re.compile(r'(?<=\d)\s*x\s*(?=\d)'), '*'),
+    (re.compile(r'(?<=\d),(?=\d{3}\b)'), ''),
+]
+_EXPRESSION = re.compile(r'[\d.\s+\-*/()%]+')
+_MATH_INDICATORS = ['what is', "what's", 'whats', 'calculate', 'equals', 'how much is']
+# "10-11 am" or "5-6 tomorrow" is a time slot, not a subtraction
+_TIME_WORDS = re.compile(r"\b(am|pm|o'?clock|morning|afternoon|evening|tonight|today|tomorrow|"
+                         r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|week|month)\b")
+
+
+def is_off_topic_question(response):
+    """Check if the response is off-topic - AI will handle it but NOT end conversation"""
+    response_lower = response.lower().strip()
+
+    # CRITICAL: Exclude business/financial contexts FIRST
+    business_terms = [
+        'loan', 'lakh', 'lakhs', 'crore', 'crores', 'rupees', 'rs', 'inr',
+        'amount', 'expecting', 'need', 'require', 'borrow', 'budget',
+        'salary', 'income', 'emi', 'interest', 'rate', 'credit', 'payment',
+        'bhk', 'property', 'apartment', 'flat', 'house', 'square feet', 'sqft',
+        'checkup', 'consultation', 'appointment', 'health', 'medical', 'insurance',
+        'application', 'eligible', 'document', 'apply', 'process'
+    ]
+
+    # If any business term is present, this is ON-TOPIC
+    if any(term in response_lower for term in business_terms):
+        print(f"[OFF-TOPIC] ✅ Business context - ON-TOPIC")
+        return False, None
+
+    # Identity questions - checked after the business terms, so "which company offers the lowest
+    # loan rate?" or "who are you, and what's the EMI?" still reach the model
+    identity_questions = [
+        'what is your name', 'what\'s your name', 'whats your name',
+        'who are you', 'where are you from', 'where you from',
+        'which company', 'what company', 'your name', 'tell me your name'
+    ]
+
+    if any(q in response_lower for q in identity_questions):
+        return True, 'identity'
+
+    # Math questions - only if NO business context
+    math_indicators = ['what is', 'what\'s', 'whats', 'calculate', 'equals']
+    has_math_indicator = any(indicator in response_lower for indicator in math_indicators)
+    has_numbers = any(char.isdigit() for char in response)
+    has_operator = (any(op in response for op in ['+', '-', '*', '/', 'x', '×', '÷'])
+                    or any(op in response_lower for op in [' plus ', ' minus ', ' times ', 'divided by', 'multiplied by']))
+
+    # Pure math: "what is 2+2" or "5*5"
+    if (has_math_indicator and has_numbers and has_operator):
+        print(f"[OFF-TOPIC] 🔢 Pure math question detected")
+        return True, 'math'
+
+    # Short calculation with operators
+    if has_numbers and has_operator and len(response.split()) <= 5:
+        print(f"[OFF-TOPIC] 🔢 Simple calculation detected")
+        return True, 'math'
+
+    # General knowledge questions - but NOT service-related
+    general_questions = [
+        'who is', 'who was', 'what is the capital', 'when did', 'where is',
+        'how tall', 'what year', 'when was', 'who invented', 'what color',
+        'which country', 'what happened', 'who won', 'how many'
+    ]
+
+    if any(q in response_lower for q in general_questions):
+        service_check_terms = ['loan', 'credit', 'bank', 'property', 'house', 'medical', 'health', 'checkup', 'apartment']
+        if not any(term in response_lower for term in service_check_terms):
+            print(f"[OFF-TOPIC] 📚 General knowledge question")
+            return True, 'general'
+
+    print(f"[OFF-TOPIC] ✅ ON-TOPIC response")
+    return False, None
+
+
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+        return _UNARY[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and (abs(right) > MAX_EXPONENT or abs(left) > MAX_MAGNITUDE):
+            raise ValueError("Exponent too large")
+        result = _BINARY[type(node.op)](left, right)
+        if isinstance(result, complex):
+            # A negative number to a fractional power, e.g. (-8)**0.5
+            raise ValueError("Result is not a real number")
+        if abs(result) > MAX_MAGNITUDE:
+            raise ValueError("Result too large")
+        return result
+    raise ValueError(f"Unsupported expression element {type(node).__name__}")
+
+
+def evaluate_arithmetic(text):
+    """(expression, value) for a spoken or typed calculation, or None if the text isn't one"""
+    text_lower = text.lower().replace('×', '*').replace('÷', '/').replace('^', '**')
+    if _TIME_WORDS.search(text_lower):
+        return None
+    for pattern, replacement in _SPOKEN_OPERATORS:
+        text_lower = pattern.sub(replacement, text_lower)
+
+    candidates = [span.strip() for span in _EXPRESSION.findall(text_lower)]
+    candidates = [span for span in candidates
+                  if any(c.isdigit() for c in span) and any(op in span for op in '+-*/%')]
+    if not candidates:
+        return None
+    expression = max(candidates, key=len)
+    if len(expression) > MAX_EXPRESSION_CHARS:
+        return None
+    # A bare "10-20" is more likely a range than a sum; only answer it when it was asked as a question
+    asked = any(indicator in text_lower for indicator in _MATH_INDICATORS) or '?' in text
+    if not asked and not any(op in expression for op in '+*/'):
+        return None
+
+    try:
+        value = _evaluate(ast.parse(expression, mode='eval'))
+    except (SyntaxError, ValueError, ZeroDivisionError, OverflowError, RecursionError):
+        return None
+    return expression, value
+
+
+def format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    return f"{value:,.2f}".rstrip('0').rstrip('.')
+
+
+def answer_identity(text, persona):
+    text_lower = text.lower()
+    if 'company' in text_lower:
+        return f"I'm calling from {persona['company']}."
+    if 'where' in text_lower:
+        return f"I'm {persona['name']}, calling from {persona['company']}."
+    return f"I'm {persona['name']} from {persona['company']}."
+
+
+def resolve(customer_response, persona):
+    """(kind, answer) for a math or identity question answerable without a model, else None"""
+    is_off_topic, question_type = is_off_topic_question(customer_response)
+    if not is_off_topic:
+        return None
+    if question_type == 'identity' and len(customer_response.split()) <= MAX_IDENTITY_WORDS:
+        return 'identity', answer_identity(customer_response, persona)
+    if question_type == 'math':
+        calculation = evaluate_arithmetic(customer_response)
+        if calculation is not None:
+            return 'math', f"That's {format_number(calculation[1])}."
+    # General knowledge still goes to the model
+    return None
@@ -0,0 +1,128 @@
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+SCHEDULING_STAGES = ['schedule_meeting', 'schedule_site_visit', 'schedule_appointment']
+TIME_WORDS = ['am', 'pm', 'morning', 'afternoon', 'evening', 'tomorrow', 'today',
+              'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _estimate_tokens(text):
+    """Rough token count (~4 chars per token), good enough for stand-in usage numbers"""
+    return max(1, len(text) // 4)
+
+
+class _Completions:
+    def __init__(self, model):
+        self._model = model
+
+    def create(self, model=None, messages=None, **kwargs):
+        return self._model.complete(model, messages or [], **kwargs)
+
+
+class LocalChatModel:
+    """
+    Offline stand-in for the OpenAI chat client.
+
+    Exposes `chat.completions.create(...)` with the same response shape
+    (`choices[0].message.content`, `usage`) so AIConversationService can run
+    unchanged. Replies follow the stage instructions embedded in the prompt.
+    """
+
+    def __init__(self, mean_latency=0.0, jitter=0.0, seed=None):
+        self.mean_latency = mean_latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.calls = 0
+
+    def _sleep(self):
+        if self.mean_latency <= 0:
+            return
+        with self._random_lock:
+            delay = self._random.gauss(self.mean_latency, self.jitter) if self.jitter else self.mean_latency
+        time.sleep(max(0.0, delay))
+
+    def complete(self, model, messages, **kwargs):
+        self._sleep()
+        with self._random_lock:
+            self.calls += 1
+
+        system_prompt = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ''
+        if kwargs.get('response_format', {}).get('type') == 'json_object':
+            content = self._analysis_reply(system_prompt)
+        elif 'opening line' in system_prompt:
+            content = self._opening_reply(system_prompt)
+        elif system_prompt.startswith('You are playing a customer'):
+            content = self._customer_reply(messages)
+        else:
+            content = self._agent_reply(system_prompt)
+
+        prompt_text = ' '.join(m.get('content', '') for m in messages)
+        usage = SimpleNamespace(
+            prompt_tokens=_estimate_tokens(prompt_text),
+            completion_tokens=_estimate_tokens(content),
+            total_tokens=_estimate_tokens(prompt_text) + _estimate_tokens(content)
+        )
+        message = SimpleNamespace(role='assistant', content=content)
+        return SimpleNamespace(
+            model=model or 'local-stand-in',
+            choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+            usage=usage
+        )
+
+    def _opening_reply(self, system_prompt):
+        match = re.search(r"You are (.+?) from (.+?)\.\n", system_prompt)
+        customer = re.search(r"opening line to (.+?) about", system_prompt)
+        agent, company = match.groups() if match else ('your agent', 'our team')
+        name = customer.group(1) if customer else 'there'
+        return f"Hi {name}, this is {agent} from {company}. Do you have a quick minute to hear about our offers?"
+
+    def _agent_reply(self, system_prompt):
+        stage_match = re.search(r"CONVERSATION STAGE: (\w+)", system_prompt)
+        stage = stage_match.group(1) if stage_match else 'identify_need'
+        said_match = re.search(r'Customer just said: "(.*)"', system_prompt)
+        customer_said = said_match.group(1).lower() if said_match else ''
+
+        taken = re.search(r"APPOINTMENT: (.+?) IS NOT AVAILABLE\..*instead: (.+)", system_prompt)
+        if taken:
+            return f"I'm sorry, {taken.group(1)} is already booked. I can offer {taken.group(2)}. Which works for you?"
+        booked = re.search(r"APPOINTMENT: BOOKED: (.+?) with ", system_prompt)
+        if booked:
+            return f"Perfect! You're booked for {booked.group(1)}. Our executive will call you then. Have a great day!"
+
+        if stage in SCHEDULING_STAGES and any(re.search(rf"\b{w}\b", customer_said) for w in TIME_WORDS):
+            return "Perfect! I've scheduled a callback for that time. Our executive will call you then. Have a great day!"
+
+        ask_match = re.search(r'ASK: "([^"]+)"', system_prompt)
+        if ask_match:
+            return f"Thanks for sharing that. {ask_match.group(1)}"
+        tell_match = re.search(r'TELL(?: THEM)?: (.+)', system_prompt)
+        if tell_match:
+            return f"Here's what you should know: {tell_match.group(1).strip()}. Would you like to go ahead?"
+        return "Thank you. Could you tell me a bit more about what you're looking for?"
+
+    def _analysis_reply(self, system_prompt):
+        said_match = re.search(r'Customer said: "(.*)"', system_prompt)
+        customer_said = said_match.group(1).lower() if said_match else ''
+        interest = 'Low' if re.search(r"\b(no|stop|don't)\b", customer_said) else 'Medium'
+        return json.dumps({
+            'interest_level': interest,
+            'continue_conversation': True,
+            'end_reason': None,
+            'meeting_scheduled': False
+        })
+
+    def _customer_reply(self, messages):
+        turn = sum(1 for m in messages if m['role'] == 'assistant')
+        replies = [
+            "Sure, I have a couple of minutes. What is this about?",
+            "That sounds useful, tell me more about the options.",
+            "What would the next step be?",
+            "Tomorrow at 11 am works for me."
+        ]
+        return replies[min(turn, len(replies) - 1)]
@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+
+LOG_COLUMNS = [
+    'Conversation ID', 'Date', 'Time Start', 'Time End', 'Duration (MM:SS)',
+    'Duration (Minutes)', 'Customer Name', 'Phone Number', 'Sector',
+    'Agent Name', 'Call Status', 'Total Interactions', 'Interest Level',
+    'Lead Score (1-10)', 'Action Required', 'Next Action', 'Action Assignee',
+    'Conversation Summary', 'Customer Responses Count', 'AI Responses Count',
+    'Conversation Stage Reached', 'Information Gathered', 'Full Conversation Log',
+    'Prompt Tokens', 'Completion Tokens', 'TTS Characters', 'Estimated Cost (USD)',
+    'Appointment Start', 'Appointment End', 'Appointment Assignee'
+]
+
+COLUMN_WIDTHS = {
+    'A': 38, 'B': 12, 'C': 12, 'D': 12, 'E': 15, 'F': 15,
+    'G': 20, 'H': 15, 'I': 15, 'J': 15, 'K': 12, 'L': 15,
+    'M': 15, 'N': 15, 'O': 15, 'P': 30, 'Q': 20, 'R': 40,
+    'S': 20, 'T': 20, 'U': 30, 'V': 100, 'W': 100, 'X': 15,
+    'Y': 15, 'Z': 15, 'AA': 18, 'AB': 18, 'AC': 18, 'AD': 22
+}
+
+SHEET_NAME = 'Conversations'
+MANIFEST_NAME = 'manifest.json'
+
+
+def _openpyxl():
+    # openpyxl takes a noticeable share of app start-up; load it with the first shard access
+    import openpyxl
+    return openpyxl
+
+
+def _style_header(worksheet):
+    from openpyxl.styles import Font, PatternFill, Alignment
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=11)
+
+    for cell in worksheet[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    for col, width in COLUMN_WIDTHS.items():
+        worksheet.column_dimensions[col].width = width
+
+
+def _style_body(worksheet):
+    from openpyxl.styles import Alignment, Border, Side
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    body_alignment = Alignment(vertical='top', wrap_text=True)
+
+    for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row):
+        for cell in row:
+            cell.border = thin_border
+            cell.alignment = body_alignment
+
+
+class ShardedConversationLog:
+    """
+    Conversation log split into daily, size-capped Excel shards.
+
+    Only the open shard is rewritten on append, so write cost is bounded by
+    the shard size. Body styling is applied once when a shard is sealed.
+    A JSON manifest records every shard with its date range and row count.
+    """
+
+    def __init__(self, log_dir, max_rows=5000, legacy_file=None):
+        self.log_dir = log_dir
+        self.max_rows = max_rows
+        self.legacy_file = legacy_file
+        self.manifest_path = os.path.join(log_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._manifest = None
+
+    def initialize(self):
+        """Create the log directory, load the manifest and seal shards from previous days"""
+        with self._lock:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._manifest = self._load_manifest()
+
+            if self.legacy_file and os.path.exists(self.legacy_file):
+                self._register_legacy_file()
+
+            today = datetime.now().strftime('%Y-%m-%d')
+            for shard in self._manifest['shards']:
+                if not shard['sealed'] and shard['date'] != today:
+                    self._seal(shard)
+            self._save_manifest()
+
+        print(f"✅ Conversation log: {os.path.abspath(self.log_dir)} ({len(self._manifest['shards'])} shards)")
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'version': 1, 'shards': []}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _register_legacy_file(self):
+        """Expose the pre-sharding single workbook as a sealed, undated shard"""
+        legacy_path = os.path.abspath(self.legacy_file)
+        if any(shard.get('path') == legacy_path for shard in self._manifest['shards']):
+            return
+        workbook = _openpyxl().load_workbook(legacy_path, read_only=True)
+        try:
+            rows = max(workbook[SHEET_NAME].max_row - 1, 0)
+        finally:
+            workbook.close()
+        self._manifest['shards'].insert(0, {
+            'name': os.path.basename(legacy_path),
+            'path': legacy_path,
+            'date': None,
+            'first_date': None,
+            'last_date': None,
+            'rows': rows,
+            'sealed': True
+        })
+        print(f"✅ Registered legacy Excel log as shard: {legacy_path}")
+
+    def _shard_path(self, shard):
+        return shard.get('path') or os.path.join(self.log_dir, shard['name'])
+
+    def _open_shard(self):
+        """Return the shard new records go to, rotating by date and size"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        current = self._manifest['shards'][-1] if self._manifest['shards'] else None
+
+        if current and not current['sealed']:
+            # A shard opened before the columns changed keeps its old header; start a new one
+            same_columns = current.get('columns') == len(LOG_COLUMNS)
+            if current['date'] == today and current['rows'] < self.max_rows and same_columns:
+                return current
+            self._seal(current)
+
+        part = sum(1 for shard in self._manifest['shards'] if shard['date'] == today) + 1
+        shard = {
+            'name': f"conversations_{today}_{part:03d}.xlsx",
+            'date': today,
+            'first_date': None,
+            'last_date': None,
+            'rows': 0,
+            'columns': len(LOG_COLUMNS),
+            'sealed': False
+        }
+
+        workbook = _openpyxl().Workbook()
+        worksheet = workbook.active
+        worksheet.title = SHEET_NAME
+        worksheet.append(LOG_COLUMNS)
+        _style_header(worksheet)
+        workbook.save(self._shard_path(shard))
+
+        self._manifest['shards'].append(shard)
+        print(f"✅ Opened new log shard: {shard['name']}")
+        return shard
+
+    def _seal(self, shard):
+        """Apply body styling once and mark the shard read-only"""
+        path = self._shard_path(shard)
+        if os.path.exists(path):
+            workbook = _openpyxl().load_workbook(path)
+            _style_body(workbook[SHEET_NAME])
+            workbook.save(path)
+        shard['sealed'] = True
+        print(f"✅ Sealed log shard: {shard['name']} ({shard['rows']} rows)")
+
+    def append(self, record):
+        """Append one conversation record to the open shard"""
+        with self._lock:
+            if self._manifest is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self._manifest = self._load_manifest()
+
+            shard = self._open_shard()
+            path = self._shard_path(shard)
+
+            workbook = _openpyxl().load_workbook(path)
+            workbook[SHEET_NAME].append([record.get(col) for col in LOG_COLUMNS])
+            workbook.save(path)
+
+            record_date = record.get('Date')
+            shard['rows'] += 1
+            if record_date:
+                if not shard['first_date'] or record_date < shard['first_date']:
+                    shard['first_date'] = record_date
+                if not shard['last_date'] or record_date > shard['last_date']:
+                    shard['last_date'] = record_date
+            self._save_manifest()
+            return shard['name']
+
+    def seal_current(self):
+        """Seal the open shard (e.g. on shutdown or from a maintenance job)"""
+        with self._lock:
+            if self._manifest and self._manifest['shards'] and not self._manifest['shards'][-1]['sealed']:
+                self._seal(self._manifest['shards'][-1])
+                self._save_manifest()
+
+    def find_shards(self, date_from=None, date_to=None):
+        """Return (name, path) for shards that may hold records in the date range, oldest first"""
+        with self._lock:
+            manifest = self._manifest if self._manifest is not None else self._load_manifest()
+            shards = list(manifest['shards'])
+
+        selected = []
+        for shard in shards:
+            first_date = shard.get('first_date') or shard.get('date')
+            last_date = shard.get('last_date') or shard.get('date')
+            if date_from and last_date and last_date < date_from:
+                continue
+            if date_to and first_date and first_date > date_to:
+                continue
+            selected.append((shard['name'], self._shard_path(shard)))
+        return selected
+
+    def describe_shards(self):
+        """Copies of the manifest entries (name, path, rows, sealed, dates), oldest first"""
+        with self._lock:
+            manifest = self._manifest if self._manifest is not None else self._load_manifest()
+            return [dict(shard, path=self._shard_path(shard)) for shard in manifest['shards']]
+
+    def stats(self):
+        """Summary used by the health endpoint"""
+        with self._lock:
+            manifest = self._manifest if self._manifest is not None else self._load_manifest()
+            shards = manifest['shards']
+            return {
+                'log_dir': os.path.abspath(self.log_dir),
+                'shards': len(shards),
+                'records': sum(shard['rows'] for shard in shards),
+                'open_shard': shards[-1]['name'] if shards and not shards[-1]['sealed'] else None
+            }
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import deque
+
+
+def _metric_key(name, labels):
+    if not labels:
+        return name
+    label_text = ','.join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+class _Timing:
+    """Bounded reservoir of recent observations for percentile reporting"""
+
+    def __init__(self, max_samples):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else 0.0,
+            'p50': round(self.percentile(50), 4),
+            'p95': round(self.percentile(95), 4),
+            'p99': round(self.percentile(99), 4),
+            'max': round(max(self.samples), 4) if self.samples else 0.0
+        }
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and timings exposed at /api/metrics"""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+        self.started_at = time.time()
+
+    def incr(self, name, value=1, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = _metric_key(name, labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = _Timing(self.max_samples)
+            timing.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def percentile(self, name, pct, **labels):
+        with self._lock:
+            timing = self._timings.get(_metric_key(name, labels))
+            return timing.percentile(pct) if timing else None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {key: timing.summary() for key, timing in self._timings.items()}
+            }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,282 @@
+"""
+Pre-dial pipeline: generate personalized openings (and their audio) for the
+day's lead list ahead of time.
+
+Usage:
+    python opening_pipeline.py leads.csv --workers 4
+
+The CSV needs `name`, `phone` and `sector` columns. /api/start_conversation
+serves a prepared opening when one exists for the phone number and sector,
+and /api/text-to-speech serves its audio without calling ElevenLabs.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rate_limiter import PRIORITY_BACKGROUND
+from elevenlabs_service import AUDIO_PROFILES, DEFAULT_AUDIO_PROFILE
+
+# Openings written to the index per save while preparing a lead list
+FLUSH_EVERY = 100
+AUDIO_EXTENSIONS = {'audio/mpeg': 'mp3', 'audio/ogg': 'ogg', 'audio/wav': 'wav'}
+
+
+def normalize_phone(phone):
+    return re.sub(r'\D', '', str(phone or ''))
+
+
+def opening_key(phone, sector):
+    return f"{normalize_phone(phone)}:{str(sector).lower()}"
+
+
+class PreparedOpeningStore:
+    """
+    On-disk store of ready-to-play openings keyed by phone number and sector.
+
+    Text lives in an index JSON, audio next to it as content-addressed files.
+    Entries expire after `ttl_hours` so yesterday's list is never replayed.
+    The server and the CLI share the index: it is re-read whenever the file
+    changes, and saving merges this process's changes into what is on disk.
+    """
+
+    def __init__(self, store_dir, ttl_hours=24):
+        self.store_dir = store_dir
+        self.ttl_seconds = ttl_hours * 3600
+        self.index_path = os.path.join(store_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._entries = None
+        self._audio_by_text = {}
+        self._index_version = None  # (mtime, size) of the index last read or written
+        self._unsaved = {}          # key -> entry put since the last save
+        self._removed = {}          # key -> created_at of entries pruned since the last save
+
+    def _disk_version(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Read the index on first use and again whenever another process has rewritten it"""
+        version = self._disk_version()
+        if self._entries is not None and version == self._index_version:
+            return
+        entries = {}
+        if version is not None:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        # Changes not saved yet win over the file, unless it has a newer entry for the same lead
+        for key, entry in self._unsaved.items():
+            if key not in entries or entries[key]['created_at'] <= entry['created_at']:
+                entries[key] = entry
+        for key, created_at in self._removed.items():
+            if key in entries and entries[key]['created_at'] == created_at:
+                del entries[key]
+        self._entries = entries
+        self._index_version = version
+        self._audio_by_text = {
+            (entry['text'], entry.get('audio_profile', DEFAULT_AUDIO_PROFILE)): entry['audio_file']
+            for entry in self._entries.values() if entry.get('audio_file')
+        }
+
+    def _save(self):
+        """Merge unsaved changes into the index on disk, keeping entries another process added"""
+        self._index_version = None
+        self._load()
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._index_version = self._disk_version()
+        self._unsaved.clear()
+        self._removed.clear()
+
+    def flush(self):
+        """Write openings stored with put(..., save=False)"""
+        with self._lock:
+            if self._unsaved or self._removed:
+                self._save()
+
+    def _is_fresh(self, entry):
+        return time.time() - entry['created_at'] < self.ttl_seconds
+
+    def get(self, phone, sector, customer_name):
+        """Return the prepared opening text for this call, or None on a miss"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(opening_key(phone, sector))
+        if not entry or not self._is_fresh(entry):
+            return None
+        # The opening greets the customer by name - don't play it to someone else
+        if entry['customer_name'].strip().lower() != str(customer_name).strip().lower():
+            return None
+        return entry['text']
+
+    def has_fresh(self, phone, sector):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(opening_key(phone, sector))
+        return bool(entry and self._is_fresh(entry))
+
+    def put(self, customer, text, audio_data=None, audio_profile=DEFAULT_AUDIO_PROFILE, save=True):
+        """Store an opening; batches pass save=False and call flush() once at the end"""
+        audio_file = None
+        if audio_data:
+            os.makedirs(self.store_dir, exist_ok=True)
+            extension = AUDIO_EXTENSIONS[AUDIO_PROFILES[audio_profile][1]]
+            audio_file = f"{hashlib.sha1(text.encode('utf-8')).hexdigest()}_{audio_profile}.{extension}"
+            with open(os.path.join(self.store_dir, audio_file), 'wb') as f:
+                f.write(audio_data)
+
+        key = opening_key(customer['phone'], customer['sector'])
+        entry = {
+            'customer_name': customer['name'],
+            'sector': customer['sector'],
+            'text': text,
+            'audio_file': audio_file,
+            'audio_profile': audio_profile,
+            'created_at': time.time()
+        }
+        with self._lock:
+            self._load()
+            self._entries[key] = self._unsaved[key] = entry
+            self._removed.pop(key, None)
+            if audio_file:
+                self._audio_by_text[(text, audio_profile)] = audio_file
+            if save:
+                self._save()
+
+    def audio_for_text(self, text, audio_profile=DEFAULT_AUDIO_PROFILE):
+        """Return pre-rendered audio bytes for an opening's exact text and audio profile, if any"""
+        with self._lock:
+            self._load()
+            audio_file = self._audio_by_text.get((text, audio_profile))
+        if not audio_file:
+            return None
+        path = os.path.join(self.store_dir, audio_file)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def prune(self):
+        """Drop expired entries, and their audio files once no fresh entry shares them"""
+        with self._lock:
+            self._load()
+            expired = [(key, entry) for key, entry in self._entries.items() if not self._is_fresh(entry)]
+            if not expired:
+                return 0
+            for key, entry in expired:
+                del self._entries[key]
+                self._unsaved.pop(key, None)
+                self._removed[key] = entry['created_at']
+            self._save()
+            # Audio is named by text, so a fresh entry with the same opening may still use the file
+            referenced = {entry['audio_file'] for entry in self._entries.values() if entry.get('audio_file')}
+            for _, entry in expired:
+                audio_file = entry.get('audio_file')
+                if audio_file and audio_file not in referenced:
+                    path = os.path.join(self.store_dir, audio_file)
+                    if os.path.exists(path):
+                        os.remove(path)
+            return len(expired)
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            fresh = [entry for entry in self._entries.values() if self._is_fresh(entry)]
+            return {
+                'store_dir': os.path.abspath(self.store_dir),
+                'prepared': len(fresh),
+                'with_audio': sum(1 for entry in fresh if entry.get('audio_file'))
+            }
+
+
+def prepare_openings(customers, ai_service, store, tts=None, workers=4, refresh=False, audio_profile=DEFAULT_AUDIO_PROFILE):
+    """
+    Generate and store openings for a lead list with bounded concurrency.
+
+    Calls are made at background priority, so live conversations are always
+    served first by the provider rate limiter.
+    """
+    started = time.perf_counter()
+    report = {'requested': len(customers), 'prepared': 0, 'with_audio': 0, 'skipped': 0, 'failed': 0}
+    report_lock = threading.Lock()
+
+    def prepare_one(customer):
+        if not refresh and store.has_fresh(customer['phone'], customer['sector']):
+            return 'skipped', False
+        customer_info = {'name': customer['name'], 'phone': customer['phone'], 'sector': customer['sector']}
+        text = ai_service.generate_opening_message(customer_info, priority=PRIORITY_BACKGROUND, allow_fallback=False)
+        audio_data = None
+        if tts and tts.enabled:
+            audio_data = tts.text_to_speech(text, priority=PRIORITY_BACKGROUND, profile=audio_profile)
+        store.put(customer, text, audio_data, audio_profile, save=False)
+        return 'prepared', bool(audio_data)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(prepare_one, customer): customer for customer in customers}
+            for future in as_completed(futures):
+                customer = futures[future]
+                try:
+                    status, has_audio = future.result()
+                except Exception as e:
+                    print(f"[OPENINGS] ❌ {customer['name']} ({customer['sector']}): {e}")
+                    status, has_audio = 'failed', False
+                with report_lock:
+                    report[status] += 1
+                    if has_audio:
+                        report['with_audio'] += 1
+                    # The index is rewritten per batch, not per lead; a running server picks each batch up
+                    if status == 'prepared' and report['prepared'] % FLUSH_EVERY == 0:
+                        store.flush()
+    finally:
+        store.flush()
+
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    print(f"[OPENINGS] ✅ Prepared {report['prepared']} openings "
+          f"({report['with_audio']} with audio, {report['skipped']} skipped, {report['failed']} failed) in {report['seconds']}s")
+    return report
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from ai_service import AIConversationService
+    from campaign_runner import load_customers
+    from elevenlabs_service import ElevenLabsTTS
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Pre-generate openings and audio for a lead list")
+    parser.add_argument('csv_path', help="CSV with name, phone and sector columns")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--no-audio', action='store_true', help="Only prepare the text")
+    parser.add_argument('--refresh', action='store_true', help="Regenerate openings that are already prepared")
+    parser.add_argument('--audio-profile', default=DEFAULT_AUDIO_PROFILE, choices=list(AUDIO_PROFILES))
+    parser.add_argument('--store-dir', default=os.getenv('PREPARED_OPENINGS_DIR', 'prepared_openings'))
+    args = parser.parse_args(argv)
+
+    store = PreparedOpeningStore(args.store_dir, ttl_hours=float(os.getenv('PREPARED_OPENINGS_TTL_HOURS', '24')))
+    store.prune()
+    report = prepare_openings(
+        load_customers(args.csv_path),
+        AIConversationService(),
+        store,
+        tts=None if args.no_audio else ElevenLabsTTS(),
+        workers=args.workers,
+        refresh=args.refresh,
+        audio_profile=args.audio_profile
+    )
+    return 0 if not report['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from metrics import metrics
+
+# Priority classes - lower value is served first
+PRIORITY_TURN = 0        # reply to a customer mid-call
+PRIORITY_OPENING = 1     # first line of a new call
+PRIORITY_BACKGROUND = 2  # analysis and other work the call can do without
+
+PRIORITY_NAMES = {
+    PRIORITY_TURN: 'turn',
+    PRIORITY_OPENING: 'opening',
+    PRIORITY_BACKGROUND: 'background'
+}
+
+# Longest a request may queue before it is shed; low priority gives up first
+DEFAULT_MAX_WAIT = {
+    PRIORITY_TURN: 6.0,
+    PRIORITY_OPENING: 3.0,
+    PRIORITY_BACKGROUND: 0.5
+}
+
+# Queue depth at which a new request of that priority is shed immediately
+DEFAULT_MAX_QUEUE = {
+    PRIORITY_TURN: 200,
+    PRIORITY_OPENING: 50,
+    PRIORITY_BACKGROUND: 10
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is shed instead of being sent to the provider"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount, now):
+        """Seconds until `amount` tokens are available (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def adjust(self, delta):
+        """Debit (positive) or refund (negative) tokens after the real usage is known"""
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ProviderLimiter:
+    """
+    Process-wide limiter for one upstream provider.
+
+    Requests and tokens per minute are enforced with two token buckets.
+    Waiters are served strictly by priority (FIFO within a class), and a
+    request is shed with RateLimitExceeded when its queue wait would exceed
+    the budget for its class.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute, max_wait=None, max_queue=None):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_wait = {**DEFAULT_MAX_WAIT, **(max_wait or {})}
+        self.max_queue = {**DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def _shed(self, priority, reason):
+        metrics.incr('rate_limiter_shed', provider=self.name, priority=PRIORITY_NAMES[priority], reason=reason)
+        raise RateLimitExceeded(f"{self.name} {PRIORITY_NAMES[priority]} request shed ({reason})")
+
+    def acquire(self, priority=PRIORITY_TURN, tokens=1):
+        """Block until the request may be sent; returns the time spent queued"""
+        started = time.monotonic()
+        deadline = started + self.max_wait[priority]
+        entry = (priority, next(self._sequence))
+
+        with self._cond:
+            if sum(1 for p, _ in self._waiters if p <= priority) >= self.max_queue[priority]:
+                self._shed(priority, 'queue_full')
+
+            heapq.heappush(self._waiters, entry)
+            metrics.set_gauge('rate_limiter_queue_depth', len(self._waiters), provider=self.name)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = max(
+                            self._paused_until - now,
+                            self.request_bucket.time_until(1, now),
+                            self.token_bucket.time_until(tokens, now),
+                            0.0
+                        )
+                        if wait == 0.0:
+                            self.request_bucket.take(1)
+                            self.token_bucket.take(tokens)
+                            break
+
+                    remaining = deadline - now
+                    if remaining <= 0 or (wait is not None and now + wait > deadline):
+                        self._shed(priority, 'wait_budget')
+                    self._cond.wait(timeout=min(wait, remaining) if wait is not None else remaining)
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                metrics.set_gauge('rate_limiter_queue_depth', len(self._waiters), provider=self.name)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        metrics.observe('rate_limiter_wait_seconds', waited, provider=self.name, priority=PRIORITY_NAMES[priority])
+        metrics.incr('rate_limiter_admitted', provider=self.name, priority=PRIORITY_NAMES[priority])
+        return waited
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the provider reports real usage"""
+        with self._cond:
+            self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def backoff(self, seconds):
+        """Pause the provider after a 429 so queued work waits instead of failing"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        metrics.incr('rate_limiter_provider_429', provider=self.name)
+        print(f"[RATE LIMIT] ⏸️ {self.name} paused for {seconds:.1f}s after 429")
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """Approximate prompt + completion tokens (~4 characters per token)"""
+    chars = sum(len(m.get('content', '')) for m in messages)
+    return chars // 4 + max_tokens
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Return the process-wide limiter for 'openai' or 'elevenlabs'"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            if provider == 'openai':
+                _limiters[provider] = ProviderLimiter(
+                    'openai',
+                    requests_per_minute=int(os.getenv('OPENAI_RPM_LIMIT', '500')),
+                    tokens_per_minute=int(os.getenv('OPENAI_TPM_LIMIT', '200000'))
+                )
+            elif provider == 'elevenlabs':
+                # ElevenLabs bills by characters, so the token bucket counts characters
+                _limiters[provider] = ProviderLimiter(
+                    'elevenlabs',
+                    requests_per_minute=int(os.getenv('ELEVENLABS_RPM_LIMIT', '100')),
+                    tokens_per_minute=int(os.getenv('ELEVENLABS_CPM_LIMIT', '40000'))
+                )
+            else:
+                raise ValueError(f"Unknown provider '{provider}'")
+        return _limiters[provider]
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import metrics
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a sliding time window.
+
+    Opens when at least `min_calls` calls in the window failed at a rate of
+    `error_threshold` or more. After `cooldown` seconds a single probe call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, error_threshold=0.5, min_calls=10, window=60.0, cooldown=30.0):
+        self.name = name
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = CIRCUIT_CLOSED
+        self._outcomes = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        metrics.set_gauge('circuit_state', CIRCUIT_STATE_VALUES[self.state], provider=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"[CIRCUIT] {self.name}: {self.state} → {state}")
+            self.state = state
+            metrics.incr('circuit_transitions', provider=self.name, to=state)
+            metrics.set_gauge('circuit_state', CIRCUIT_STATE_VALUES[state], provider=self.name)
+
+    def allow(self):
+        """Return True if a call may go to the provider right now"""
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    metrics.incr('circuit_rejected', provider=self.name)
+                    return False
+                self._set_state(CIRCUIT_HALF_OPEN)
+
+            if self.state == CIRCUIT_HALF_OPEN:
+                if self._probe_in_flight:
+                    metrics.incr('circuit_rejected', provider=self.name)
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def _record(self, success):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._probe_in_flight = False
+                self._outcomes.clear()
+                if success:
+                    self._set_state(CIRCUIT_CLOSED)
+                else:
+                    self._opened_at = now
+                    self._set_state(CIRCUIT_OPEN)
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_threshold:
+                self._opened_at = now
+                self._set_state(CIRCUIT_OPEN)
+
+    def release_probe(self):
+        """Give back a half-open probe slot when the call never reached the provider"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        self._record(True)
+
+    def record_failure(self):
+        self._record(False)
+
+
+class HedgedCaller:
+    """
+    Runs a call and, if it has not returned by an adaptive p95 deadline,
+    fires one identical backup call and takes whichever finishes first.
+
+    Blocking HTTP calls cannot be interrupted once started, so the losing
+    call is cancelled if it is still queued and otherwise left to finish
+    in the background with its result discarded. No backup is sent while
+    every worker is busy: it would only queue behind the calls it is
+    meant to overtake.
+    """
+
+    def __init__(self, name, min_delay=0.3, max_delay=3.0, default_delay=1.5, min_samples=20, max_workers=32):
+        self.name = name
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._inflight = 0     # submitted calls not yet finished, queued ones included
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+
+    def hedge_delay(self):
+        """p95 of recent successful call latencies, clamped to [min_delay, max_delay]"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_delay
+            ordered = sorted(self._latencies)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return min(self.max_delay, max(self.min_delay, p95))
+
+    def _timed(self, fn):
+        started = time.monotonic()
+        result = fn()
+        return result, time.monotonic() - started
+
+    def _submit(self, fn):
+        with self._lock:
+            self._inflight += 1
+        future = self._pool.submit(self._timed, fn)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._inflight -= 1
+
+    def _saturated(self):
+        with self._lock:
+            return self._inflight >= self.max_workers
+
+    def call(self, fn, timeout=None):
+        # `timeout` bounds the whole call, hedge delay included
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = self.hedge_delay()
+        metrics.set_gauge('hedge_delay_seconds', round(delay, 3), provider=self.name)
+        metrics.incr('hedge_calls', provider=self.name)
+
+        primary = self._submit(fn)
+        first_wait = delay if deadline is None else min(delay, max(0.0, deadline - time.monotonic()))
+        done, _ = wait([primary], timeout=first_wait)
+        if done and primary.exception() is None:
+            return self._finish(primary, hedged=False, won_by_hedge=False)
+
+        if done:
+            # Primary failed fast - let the caller see the error rather than doubling load
+            raise primary.exception()
+
+        pending = {primary}
+        backup = None
+        if deadline is not None and time.monotonic() >= deadline:
+            pass
+        elif self._saturated():
+            metrics.incr('hedge_skipped', provider=self.name, reason='saturated')
+        else:
+            metrics.incr('hedge_fired', provider=self.name)
+            backup = self._submit(fn)
+            pending.add(backup)
+        first_error = None
+
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return self._finish(future, hedged=backup is not None, won_by_hedge=future is backup)
+                first_error = first_error or future.exception()
+
+        for loser in pending:
+            loser.cancel()
+        if first_error is not None:
+            raise first_error
+        raise TimeoutError(f"{self.name} hedged call timed out")
+
+    def _finish(self, future, hedged, won_by_hedge):
+        result, latency = future.result()
+        with self._lock:
+            self._latencies.append(latency)
+        if hedged:
+            metrics.incr('hedge_won' if won_by_hedge else 'hedge_lost', provider=self.name)
+        return result
+
+
+_breakers = {}
+_hedgers = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider):
+    """Process-wide circuit breaker for a provider"""
+    with _registry_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                error_threshold=float(os.getenv('CIRCUIT_ERROR_THRESHOLD', '0.5')),
+                min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', '10')),
+                cooldown=float(os.getenv('CIRCUIT_COOLDOWN_SECONDS', '30'))
+            )
+        return _breakers[provider]
+
+
+def get_hedged_caller(provider):
+    """Process-wide hedged caller for a provider, or None if hedging is disabled"""
+    if os.getenv('LLM_HEDGING', '1') == '0':
+        return None
+    with _registry_lock:
+        if provider not in _hedgers:
+            # Room for every upstream call admission allows in flight, plus a backup for each
+            default_workers = 2 * int(os.getenv('ADMISSION_MAX_UPSTREAM_INFLIGHT', '64'))
+            _hedgers[provider] = HedgedCaller(
+                provider,
+                min_delay=float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '0.3')),
+                max_delay=float(os.getenv('HEDGE_MAX_DELAY_SECONDS', '3.0')),
+                max_workers=int(os.getenv('HEDGE_MAX_WORKERS', str(default_workers)))
+            )
+        return _hedgers[provider]
@@ -0,0 +1,212 @@
+"""
+Speculative replies from interim speech.
+
+The browser hears the customer long before it submits the turn: interim
+recognition results stream in while they talk, and the final transcript
+only goes out after the silence timeout. Once the interim text has stopped
+changing for SPECULATION_STABLE_MS, the reply is generated in the
+background from it. When the real turn arrives it uses that reply if the
+call is in the same state and the final words are close enough
+(SPECULATION_MATCH_RATIO); otherwise the speculative result is dropped and
+the reply is generated as usual.
+
+A provider call can't be recalled once sent, so "cancel" means the result
+is discarded; its tokens still count toward the call's usage. That is why
+speculation is opt-in (SPECULATION_ENABLED=1), a turn starts at most
+SPECULATION_MAX_PER_TURN generations, and a new one never starts while the
+previous one is still running.
+"""
+import difflib
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', '0') == '1'
+SPECULATION_STABLE_MS = int(os.getenv('SPECULATION_STABLE_MS', '300'))
+SPECULATION_MATCH_RATIO = float(os.getenv('SPECULATION_MATCH_RATIO', '0.9'))
+SPECULATION_MIN_WORDS = int(os.getenv('SPECULATION_MIN_WORDS', '2'))
+SPECULATION_MAX_PER_TURN = int(os.getenv('SPECULATION_MAX_PER_TURN', '2'))
+# Longest the real turn waits for a matching speculation before giving up on it
+SPECULATION_WAIT_SECONDS = float(os.getenv('SPECULATION_WAIT_SECONDS', '10'))
+
+Pending = namedtuple('Pending', ['text', 'key', 'future', 'context'])
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+_executor = None
+_state_lock = threading.Lock()
+_outcomes = {'hit': 0, 'miss': 0}
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+def _get_executor():
+    global _executor
+    with _state_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('SPECULATION_WORKERS', '8')), thread_name_prefix='speculation'
+            )
+        return _executor
+
+
+def _record_outcome(result, reason):
+    metrics.incr('speculation_outcomes', result=result, reason=reason)
+    with _state_lock:
+        _outcomes[result] += 1
+        hit_rate = _outcomes['hit'] / (_outcomes['hit'] + _outcomes['miss'])
+    metrics.set_gauge('speculation_hit_rate', round(hit_rate, 4))
+
+
+class ReplySpeculator:
+    """Per-conversation speculation state: the latest interim text and at most one reply in flight"""
+
+    def __init__(self, simulator, stable_seconds=None, match_ratio=None, max_per_turn=None):
+        self.simulator = simulator
+        self.stable_seconds = SPECULATION_STABLE_MS / 1000 if stable_seconds is None else stable_seconds
+        self.match_ratio = SPECULATION_MATCH_RATIO if match_ratio is None else match_ratio
+        self.max_per_turn = SPECULATION_MAX_PER_TURN if max_per_turn is None else max_per_turn
+        self._lock = threading.Lock()
+        self._latest = None     # (normalized, raw) interim text
+        self._timer = None
+        self._pending = None
+        self._started = 0       # generations started for the current turn
+
+    @classmethod
+    def attach(cls, simulator):
+        """The simulator's speculator, created on first use"""
+        with _state_lock:
+            if simulator.speculation is None:
+                simulator.speculation = cls(simulator)
+            return simulator.speculation
+
+    def interim(self, text):
+        """Note the latest interim transcript; returns what happens with it"""
+        normalized = normalize(text)
+        with self._lock:
+            if self._pending is not None and self._pending.text == normalized:
+                return 'speculating'
+            if self._latest is not None and self._latest[0] == normalized:
+                return 'waiting'
+            self._latest = (normalized, text)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(normalized.split()) < SPECULATION_MIN_WORDS:
+                return 'too_short'
+            # Started only if nothing newer arrives before the timer fires
+            self._timer = threading.Timer(self.stable_seconds, self._on_stable, args=(normalized,))
+            self._timer.daemon = True
+            self._timer.start()
+        return 'waiting'
+
+    def _on_stable(self, normalized):
+        with self._lock:
+            if self._latest is None or self._latest[0] != normalized:
+                return
+            text = self._latest[1]
+
+        # A turn being processed right now changes the state this would be based on
+        if not self.simulator.turn_lock.acquire(blocking=False):
+            metrics.incr('speculation_skipped', reason='turn_in_progress')
+            return
+        try:
+            plan, reason = self.simulator.plan_speculative_reply(text)
+        finally:
+            self.simulator.turn_lock.release()
+        if plan is None:
+            metrics.incr('speculation_skipped', reason=reason)
+            return
+
+        with self._lock:
+            if self._latest is None or self._latest[0] != normalized:
+                return
+            # Every start is a billed completion: one at a time, and a few per turn at most
+            if self._pending is not None and not self._pending.future.done():
+                skipped = 'in_flight'
+            elif self._started >= self.max_per_turn:
+                skipped = 'turn_cap'
+            else:
+                skipped = None
+                if self._pending is not None:
+                    metrics.incr('speculation_discarded', reason='superseded')
+                future = _get_executor().submit(self._generate, plan['kwargs'])
+                self._pending = Pending(normalized, plan['key'], future, plan['kwargs']['context'])
+                self._started += 1
+        if skipped:
+            metrics.incr('speculation_skipped', reason=skipped)
+            return
+        metrics.incr('speculation_started')
+        print(f"[SPECULATE] Generating from interim: {text[:60]}")
+
+    def _generate(self, kwargs):
+        started = time.perf_counter()
+        result = self.simulator.ai_service.generate_response(**kwargs)
+        return result, time.perf_counter() - started
+
+    def commit(self, final_text, key):
+        """(generate_response result, context) from a matching speculation, or None to generate as usual"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._latest = None
+            self._started = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending is None:
+            metrics.incr('speculation_outcomes', result='none', reason='no_interim')
+            return None
+
+        if pending.key != key:
+            _record_outcome('miss', 'state_changed')
+            return None
+        normalized = normalize(final_text)
+        if normalized != pending.text and difflib.SequenceMatcher(None, pending.text, normalized).ratio() < self.match_ratio:
+            _record_outcome('miss', 'text_changed')
+            return None
+
+        wait_started = time.perf_counter()
+        try:
+            result, generation_seconds = pending.future.result(timeout=SPECULATION_WAIT_SECONDS)
+        except Exception as e:
+            print(f"[SPECULATE] Speculative reply unusable: {e}")
+            _record_outcome('miss', 'error')
+            return None
+        waited = time.perf_counter() - wait_started
+
+        _record_outcome('hit', 'matched')
+        # What the customer didn't have to wait for: generation time minus any remainder waited here
+        metrics.observe('speculation_latency_saved_seconds', max(0.0, generation_seconds - waited))
+        metrics.observe('speculation_commit_wait_seconds', waited)
+        return result, pending.context
+
+    def cancel(self, reason='ended'):
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._latest = None
+            self._started = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending is not None:
+            metrics.incr('speculation_discarded', reason=reason)
+
+
+def speculation_stats():
+    with _state_lock:
+        total = _outcomes['hit'] + _outcomes['miss']
+        return {
+            'enabled': SPECULATION_ENABLED,
+            'max_per_turn': SPECULATION_MAX_PER_TURN,
+            'hits': _outcomes['hit'],
+            'misses': _outcomes['miss'],
+            'hit_rate': round(_outcomes['hit'] / total, 4) if total else None,
+            'latency_saved_p50_seconds': metrics.percentile('speculation_latency_saved_seconds', 50)
+        }
@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to import the app and
+answer its first request, checked against an import-time budget.
+
+Usage:
+    python startup_benchmark.py --runs 5 --budget-ms 500
+
+Each run is a new interpreter with STARTUP_PREWARM=0, so nothing is loaded
+ahead of time. Exits non-zero when the median import time exceeds the budget
+(STARTUP_IMPORT_BUDGET_MS, default 500), so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside the child interpreter; prints one JSON line
+_PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/health')
+answered = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - started) * 1000,
+    'status': response.status_code
+}))
+"""
+
+
+def _child_env():
+    return dict(os.environ, STARTUP_PREWARM='0')
+
+
+def measure_once():
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE], cwd=HERE, env=_child_env(),
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'probe failed')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=10):
+    """Top-level modules by cumulative import time (python -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=HERE, env=_child_env(),
+        capture_output=True, text=True, timeout=120
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        # Children are listed before their parent, two spaces deeper per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'app':
+                break
+            entries = []   # belonged to site or another top-level import
+        elif depth == 1:
+            entries.append((int(parts[1]) / 1_000_000, name.strip()))
+    return sorted(entries, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app import and cold-start-to-first-request time")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '500')))
+    parser.add_argument('--breakdown', action='store_true', help="Also list the slowest imports")
+    args = parser.parse_args(argv)
+
+    samples = [measure_once() for _ in range(args.runs)]
+    import_ms = statistics.median(sample['import_ms'] for sample in samples)
+    first_request_ms = statistics.median(sample['first_request_ms'] for sample in samples)
+
+    print(f"\n{'='*50}")
+    print("STARTUP BENCHMARK")
+    print(f"{'='*50}")
+    print(f"Runs: {args.runs}")
+    print(f"Import app: median {import_ms:.0f}ms, max {max(s['import_ms'] for s in samples):.0f}ms")
+    print(f"Cold start to first request: median {first_request_ms:.0f}ms")
+    if args.breakdown:
+        print("Slowest imports:")
+        for seconds, name in slowest_imports():
+            print(f"   {name}: {seconds * 1000:.0f}ms")
+    within_budget = import_ms <= args.budget_ms
+    print(f"Budget: {args.budget_ms:.0f}ms → {'✅ within budget' if within_budget else '❌ over budget'}")
+    print(f"{'='*50}\n")
+    return 0 if within_budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
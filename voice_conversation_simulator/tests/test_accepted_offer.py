@@ -0,0 +1,41 @@
+import pytest
+
+from conversation_simulator import VoiceConversationSimulator
+
+SLOTS = ['slot-1', 'slot-2', 'slot-3']
+
+
+@pytest.fixture
+def simulator():
+    simulator = VoiceConversationSimulator.__new__(VoiceConversationSimulator)
+    simulator._offered_slots = list(SLOTS)
+    return simulator
+
+
+@pytest.mark.parametrize('response, expected', [
+    ("Okay", 'slot-1'),
+    ("Yes, that works for me", 'slot-1'),
+    ("Sure, sounds good", 'slot-1'),
+    ("The second one please", 'slot-2'),
+    ("I'll take the 3rd", 'slot-3'),
+])
+def test_acceptances(simulator, response, expected):
+    assert simulator._accepted_offer(response) == expected
+
+
+@pytest.mark.parametrize('response', [
+    "None of those look good to me",
+    "I'm not sure, let me check",
+    "No, that doesn't work",
+    "The first one doesn't suit me",
+    "Can you do something on the weekend instead?",
+    "Looks like I'm busy all week",
+    "Hmm",
+])
+def test_refusals_and_other_replies_book_nothing(simulator, response):
+    assert simulator._accepted_offer(response) is None
+
+
+def test_nothing_offered(simulator):
+    simulator._offered_slots = []
+    assert simulator._accepted_offer("Okay") is None
@@ -0,0 +1,29 @@
+import app as app_module
+from admission import AdmissionController
+
+
+def test_rejects_when_conversations_are_full():
+    controller = AdmissionController(max_conversations=1)
+    assert controller.admit('a').admitted
+    decision = controller.admit('b')
+    assert not decision.admitted and decision.reason == 'conversations'
+    controller.finish('a')
+    assert controller.admit('b').admitted
+
+
+def test_failed_start_releases_its_slot(monkeypatch):
+    controller = AdmissionController(max_conversations=1)
+    monkeypatch.setattr(app_module, 'admission', controller)
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+
+    def broken_simulator(*args, **kwargs):
+        raise RuntimeError('flows unavailable')
+
+    monkeypatch.setattr(app_module, 'VoiceConversationSimulator', broken_simulator)
+    sector = next(iter(app_module.flow_engine.table.sectors))
+    response = app_module.app.test_client().post('/api/start_conversation', json={
+        'customerName': 'Asha', 'phoneNumber': '9000000000', 'sector': sector
+    })
+    assert response.status_code == 500
+    assert controller.stats()['live_conversations'] == 0
+    assert not app_module.active_conversations
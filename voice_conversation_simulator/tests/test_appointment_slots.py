@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from appointment_slots import parse_slot
+
+NOW = datetime(2026, 10, 16, 14, 0)   # a Friday afternoon
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("tomorrow at 11 am", datetime(2026, 10, 17, 11, 0)),
+    ("day after tomorrow at 3pm", datetime(2026, 10, 18, 15, 0)),
+    ("today at 5 pm", datetime(2026, 10, 16, 17, 0)),
+    ("Saturday 4pm", datetime(2026, 10, 17, 16, 0)),
+    ("next friday at 10:30 am", datetime(2026, 10, 23, 10, 30)),
+    ("Friday at 11", datetime(2026, 10, 23, 11, 0)),
+    ("Monday at 4", datetime(2026, 10, 19, 16, 0)),
+    ("next week at 11am", datetime(2026, 10, 19, 11, 0)),
+    ("5th March at 3 pm", datetime(2027, 3, 5, 15, 0)),
+    ("October 30 at 12 pm", datetime(2026, 10, 30, 12, 0)),
+    ("the 20th at 11am", datetime(2026, 10, 20, 11, 0)),
+    ("on 5th at 3 pm", datetime(2026, 11, 5, 15, 0)),
+    ("the 31st at 10am", datetime(2026, 10, 31, 10, 0)),
+    ("tomorrow morning", datetime(2026, 10, 17, 10, 0)),
+    ("Sunday evening", datetime(2026, 10, 18, 18, 0)),
+    ("at 6 pm", datetime(2026, 10, 16, 18, 0)),
+    ("11 am works", datetime(2026, 10, 17, 11, 0)),
+    ("16:45", datetime(2026, 10, 16, 16, 45)),
+])
+def test_parse_slot(text, expected):
+    assert parse_slot(text, now=NOW) == expected
+
+
+@pytest.mark.parametrize('text', [
+    "good morning",
+    "in the evening usually",
+    "afternoon is better for me",
+    "tomorrow",
+    "my budget is around 50 lakhs",
+    "I want a 2 BHK",
+    "",
+])
+def test_no_slot_without_a_date_or_clock_time(text):
+    assert parse_slot(text, now=NOW) is None
+
+
+def test_day_of_month_skips_short_months():
+    assert parse_slot("the 31st at 10am", now=datetime(2026, 11, 2, 9, 0)) == datetime(2026, 12, 31, 10, 0)
@@ -0,0 +1,37 @@
+import json
+
+from conversation_socket import ConversationSocket
+
+
+class FakeSocket:
+    def __init__(self, messages):
+        self.incoming = [json.dumps(message) for message in messages]
+        self.sent = []
+
+    def receive(self):
+        return self.incoming.pop(0) if self.incoming else None
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def _serve(end_conversation):
+    ws = FakeSocket([{'type': 'end'}])
+    ConversationSocket(ws, 'conversation-1', run_turn=None, synthesize=None, end_conversation=end_conversation,
+                       audio_profile='mp3', mimetype='audio/mpeg').serve()
+    return [message['type'] for message in ws.sent], ws.sent[-1]
+
+
+def test_end_sends_results():
+    types, last = _serve(lambda: {'lead_score': 7})
+    assert types == ['ready', 'ended']
+    assert last['results'] == {'lead_score': 7}
+
+
+def test_failed_end_sends_error_instead_of_raising():
+    def fail():
+        raise RuntimeError('log unavailable')
+
+    types, last = _serve(fail)
+    assert types == ['ready', 'error']
+    assert 'log unavailable' in last['error']
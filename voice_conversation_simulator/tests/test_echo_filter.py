@@ -0,0 +1,39 @@
+import pytest
+
+from echo_filter import EchoGuard
+
+
+@pytest.mark.parametrize('ai_message, utterance', [
+    ("Are you looking for a personal loan or a credit card?", "a personal loan"),
+    ("Are you looking for a personal loan or a credit card?", "I'm looking for a credit card"),
+    ("Which would you prefer: 1 BHK, 2 BHK or 3 BHK?", "I would prefer 2 BHK"),
+    ("Would tomorrow morning or afternoon work for you?", "tomorrow morning would work"),
+    ("Is your budget around fifty lakhs?", "yes around fifty lakhs"),
+])
+def test_answers_reusing_question_words_are_processed(ai_message, utterance):
+    assert EchoGuard().check(utterance, ai_message) is None
+
+
+@pytest.mark.parametrize('ai_message, utterance', [
+    ("Are you looking for a personal loan or a credit card?",
+     "are you looking for a personal loan or a credit card"),
+    ("Are you looking for a personal loan or a credit card?",
+     "looking for a personal loan or a credit card"),
+    ("Would tomorrow morning or afternoon work for you?", "would tomorrow morning or afternoon work"),
+])
+def test_tts_picked_up_by_the_mic_is_an_echo(ai_message, utterance):
+    guard = EchoGuard()
+    assert guard.check(utterance, ai_message) == 'echo'
+    assert guard.suppressed['echo'] == 1
+
+
+def test_repeated_turn_is_a_duplicate():
+    guard = EchoGuard()
+    ai_message = "Which city are you looking in?"
+    assert guard.check("I am looking for a flat in Pune", ai_message) is None
+    assert guard.check("I am looking for a flat in Pune", ai_message) == 'duplicate'
+
+
+def test_misheard_echo_is_still_an_echo():
+    ai_message = "Are you looking for a personal loan or a credit card?"
+    assert EchoGuard().check("are you looking for a personal loan or a credit cart", ai_message) == 'echo'
@@ -0,0 +1,18 @@
+import app as app_module
+from conversation_simulator import VoiceConversationSimulator
+
+
+def test_ending_twice_saves_once(monkeypatch):
+    saved = []
+    monkeypatch.setattr(app_module, 'persist_conversation',
+                        lambda conversation_id, simulator: saved.append(conversation_id) or True)
+    sector = next(iter(app_module.flow_engine.table.sectors))
+    simulator = VoiceConversationSimulator('Asha', '9000000000', sector)
+    monkeypatch.setitem(app_module.active_conversations, 'conversation-1', simulator)
+
+    first = app_module.end_conversation_results('conversation-1', simulator)
+    # The page's HTTP fallback after the socket already ended the call
+    response = app_module.app.test_client().post('/api/end_conversation', json={'conversation_id': 'conversation-1'})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == first
+    assert saved == ['conversation-1']
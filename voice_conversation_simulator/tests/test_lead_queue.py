@@ -0,0 +1,41 @@
+from lead_queue import LeadQueue
+
+
+def _record(conversation_id, score, interest='High', action='Yes', phone='9000000000', assignee='Loan Desk'):
+    return {
+        'Conversation ID': conversation_id,
+        'Customer Name': 'Asha',
+        'Phone Number': phone,
+        'Sector': 'banking',
+        'Lead Score (1-10)': score,
+        'Interest Level': interest,
+        'Action Required': action,
+        'Action Assignee': assignee
+    }
+
+
+def test_best_lead_first(tmp_path):
+    queue = LeadQueue(str(tmp_path / 'leads.jsonl'))
+    queue.push_record(_record('c1', 5, phone='1'))
+    queue.push_record(_record('c2', 9, phone='2'))
+    queue.push_record(_record('c3', 7, phone='3'))
+    assert [lead['lead_id'] for lead in queue.peek(limit=3)] == ['c2', 'c3', 'c1']
+    assert queue.pop()['lead_id'] == 'c2'
+
+
+def test_newer_call_replaces_older_lead(tmp_path):
+    queue = LeadQueue(str(tmp_path / 'leads.jsonl'))
+    queue.push_record(_record('c1', 5))
+    queue.push_record(_record('c2', 8))
+    assert [lead['lead_id'] for lead in queue.peek(limit=5)] == ['c2']
+
+
+def test_newer_call_needing_no_action_removes_the_lead(tmp_path):
+    path = str(tmp_path / 'leads.jsonl')
+    queue = LeadQueue(path)
+    queue.push_record(_record('c1', 8))
+    assert queue.push_record(_record('c2', 2, interest='Not Interested')) is None
+    assert queue.pop() is None
+
+    # The removal is journaled, so it survives a restart
+    assert LeadQueue(path).pop() is None
@@ -0,0 +1,43 @@
+import pytest
+
+from local_answers import evaluate_arithmetic, resolve
+
+PERSONA = {'name': 'Sarah', 'company': 'SDFC Bank'}
+
+
+@pytest.mark.parametrize('question, answer', [
+    ("what is 12 * 4?", "That's 48."),
+    ("what is 2**10", "That's 1,024."),
+    ("what is 9**0.5", "That's 3."),
+    ("what is (-8)**2", "That's 64."),
+])
+def test_arithmetic_is_answered_locally(question, answer):
+    assert resolve(question, PERSONA) == ('math', answer)
+
+
+@pytest.mark.parametrize('question', [
+    "what is (-8)**0.5",
+    "what is (-2) ** 1.5?",
+])
+def test_non_real_results_go_to_the_model(question):
+    assert evaluate_arithmetic(question) is None
+    assert resolve(question, PERSONA) is None
+
+
+@pytest.mark.parametrize('question, answer', [
+    ("Who are you?", "I'm Sarah from SDFC Bank."),
+    ("Which company is this?", "I'm calling from SDFC Bank."),
+    ("Sorry, where are you from?", "I'm Sarah, calling from SDFC Bank."),
+])
+def test_identity_questions_are_answered_locally(question, answer):
+    assert resolve(question, PERSONA) == ('identity', answer)
+
+
+@pytest.mark.parametrize('question', [
+    "Which company offers the lowest home loan rate?",
+    "Who are you and what is the interest rate on a 20 lakh loan?",
+    "Your name again? Also I need a loan of 5 lakhs",
+    "Who are you and why do you keep calling me during dinner every single evening?",
+])
+def test_identity_mixed_with_another_question_goes_to_the_model(question):
+    assert resolve(question, PERSONA) is None
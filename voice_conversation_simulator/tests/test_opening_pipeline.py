@@ -0,0 +1,70 @@
+import os
+import time
+
+from opening_pipeline import PreparedOpeningStore, prepare_openings
+
+
+def _customer(phone, name='Asha', sector='banking'):
+    return {'name': name, 'phone': phone, 'sector': sector}
+
+
+class FakeAI:
+    def generate_opening_message(self, customer_info, **kwargs):
+        return f"Hello {customer_info['name']}!"
+
+
+class FakeTTS:
+    enabled = True
+
+    def text_to_speech(self, text, **kwargs):
+        return text.encode('utf-8')
+
+
+def test_running_store_sees_openings_prepared_elsewhere(tmp_path):
+    server = PreparedOpeningStore(str(tmp_path))
+    assert server.get('900', 'banking', 'Asha') is None
+
+    cli = PreparedOpeningStore(str(tmp_path))
+    cli.put(_customer('900'), "Hello Asha!")
+    assert server.get('900', 'banking', 'Asha') == "Hello Asha!"
+
+
+def test_saving_keeps_the_other_process_entries(tmp_path):
+    first = PreparedOpeningStore(str(tmp_path))
+    second = PreparedOpeningStore(str(tmp_path))
+    first.put(_customer('900'), "Hello Asha!")
+    second.put(_customer('901', name='Ravi'), "Hello Ravi!")
+    first.put(_customer('902', name='Meena'), "Hello Meena!")
+
+    reader = PreparedOpeningStore(str(tmp_path))
+    assert reader.get('900', 'banking', 'Asha') == "Hello Asha!"
+    assert reader.get('901', 'banking', 'Ravi') == "Hello Ravi!"
+    assert reader.get('902', 'banking', 'Meena') == "Hello Meena!"
+
+
+def test_batch_writes_the_index_once(tmp_path, monkeypatch):
+    store = PreparedOpeningStore(str(tmp_path))
+    saves = []
+    original_save = store._save
+    monkeypatch.setattr(store, '_save', lambda: (saves.append(1), original_save()))
+    customers = [_customer(str(900 + i), name=f"Lead {i}") for i in range(20)]
+
+    report = prepare_openings(customers, FakeAI(), store, workers=4)
+    assert report['prepared'] == 20
+    assert len(saves) == 1
+    assert PreparedOpeningStore(str(tmp_path)).get('905', 'banking', 'Lead 5') == "Hello Lead 5!"
+
+
+def test_prune_keeps_audio_shared_with_a_fresh_entry(tmp_path, monkeypatch):
+    store = PreparedOpeningStore(str(tmp_path), ttl_hours=1)
+    with monkeypatch.context() as patch:
+        patch.setattr(time, 'time', lambda: 1000.0)
+        store.put(_customer('900'), "Hello!", b'audio')
+    store.put(_customer('901', name='Ravi'), "Hello!", b'audio')
+
+    assert store.prune() == 1
+    reader = PreparedOpeningStore(str(tmp_path))
+    assert not reader.has_fresh('900', 'banking')
+    assert reader.has_fresh('901', 'banking')
+    assert reader.audio_for_text("Hello!") == b'audio'
+    assert store.audio_for_text("Hello!") == b'audio'
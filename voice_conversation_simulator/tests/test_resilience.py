@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from resilience import HedgedCaller
+
+
+def _slow(seconds, value):
+    def call():
+        time.sleep(seconds)
+        return value
+    return call
+
+
+def test_backup_wins_when_primary_is_slow():
+    caller = HedgedCaller('test', default_delay=0.05)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    assert caller.call(fn) == 2
+
+
+def test_timeout_counts_from_the_start_of_the_call():
+    caller = HedgedCaller('test', default_delay=0.2)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        caller.call(_slow(1.0, 'late'), timeout=0.3)
+    assert time.monotonic() - started < 0.45
+
+
+def test_no_backup_when_every_worker_is_busy():
+    caller = HedgedCaller('test', default_delay=0.05, max_workers=2)
+    release = threading.Event()
+    blocker = caller._submit(lambda: release.wait(5))
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'primary'
+
+    assert caller.call(fn) == 'primary'
+    assert len(calls) == 1
+    release.set()
+    blocker.result()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from speculation import ReplySpeculator
+
+
+class FakeService:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def generate_response(self, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        return {'response': f"reply to {kwargs['customer_response']}"}
+
+
+class FakeSimulator:
+    def __init__(self):
+        self.turn_lock = threading.Lock()
+        self.ai_service = FakeService()
+        self.speculation = None
+
+    def plan_speculative_reply(self, text):
+        return {'kwargs': {'customer_response': text, 'context': None}, 'key': 'state'}, None
+
+
+def _settle(speculator, text):
+    speculator.interim(text)
+    time.sleep(0.05)
+
+
+def _speculator(max_per_turn=2):
+    return ReplySpeculator(FakeSimulator(), stable_seconds=0.01, max_per_turn=max_per_turn)
+
+
+def test_no_new_generation_while_one_is_running():
+    speculator = _speculator()
+    service = speculator.simulator.ai_service
+    _settle(speculator, "I want a personal loan")
+    _settle(speculator, "I want a personal loan for my wedding")
+    assert service.calls == 1
+    service.release.set()
+
+
+def test_generations_per_turn_are_capped():
+    speculator = _speculator(max_per_turn=2)
+    service = speculator.simulator.ai_service
+    service.release.set()
+    for text in ["I want a loan", "I want a personal loan", "I want a personal loan today"]:
+        _settle(speculator, text)
+    assert service.calls == 2
+
+    # The next turn starts with a fresh allowance
+    speculator.commit("I want a personal loan today", 'state')
+    _settle(speculator, "around five lakhs")
+    assert service.calls == 3
+
+
+def test_matching_final_text_uses_the_speculative_reply():
+    speculator = _speculator()
+    speculator.simulator.ai_service.release.set()
+    _settle(speculator, "I want a personal loan")
+    result, context = speculator.commit("I want a personal loan.", 'state')
+    assert result == {'response': 'reply to I want a personal loan'}
+    assert speculator.commit("anything", 'state') is None
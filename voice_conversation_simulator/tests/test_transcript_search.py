@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from log_shards import ShardedConversationLog
+from transcript_search import TranscriptIndex
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _record(conversation_id, date, sector, interest, transcript):
+    return {
+        'Conversation ID': conversation_id,
+        'Date': date,
+        'Time Start': '10:00:00',
+        'Customer Name': f"Customer {conversation_id}",
+        'Phone Number': '9000000000',
+        'Sector': sector,
+        'Interest Level': interest,
+        'Lead Score (1-10)': 5,
+        'Full Conversation Log': transcript
+    }
+
+
+RECORDS = [
+    _record('c1', '2026-10-01', 'Banking', 'High',
+            "AI Agent: Are you looking for a personal loan?\nCustomer: Yes, a personal loan with low EMI"),
+    _record('c2', '2026-10-05', 'Banking', 'Low',
+            "AI Agent: Would a credit card help?\nCustomer: The loan is personal, not a card"),
+    _record('c3', '2026-10-09', 'Real Estate', 'High',
+            "AI Agent: Shall I book a site visit?\nCustomer: Yes, a site visit on Saturday for the personal loan flat"),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    log = ShardedConversationLog(str(tmp_path / 'logs'))
+    index = TranscriptIndex(log, str(tmp_path / 'index'))
+    for record in RECORDS:
+        index.add(log.append(record), record)
+    return index
+
+
+def _ids(result):
+    return [match['conversation_id'] for match in result['results']]
+
+
+def test_phrase_must_appear_in_order(index):
+    result = index.search('"personal loan"')
+    assert sorted(_ids(result)) == ['c1', 'c3']
+    assert result['total'] == 2
+    assert 'personal loan' in result['results'][0]['snippets'][0].lower()
+
+
+def test_words_match_in_any_order(index):
+    assert sorted(_ids(index.search('personal loan'))) == ['c1', 'c2', 'c3']
+
+
+def test_keyword_filters(index):
+    assert sorted(_ids(index.search('loan sector:banking'))) == ['c1', 'c2']
+    assert _ids(index.search('loan interest:high sector:real_estate')) == ['c3']
+    assert _ids(index.search('loan', sector='real_estate')) == ['c3']
+
+
+def test_date_filters(index):
+    assert sorted(_ids(index.search('loan', date_from='2026-10-05'))) == ['c2', 'c3']
+    assert _ids(index.search('loan', date_to='2026-10-04')) == ['c1']
+    assert _ids(index.search('loan', date_from='2026-10-02', date_to='2026-10-06')) == ['c2']
+
+
+def test_no_match(index):
+    assert index.search('"loan personal"')['total'] == 0
+    assert index.search('mortgage')['results'] == []
+
+
+def test_sealed_segment_is_saved_and_reloaded(index, tmp_path):
+    index.conversation_log.seal_current()
+    assert sorted(_ids(index.search('"site visit"'))) == ['c3']
+
+    reloaded = TranscriptIndex(index.conversation_log, str(tmp_path / 'index'))
+    assert sorted(_ids(reloaded.search('"personal loan" sector:banking'))) == ['c1']
+
+
+def test_app_import_does_not_load_numpy(tmp_path):
+    code = "import sys, app; print(sorted(m for m in ('numpy', 'pandas', 'openpyxl') if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    output = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,40 @@
+import numpy as np
+
+from voice_activity import AudioIngestSession, LocalRecognizer, SpeechEndpointer
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def _turn_ids(transcripts):
+    turns = []
+    session = AudioIngestSession(FakeSocket(), 'conversation-1', SpeechEndpointer(),
+                                 LocalRecognizer(transcripts),
+                                 run_turn=lambda text, turn_id: (turns.append(turn_id) or {}, 'processed'))
+    for utterance_no in range(1, len(transcripts) + 1):
+        session._recognize({'audio': np.zeros(1600, dtype=np.int16)}, utterance_no)
+    return turns
+
+
+def test_turn_ids_are_unique_across_reconnects():
+    first = _turn_ids(['hello', 'a personal loan'])
+    second = _turn_ids(['hello again'])
+    assert len(set(first)) == 2
+    assert first[0].endswith('-1') and second[0].endswith('-1')
+    assert second[0] not in first
+
+
+def test_whisper_is_the_default_when_openai_is_configured(monkeypatch):
+    from voice_activity import OpenAIRecognizer, get_recognizer
+
+    monkeypatch.delenv('SPEECH_RECOGNIZER', raising=False)
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    assert isinstance(get_recognizer(), LocalRecognizer)
+    monkeypatch.setattr(OpenAIRecognizer, '__init__', lambda self: None)
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    assert isinstance(get_recognizer(), OpenAIRecognizer)
@@ -0,0 +1,448 @@
+"""
+Full-text search over conversation transcripts.
+
+An inverted index maps each word to the calls containing it, with word
+positions so quoted phrases can be matched exactly. There is one index
+segment per log shard: sealed shards never change, so their segments are
+saved under SEARCH_INDEX_DIR and loaded instead of re-reading the Excel
+file; the open shard's segment is updated as each call is saved.
+
+Query syntax:
+    emi "site visit"          every word and phrase must appear
+    sector:banking            keyword filters: sector, interest, stage, assignee
+Results are ranked with BM25 (a quoted phrase counts as one term) and
+carry the transcript lines that matched.
+"""
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime
+
+from metrics import metrics
+
+SEGMENT_VERSION = 1
+SEARCH_MAX_LIMIT = 100
+SNIPPET_CHARS = 160
+MAX_SNIPPETS = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TEXT_FIELDS = ['Customer Name', 'Conversation Summary', 'Next Action', 'Full Conversation Log']
+KEYWORD_FIELDS = {
+    'sector': 'Sector',
+    'interest': 'Interest Level',
+    'stage': 'Conversation Stage Reached',
+    'assignee': 'Action Assignee'
+}
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_SPEAKER = re.compile(r'^(?:Customer|AI Agent):\s*')
+_QUERY_PART = re.compile(r'"([^"]*)"|(\w+):(\S+)|(\S+)')
+
+
+def _numpy():
+    # NumPy takes a noticeable share of app start-up; load it with the first search or sealed shard
+    import numpy
+    return numpy
+
+
+def _keyword(value):
+    return re.sub(r'[^a-z0-9]+', '_', str(value or '').strip().lower()).strip('_')
+
+
+def _lines(record):
+    """Text lines of a record in index order; the transcript's speaker labels are dropped"""
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if not value:
+            continue
+        for line in str(value).split('\n'):
+            line = _SPEAKER.sub('', line).strip()
+            if line:
+                yield line
+
+
+class Postings:
+    """Sorted doc ids with each doc's word positions, packed into arrays (NumPy once the shard is sealed)"""
+    __slots__ = ('docs', 'counts', 'positions')
+
+    def __init__(self):
+        self.docs = array('I')
+        self.counts = array('I')
+        self.positions = array('I')
+
+    def add(self, doc, positions):
+        self.docs.append(doc)
+        self.counts.append(len(positions))
+        self.positions.extend(positions)
+
+    def freeze(self):
+        self.docs, self.counts, self.positions = self.arrays()
+
+    def arrays(self):
+        """(docs, counts, positions) as NumPy arrays; copies while the segment still takes new calls"""
+        np = _numpy()
+        if isinstance(self.docs, np.ndarray):
+            return self.docs, self.counts, self.positions
+        return (np.array(self.docs, dtype=np.uint32), np.array(self.counts, dtype=np.uint32),
+                np.array(self.positions, dtype=np.uint32))
+
+    def __len__(self):
+        return len(self.docs)
+
+
+class Segment:
+    """Index over the records of one log shard"""
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.rows = 0
+        self.postings = {}
+        self.docs = []          # (conversation id, date, time, customer, phone, sector, interest, lead score)
+        self.dates = array('I')     # YYYYMMDD, 0 when unknown
+        self.lengths = array('I')
+        self.total_length = 0
+        self.transcripts = []   # zlib-compressed text lines, only decompressed for snippets
+        self.first_date = None
+        self.last_date = None
+
+    def add(self, record):
+        self.rows += 1
+        conversation_id = record.get('Conversation ID')
+        if not conversation_id:
+            return
+        doc = len(self.docs)
+        date = record.get('Date')
+        date = date.strftime('%Y-%m-%d') if isinstance(date, datetime) else str(date or '')
+        self.docs.append((
+            str(conversation_id), date, str(record.get('Time Start') or ''), record.get('Customer Name'),
+            str(record.get('Phone Number') or ''), record.get('Sector'), record.get('Interest Level'),
+            record.get('Lead Score (1-10)')
+        ))
+        self.dates.append(_date_number(date))
+        if date:
+            self.first_date = min(self.first_date or date, date)
+            self.last_date = max(self.last_date or date, date)
+
+        term_positions = {}
+        position = 0
+        lines = list(_lines(record))
+        for line in lines:
+            for word in _WORD.findall(line.lower()):
+                term_positions.setdefault(word, []).append(position)
+                position += 1
+            position += 1   # phrases never match across lines
+        for name, field in KEYWORD_FIELDS.items():
+            if record.get(field):
+                term_positions.setdefault(f"{name}:{_keyword(record[field])}", [])
+        for term, positions in term_positions.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = Postings()
+            postings.add(doc, positions)
+        self.lengths.append(position)
+        self.total_length += position
+        self.transcripts.append(zlib.compress('\n'.join(lines).encode('utf-8')))
+
+    def freeze(self):
+        """Switch to NumPy arrays once the shard is sealed and can't grow"""
+        np = _numpy()
+        for postings in self.postings.values():
+            postings.freeze()
+        self.dates = np.array(self.dates, dtype=np.uint32)
+        self.lengths = np.array(self.lengths, dtype=np.uint32)
+
+    def in_range(self, date_from, date_to):
+        if date_from and self.last_date and self.last_date < date_from:
+            return False
+        return not (date_to and self.first_date and self.first_date > date_to)
+
+    def match(self, terms, phrases, keywords, date_from, date_to):
+        """(docs, term frequencies, phrase counts) for every doc matching all terms, phrases and keywords"""
+        np = _numpy()
+        found = {}
+        for term in terms + keywords:
+            postings = self.postings.get(term)
+            if postings is None:
+                return None
+            found[term] = postings.arrays()
+        docs = None
+        for term in sorted(found, key=lambda term: len(found[term][0])):
+            docs = found[term][0] if docs is None else np.intersect1d(docs, found[term][0], assume_unique=True)
+        if docs is None or not len(docs):
+            return None
+
+        if date_from or date_to:
+            dates = np.asarray(self.dates, dtype=np.uint32)[docs]
+            keep = (dates >= _date_number(date_from)) & (dates <= (_date_number(date_to) or np.iinfo(np.uint32).max))
+            docs = docs[keep]
+
+        phrase_matches = []
+        for phrase in phrases:
+            # An occurrence is (doc << 32 | position); the phrase matches where word i sits at start + i
+            keys = [_occurrence_keys(*found[word]) for word in phrase]
+            starts = keys[0]
+            for offset, following in enumerate(keys[1:], start=1):
+                starts = starts[np.isin(starts + np.uint64(offset), following, assume_unique=True)]
+            phrase_docs, counts = np.unique((starts >> np.uint64(32)).astype(np.uint32), return_counts=True)
+            docs = docs[np.isin(docs, phrase_docs, assume_unique=True)]
+            phrase_matches.append((phrase_docs, counts))
+        if not len(docs):
+            return None
+
+        frequencies = {}
+        for term in terms:
+            term_docs, counts, _ = found[term]
+            frequencies[term] = counts[np.searchsorted(term_docs, docs)].astype(np.float64)
+        phrase_counts = [counts[np.searchsorted(phrase_docs, docs)].astype(np.float64)
+                         for phrase_docs, counts in phrase_matches]
+        return docs, frequencies, phrase_counts
+
+
+def _date_number(date):
+    digits = (date or '').replace('-', '')
+    return int(digits) if len(digits) == 8 and digits.isdigit() else 0
+
+
+def _occurrence_keys(docs, counts, positions):
+    np = _numpy()
+    return (np.repeat(docs, counts).astype(np.uint64) << np.uint64(32)) | positions.astype(np.uint64)
+
+
+def parse_query(text):
+    """Split a query into (words, phrases, keyword filters)"""
+    words, phrases, keywords = [], [], []
+    for phrase, field, value, word in _QUERY_PART.findall(text.lower()):
+        if field and field in KEYWORD_FIELDS:
+            keywords.append(f"{field}:{_keyword(value)}")
+            continue
+        if field:
+            word = f"{field} {value}"
+        tokens = _WORD.findall(phrase or word)
+        if len(tokens) > 1:
+            phrases.append(tokens)
+        elif tokens:
+            words.append(tokens[0])
+    return list(dict.fromkeys(words)), phrases, list(dict.fromkeys(keywords))
+
+
+def parse_search_params(args):
+    """Validate /api/search query parameters"""
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise ValueError("'q' is required")
+    params = {'q': query, 'sector': _keyword(args['sector']) if args.get('sector') else None}
+    for field in ('date_from', 'date_to'):
+        value = args.get(field)
+        try:
+            params[field] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') if value else None
+        except ValueError:
+            raise ValueError(f"'{field}' must be a date in YYYY-MM-DD format")
+    for field, default in (('limit', 20), ('offset', 0)):
+        try:
+            params[field] = int(args.get(field, default))
+        except ValueError:
+            raise ValueError(f"'{field}' must be an integer")
+    if params['limit'] < 1 or params['offset'] < 0:
+        raise ValueError("'limit' must be positive and 'offset' not negative")
+    params['limit'] = min(params['limit'], SEARCH_MAX_LIMIT)
+    return params
+
+
+def _snippets(text, words, phrases):
+    """Up to MAX_SNIPPETS transcript lines containing a phrase or word, trimmed around the match"""
+    patterns = [r'\W+'.join(map(re.escape, phrase)) for phrase in phrases] + [re.escape(word) for word in words]
+    if not patterns:
+        return []
+    matcher = re.compile(r'\b(?:' + '|'.join(patterns) + r')\b', re.IGNORECASE)
+    snippets = []
+    for line in text.split('\n'):
+        match = matcher.search(line)
+        if not match:
+            continue
+        if len(line) > SNIPPET_CHARS:
+            start = max(0, min(match.start() - SNIPPET_CHARS // 3, len(line) - SNIPPET_CHARS))
+            line = ('…' if start else '') + line[start:start + SNIPPET_CHARS] + ('…' if start + SNIPPET_CHARS < len(line) else '')
+        snippets.append(line)
+        if len(snippets) == MAX_SNIPPETS:
+            break
+    return snippets
+
+
+class TranscriptIndex:
+    """
+    Segmented inverted index over the conversation log.
+
+    `add()` is called with each saved record; everything else is read from
+    the log's shards on first use (or during prewarm).
+    """
+
+    def __init__(self, conversation_log, index_dir=None):
+        self.conversation_log = conversation_log
+        self.index_dir = index_dir or os.getenv('SEARCH_INDEX_DIR', 'search_index')
+        self._segments = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _segment_path(self, shard_name):
+        return os.path.join(self.index_dir, f"{shard_name}.idx")
+
+    def _read_segment(self, shard):
+        path = self._segment_path(shard['name'])
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            print(f"[SEARCH] ❌ Ignoring unreadable segment {path}: {e}")
+            return None
+        if saved.get('version') != SEGMENT_VERSION or saved['segment'].rows != shard['rows']:
+            return None
+        return saved['segment']
+
+    def _write_segment(self, segment):
+        segment.freeze()
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._segment_path(segment.shard)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': SEGMENT_VERSION, 'segment': segment}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _build_segment(self, shard):
+        from export_service import iter_log_rows
+
+        segment = Segment(shard['name'])
+        for _, record in iter_log_rows(shard['path']):
+            segment.add(record)
+        return segment
+
+    def _sync(self):
+        """Bring segments in line with the shard manifest (caller holds the lock)"""
+        started = time.perf_counter()
+        built = 0
+        shards = self.conversation_log.describe_shards()
+        for shard in shards:
+            segment = self._segments.get(shard['name'])
+            if segment is not None and segment.rows == shard['rows']:
+                if shard['sealed'] and not os.path.exists(self._segment_path(shard['name'])):
+                    self._write_segment(segment)
+                continue
+            segment = self._read_segment(shard) if shard['sealed'] else None
+            if segment is None:
+                segment = self._build_segment(shard)
+                built += 1
+                if shard['sealed']:
+                    self._write_segment(segment)
+            self._segments[shard['name']] = segment
+        known = {shard['name'] for shard in shards}
+        for name in [name for name in self._segments if name not in known]:
+            del self._segments[name]
+        metrics.set_gauge('search_index_documents', sum(len(segment.docs) for segment in self._segments.values()))
+        if built:
+            print(f"[SEARCH] ✅ Indexed {built} log shards in {time.perf_counter() - started:.2f}s")
+
+    def ensure_loaded(self):
+        with self._lock:
+            if not self._loaded:
+                self._sync()
+                self._loaded = True
+
+    def add(self, shard_name, record):
+        """Index a record just appended to `shard_name`"""
+        with self._lock:
+            if not self._loaded:
+                return   # the first load reads it from the shard
+            segment = self._segments.get(shard_name)
+            if segment is None:
+                segment = self._segments[shard_name] = Segment(shard_name)
+            segment.add(record)
+        metrics.incr('search_index_adds')
+
+    def search(self, q, sector=None, date_from=None, date_to=None, limit=20, offset=0):
+        """Ranked matches for the query with snippets; every word, phrase and keyword must match"""
+        np = _numpy()
+        started = time.perf_counter()
+        words, phrases, keywords = parse_query(q)
+        if sector:
+            keywords.append(f"sector:{sector}")
+        with self._lock:
+            self._sync()
+            self._loaded = True
+            segments = list(self._segments.values())
+
+            # Corpus-wide statistics for BM25
+            total_docs = sum(len(segment.docs) for segment in segments) or 1
+            average_length = sum(segment.total_length for segment in segments) / total_docs or 1.0
+            terms = list(dict.fromkeys(words + [word for phrase in phrases for word in phrase]))
+            frequency = {term: sum(len(segment.postings.get(term, ())) for segment in segments) for term in terms}
+            idf = {term: max(0.0, _idf(total_docs, frequency[term])) for term in terms}
+
+            candidates = []
+            total = 0
+            for order, segment in enumerate(segments):
+                if not segment.in_range(date_from, date_to):
+                    continue
+                matched = segment.match(terms, phrases, keywords, date_from, date_to)
+                if matched is None:
+                    continue
+                docs, frequencies, phrase_counts = matched
+                total += len(docs)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(segment.lengths, dtype=np.float64)[docs] / average_length)
+                scores = np.zeros(len(docs))
+                for word in words:
+                    scores += idf[word] * _saturate(frequencies[word], norm)
+                for phrase, counts in zip(phrases, phrase_counts):
+                    scores += sum(idf[word] for word in phrase) * _saturate(counts, norm)
+                # Best first, newest first among equal scores; only this segment's top page is kept
+                dates = np.asarray(segment.dates, dtype=np.uint32)[docs]
+                top = np.lexsort((-docs.astype(np.int64), -dates.astype(np.int64), -scores))[:offset + limit]
+                candidates.extend((float(scores[i]), int(dates[i]), order, int(docs[i]), segment) for i in top)
+
+        page = heapq.nlargest(offset + limit, candidates, key=lambda match: match[:4])[offset:]
+        results = []
+        for score, _, _, doc, segment in page:
+            conversation_id, date, time_start, customer, phone, sector_name, interest, lead_score = segment.docs[doc]
+            text = zlib.decompress(segment.transcripts[doc]).decode('utf-8')
+            results.append({
+                'conversation_id': conversation_id,
+                'date': date,
+                'time_start': time_start,
+                'customer_name': customer,
+                'phone_number': phone,
+                'sector': sector_name,
+                'interest_level': interest,
+                'lead_score': lead_score,
+                'score': round(score, 3),
+                'snippets': _snippets(text, words, phrases),
+                'shard': segment.shard
+            })
+
+        took = time.perf_counter() - started
+        metrics.observe('search_seconds', took)
+        metrics.incr('search_queries', result='hit' if total else 'miss')
+        return {'total': total, 'took_ms': round(took * 1000, 2), 'results': results}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'index_dir': os.path.abspath(self.index_dir),
+                'loaded': self._loaded,
+                'segments': len(self._segments),
+                'documents': sum(len(segment.docs) for segment in self._segments.values())
+            }
+
+
+def _idf(total_docs, frequency):
+    return math.log(1 + (total_docs - frequency + 0.5) / (frequency + 0.5))
+
+
+def _saturate(count, norm):
+    return count * (BM25_K1 + 1) / (count + norm)
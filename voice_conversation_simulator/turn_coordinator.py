@@ -0,0 +1,81 @@
+import threading
+import time
+
+from metrics import metrics
+
+
+class _InFlightTurn:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TurnCoordinator:
+    """
+    Makes customer-turn submission idempotent on a client-supplied turn ID.
+
+    The first request for a (conversation, turn) pair does the work. Copies
+    that arrive while it is still running wait for and share its result,
+    and copies that arrive afterwards are answered from a short-lived cache.
+    Failed turns are not cached so a retry runs them again.
+    """
+
+    def __init__(self, result_ttl=120.0, wait_timeout=30.0):
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._results = {}
+
+    def _prune(self, now):
+        expired = [key for key, (stored_at, _) in self._results.items() if now - stored_at > self.result_ttl]
+        for key in expired:
+            del self._results[key]
+
+    def run(self, conversation_id, turn_id, fn):
+        """
+        Run `fn` once per turn ID and return (result, source), where source is
+        'processed', 'coalesced' (joined an in-flight copy) or 'replayed'.
+        """
+        if not turn_id:
+            return fn(), 'processed'
+
+        key = (conversation_id, str(turn_id))
+        with self._lock:
+            self._prune(time.monotonic())
+            if key in self._results:
+                metrics.incr('turn_requests', source='replayed')
+                return self._results[key][1], 'replayed'
+            in_flight = self._in_flight.get(key)
+            owner = in_flight is None
+            if owner:
+                in_flight = self._in_flight[key] = _InFlightTurn()
+
+        if not owner:
+            metrics.incr('turn_requests', source='coalesced')
+            if not in_flight.done.wait(self.wait_timeout):
+                raise TimeoutError(f"Turn {turn_id} is still being processed")
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result, 'coalesced'
+
+        metrics.incr('turn_requests', source='processed')
+        try:
+            in_flight.result = fn()
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if in_flight.error is None:
+                    self._results[key] = (time.monotonic(), in_flight.result)
+            in_flight.done.set()
+        return in_flight.result, 'processed'
+
+    def forget(self, conversation_id):
+        """Drop cached results for a conversation that has ended"""
+        with self._lock:
+            for key in [key for key in self._results if key[0] == conversation_id]:
+                del self._results[key]
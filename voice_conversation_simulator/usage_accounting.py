@@ -0,0 +1,126 @@
+import os
+import threading
+
+from metrics import metrics
+
+# USD list prices; override when the model or plan changes
+OPENAI_PROMPT_PRICE_PER_1M = float(os.getenv('OPENAI_PROMPT_PRICE_PER_1M', '0.15'))
+OPENAI_COMPLETION_PRICE_PER_1M = float(os.getenv('OPENAI_COMPLETION_PRICE_PER_1M', '0.60'))
+ELEVENLABS_PRICE_PER_1K_CHARS = float(os.getenv('ELEVENLABS_PRICE_PER_1K_CHARS', '0.30'))
+
+# Share of the budget after which the optional analysis call is skipped
+ECONOMY_BUDGET_SHARE = 0.8
+
+BUDGET_OK = 'ok'
+BUDGET_ECONOMY = 'economy'
+BUDGET_EXCEEDED = 'exceeded'
+
+
+def llm_cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens * OPENAI_PROMPT_PRICE_PER_1M + completion_tokens * OPENAI_COMPLETION_PRICE_PER_1M) / 1_000_000
+
+
+def tts_cost(characters):
+    return characters * ELEVENLABS_PRICE_PER_1K_CHARS / 1000
+
+
+class ConversationUsage:
+    """
+    Token, TTS character and cost totals for one conversation.
+
+    Every provider call is also counted in the process metrics by sector,
+    stage and call type. With a budget set (CONVERSATION_BUDGET_USD), the
+    call drops its analysis calls near the budget and uses templates and
+    browser TTS once it is spent.
+    """
+
+    def __init__(self, sector, budget_usd=None):
+        self.sector = sector
+        if budget_usd is None:
+            budget_usd = float(os.getenv('CONVERSATION_BUDGET_USD', '0')) or None
+        self.budget_usd = budget_usd
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tts_characters = 0
+        self.llm_calls = {}
+        self.tiers = {}
+        self._lock = threading.Lock()
+        self._state = BUDGET_OK
+        self._outcome_recorded = False
+
+    def record_llm(self, response, call, stage=None):
+        """Add the API-reported usage of one chat completion"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.llm_calls[call] = self.llm_calls.get(call, 0) + 1
+
+        labels = {'sector': self.sector, 'stage': stage or 'none', 'call': call}
+        metrics.incr('llm_prompt_tokens', prompt_tokens, **labels)
+        metrics.incr('llm_completion_tokens', completion_tokens, **labels)
+        metrics.incr('llm_cost_usd', llm_cost(prompt_tokens, completion_tokens), sector=self.sector)
+        self._update_state()
+
+    def record_tts(self, characters, stage=None):
+        """Add characters billed by ElevenLabs (cache and prepared-audio hits are free)"""
+        with self._lock:
+            self.tts_characters += characters
+        metrics.incr('tts_characters', characters, sector=self.sector, stage=stage or 'none')
+        metrics.incr('tts_cost_usd', tts_cost(characters), sector=self.sector)
+        self._update_state()
+
+    def record_tier(self, tier, call):
+        """Count which model tier served a generation or analysis call"""
+        key = f"{call}:{tier}"
+        with self._lock:
+            self.tiers[key] = self.tiers.get(key, 0) + 1
+
+    def record_outcome(self, interest_level, lead_score):
+        """Attribute the call's outcome to every generation tier it used (once per conversation)"""
+        with self._lock:
+            if self._outcome_recorded:
+                return
+            self._outcome_recorded = True
+            used = [key.split(':', 1)[1] for key in self.tiers if key.startswith('generation:')]
+        for tier in used:
+            metrics.incr('tier_outcomes', tier=tier, interest=interest_level)
+            metrics.observe('tier_lead_score', lead_score, tier=tier)
+
+    def cost_usd(self):
+        return llm_cost(self.prompt_tokens, self.completion_tokens) + tts_cost(self.tts_characters)
+
+    def _update_state(self):
+        if not self.budget_usd:
+            return
+        spent = self.cost_usd()
+        if spent >= self.budget_usd:
+            state = BUDGET_EXCEEDED
+        elif spent >= self.budget_usd * ECONOMY_BUDGET_SHARE:
+            state = BUDGET_ECONOMY
+        else:
+            state = BUDGET_OK
+        if state != self._state:
+            print(f"[BUDGET] {self.sector} conversation at ${spent:.4f} of ${self.budget_usd:.4f} → {state}")
+            metrics.incr('conversation_budget_transitions', sector=self.sector, to=state)
+            self._state = state
+
+    @property
+    def budget_state(self):
+        return self._state
+
+    def to_dict(self):
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'tts_characters': self.tts_characters,
+            'llm_calls': dict(self.llm_calls),
+            'tiers': dict(self.tiers),
+            'cost_usd': round(self.cost_usd(), 6),
+            'budget_usd': self.budget_usd,
+            'budget_state': self._state
+        }
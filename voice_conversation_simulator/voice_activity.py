@@ -0,0 +1,284 @@
+"""
+Server-side endpointing for streamed 16 kHz mono PCM.
+
+The browser (or a telephony bridge) streams little-endian int16 frames over
+/ws/audio/<conversation_id>. SpeechEndpointer runs energy/zero-crossing
+voice-activity detection against an adaptive noise floor and emits
+speech_start / speech_end events; each finished utterance goes to a
+pluggable recognizer and, optionally, straight into the conversation turn.
+"""
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from elevenlabs_service import wrap_pcm_as_wav
+from metrics import metrics
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+# Decision thresholds in dB above the tracked noise floor
+SPEECH_ON_DB = 9.0
+# Frames that cross many zeros are hiss/fricative noise unless clearly loud
+ZCR_MAX = 0.35
+ZCR_OVERRIDE_DB = 6.0
+# Absolute floor (dBFS) below which nothing counts as speech
+MIN_SPEECH_DBFS = -55.0
+
+NOISE_ADAPT_SILENCE = 0.05   # per-frame weight while not speaking
+NOISE_ADAPT_SPEECH = 0.002   # very slow drift while speaking, so a rising floor is still followed
+INITIAL_NOISE_DBFS = -60.0
+
+
+class SpeechEndpointer:
+    """
+    Incremental voice-activity detector and utterance endpointer.
+
+    Features are computed for all complete frames of a chunk at once;
+    only the hysteresis state machine walks frame by frame.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, end_silence_ms=None,
+                 start_ms=60, preroll_ms=200, max_utterance_ms=15000):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        if end_silence_ms is None:
+            end_silence_ms = int(os.getenv('VAD_END_SILENCE_MS', '500'))
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.preroll_frames = preroll_ms // frame_ms
+        self.max_frames = max_utterance_ms // frame_ms
+
+        self.noise_floor = INITIAL_NOISE_DBFS
+        self.in_speech = False
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._frames_seen = 0
+        self._voiced_run = 0
+        self._silence_run = 0
+        self._recent = []        # frames kept for pre-roll before speech starts
+        self._utterance = []
+        self._utterance_start = 0
+
+    def _features(self, frames):
+        samples = frames.astype(np.float32) / 32768.0
+        power = np.mean(samples * samples, axis=1)
+        energy_db = 10.0 * np.log10(power + 1e-10)
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_len - 1)
+        return energy_db, zcr
+
+    def _is_voiced(self, energy_db, zcr):
+        above = energy_db - self.noise_floor
+        return (energy_db > MIN_SPEECH_DBFS) & (above > SPEECH_ON_DB) & (
+            (zcr < ZCR_MAX) | (above > SPEECH_ON_DB + ZCR_OVERRIDE_DB)
+        )
+
+    def feed(self, pcm_bytes):
+        """Consume raw int16 PCM and return the events it completed"""
+        received_at = time.perf_counter()
+        samples = np.frombuffer(pcm_bytes, dtype='<i2')
+        if self._pending.size:
+            samples = np.concatenate([self._pending, samples])
+        usable = samples.size - samples.size % self.frame_len
+        self._pending = samples[usable:].copy()
+        if not usable:
+            return []
+
+        frames = samples[:usable].reshape(-1, self.frame_len)
+        energy_db, zcr = self._features(frames)
+        events = []
+
+        for index in range(frames.shape[0]):
+            frame_no = self._frames_seen
+            self._frames_seen += 1
+            voiced = bool(self._is_voiced(energy_db[index], zcr[index]))
+
+            # Track the background level; speech frames barely move it
+            weight = NOISE_ADAPT_SPEECH if (voiced or self.in_speech) else NOISE_ADAPT_SILENCE
+            self.noise_floor += weight * (energy_db[index] - self.noise_floor)
+
+            if not self.in_speech:
+                self._recent.append(frames[index])
+                if len(self._recent) > self.preroll_frames + self.start_frames:
+                    self._recent.pop(0)
+                self._voiced_run = self._voiced_run + 1 if voiced else 0
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silence_run = 0
+                    self._utterance = list(self._recent)
+                    self._recent = []
+                    self._utterance_start = frame_no - self.start_frames + 1
+                    events.append({'type': 'speech_start', 'at_ms': self._utterance_start * self.frame_ms})
+                continue
+
+            self._utterance.append(frames[index])
+            self._silence_run = 0 if voiced else self._silence_run + 1
+            too_long = len(self._utterance) >= self.max_frames
+            if self._silence_run >= self.end_frames or too_long:
+                events.append(self._finish(frame_no, received_at, 'max_length' if too_long else 'silence'))
+
+        return events
+
+    def _finish(self, frame_no, received_at, reason):
+        # Trailing silence is not sent to the recognizer
+        keep = len(self._utterance) - (self._silence_run if reason == 'silence' else 0)
+        audio = np.concatenate(self._utterance[:max(keep, 1)])
+        duration_ms = (frame_no - self._utterance_start + 1 - self._silence_run) * self.frame_ms
+        processing_ms = (time.perf_counter() - received_at) * 1000
+        metrics.incr('vad_utterances', reason=reason)
+        metrics.observe('vad_utterance_seconds', duration_ms / 1000)
+        metrics.observe('vad_endpoint_processing_ms', processing_ms)
+
+        self.in_speech = False
+        self._utterance = []
+        self._voiced_run = 0
+        self._silence_run = 0
+        return {
+            'type': 'speech_end',
+            'at_ms': (frame_no + 1) * self.frame_ms,
+            'duration_ms': duration_ms,
+            'reason': reason,
+            'noise_floor_db': round(float(self.noise_floor), 1),
+            'processing_ms': round(processing_ms, 3),
+            'audio': audio
+        }
+
+
+class LocalRecognizer:
+    """
+    Offline stand-in: returns queued transcripts in order, or a placeholder
+    describing the utterance when the queue is empty. Its text is never
+    real speech, so it must not drive live turns.
+    """
+    stand_in = True
+
+    def __init__(self, transcripts=None):
+        self._transcripts = list(transcripts or [])
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, sample_rate=SAMPLE_RATE):
+        with self._lock:
+            if self._transcripts:
+                return self._transcripts.pop(0)
+        return f"[{audio.size / sample_rate:.1f}s of speech]"
+
+
+class OpenAIRecognizer:
+    """Whisper transcription through the OpenAI API"""
+
+    def __init__(self, client=None, model='whisper-1'):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.client = client
+        self.model = model
+
+    def transcribe(self, audio, sample_rate=SAMPLE_RATE):
+        wav = io.BytesIO(wrap_pcm_as_wav(audio.astype('<i2').tobytes(), sample_rate=sample_rate))
+        wav.name = 'utterance.wav'
+        result = self.client.audio.transcriptions.create(model=self.model, file=wav)
+        return result.text.strip()
+
+
+RECOGNIZERS = {
+    'local': LocalRecognizer,
+    'openai': OpenAIRecognizer
+}
+
+
+def get_recognizer(name=None):
+    """Recognizer selected by SPEECH_RECOGNIZER ('local' or 'openai'); Whisper by default when OpenAI is configured"""
+    name = name or os.getenv('SPEECH_RECOGNIZER') or ('openai' if os.getenv('OPENAI_API_KEY') else 'local')
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unknown recognizer '{name}'")
+    return RECOGNIZERS[name]()
+
+
+class AudioIngestSession:
+    """
+    Socket loop for /ws/audio/<conversation_id>.
+
+    Binary frames are PCM; text frames are JSON control messages
+    ({"type": "end"}). The server sends speech_start, speech_end,
+    transcript and - with auto_turn - the same turn body as
+    /api/process_response. Recognition runs off the receive loop so
+    endpointing keeps up with the stream.
+    """
+
+    def __init__(self, ws, conversation_id, endpointer, recognizer, run_turn=None):
+        self.ws = ws
+        self.conversation_id = conversation_id
+        self.endpointer = endpointer
+        self.recognizer = recognizer
+        self.run_turn = run_turn
+        self._send_lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"asr-{conversation_id[:8]}")
+        self._utterances = 0
+        # Turn IDs must not repeat when the client reconnects within the turn coordinator's result TTL
+        self.session_id = uuid.uuid4().hex[:12]
+
+    def _send(self, payload):
+        try:
+            with self._send_lock:
+                self.ws.send(json.dumps(payload))
+        except Exception as e:
+            print(f"[ASR] Send failed for {self.conversation_id}: {e}")
+
+    def _recognize(self, event, utterance_no):
+        started = time.perf_counter()
+        try:
+            text = self.recognizer.transcribe(event['audio'], self.endpointer.sample_rate)
+        except Exception as e:
+            print(f"[ASR] Recognition failed: {e}")
+            self._send({'type': 'error', 'error': f"Recognition failed: {e}"})
+            return
+        metrics.observe('asr_seconds', time.perf_counter() - started)
+        self._send({'type': 'transcript', 'text': text, 'final': True, 'utterance': utterance_no})
+
+        if self.run_turn and text:
+            turn_id = f"audio-{self.session_id}-{utterance_no}"
+            try:
+                result, source = self.run_turn(text, turn_id)
+            except Exception as e:
+                self._send({'type': 'error', 'turn_id': turn_id, 'error': str(e)})
+                return
+            self._send(dict(result, type='turn', turn_id=turn_id, source=source))
+
+    def serve(self):
+        print(f"[ASR] 🎙️ Audio stream opened: {self.conversation_id}")
+        self._send({'type': 'ready', 'sample_rate': self.endpointer.sample_rate, 'frame_ms': self.endpointer.frame_ms})
+        try:
+            while True:
+                try:
+                    data = self.ws.receive()
+                except Exception:
+                    break
+                if data is None:
+                    break
+                if isinstance(data, str):
+                    try:
+                        message = json.loads(data)
+                    except ValueError:
+                        message = {}
+                    if message.get('type') == 'end':
+                        break
+                    continue
+
+                for event in self.endpointer.feed(data):
+                    if event['type'] == 'speech_start':
+                        self._send(event)
+                        continue
+                    self._utterances += 1
+                    self._send({key: value for key, value in event.items() if key != 'audio'})
+                    self._worker.submit(self._recognize, event, self._utterances)
+        finally:
+            # Finish recognizing what was already said before the stream closes
+            self._worker.shutdown(wait=True)
+            print(f"[ASR] Audio stream closed: {self.conversation_id} ({self._utterances} utterances)")